@@ -0,0 +1,610 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import time
+import argparse
+
+from core.benchmark import expand_matrix, run_benchmark, compare_backends, format_table, DEFAULT_LATENCY_URL, DEFAULT_THROUGHPUT_URL
+from core.backends import BACKENDS, DEFAULT_BACKEND, get_backend, available_backends
+from core.standins import LocalHTTPServer, LocalEchoServer, LocalUDPEchoServer, LocalSinkServer, LocalTLSServer
+from core.udp_test import run_udp_test, format_udp_report
+from core.loadgen import run_load, format_load_report
+from core.bulk_generate import load_inventory, bulk_generate, templatize, format_report
+from core.utils import resource_path
+from core.constants import SOCKS_INBOUND_PORT, HTTP_INBOUND_PORT, ACCESS_LOG_FILE
+from core.preflight import PreflightValidator, list_config_files
+from core.tls_profiler import tls_targets_from_config, profile_servers, format_profile
+from core.templates import load_config
+from core.traffic_replay import TrafficRecorder, load_recording, replay, format_replay_report
+from core.isolated_core import IsolatedCore
+from core.config_builder import load_config_details
+from core.probe import probe_families, format_family_report, FAMILY_DOMAIN_STRATEGIES
+from core.clustering import ClusteredProber, format_cluster_report, CLUSTER_KEYS, DEFAULT_CLUSTER_KEYS
+from core.server_store import ServerEntry
+from core.routing_advisor import advise, advise_with_config, build_rules, apply_rules_to_file, top_domains_from_log, format_advice
+from core.readiness import load_startup_history, summarize_startups, format_startup_summary
+from core.settings import load_app_settings, get_persistent_data_path
+from core.subscriptions import SubscriptionRefresher, SUBSCRIPTION_DIR, format_result
+
+
+def _split(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def cmd_benchmark(args):
+    """对同一服务器的不同传输/Mux/TLS组合进行对比测试"""
+    variants = expand_matrix({"ws_path": args.ws_path},
+                             networks=_split(args.networks),
+                             mux_values=(False, True) if args.mux else (False,),
+                             tls_values=(False, True) if args.tls else (False,))
+    latency_url, throughput_url = args.latency_url, args.throughput_url
+    target = None
+    if args.local:
+        # 使用本地替身服务器，无需网络即可端到端运行
+        target = LocalHTTPServer().start()
+        latency_url, throughput_url = target.url("/"), target.url(f"/bytes/{args.local_bytes}")
+    try:
+        results = run_benchmark(args.address, args.port, args.uuid, variants,
+                                latency_url=latency_url, throughput_url=throughput_url,
+                                repeats=args.repeats, executable=args.core, local_server=args.local)
+    finally:
+        if target:
+            target.stop()
+    print(format_table(results))
+    return 0
+
+
+def cmd_compare_cores(args):
+    """用每个可用的核心（v2ray、Xray、sing-box）连接同一服务器，对比延迟和吞吐量"""
+    paths = {name: getattr(args, name.replace("-", "_")) for name in BACKENDS}
+    backends = [(backend, executable) for backend, executable in available_backends(paths)
+                if backend.name in _split(args.backends)]
+    if not backends:
+        print("No core binaries found.", file=sys.stderr)
+        return 1
+    options = {"network": args.network, "ws_path": args.ws_path, "mux": args.mux}
+    latency_url, throughput_url = args.latency_url, args.throughput_url
+    target = None
+    if args.local:
+        target = LocalHTTPServer().start()
+        latency_url, throughput_url = target.url("/"), target.url(f"/bytes/{args.local_bytes}")
+    try:
+        results = compare_backends(args.address, args.port, args.uuid, options, backends,
+                                   latency_url=latency_url, throughput_url=throughput_url, repeats=args.repeats,
+                                   server_executable=args.v2ray, local_server=args.local)
+    finally:
+        if target:
+            target.stop()
+    print(format_table(results))
+    return 0
+
+
+def cmd_bulk_generate(args):
+    """根据服务器清单批量生成配置文件"""
+    defaults, rows = load_inventory(args.inventory)
+    report = bulk_generate(rows, args.output or resource_path('configs'), defaults,
+                           workers=args.workers, indent=args.indent, template=args.template)
+    _print_report(report, args.verbose)
+    return 1 if report["failed"] else 0
+
+
+def cmd_templatize(args):
+    """将已有的完整配置改写为基于模板的叠加文件（只保存与模板不同的部分）"""
+    paths = []
+    for target in args.paths or [resource_path('configs')]:
+        paths.extend(list_config_files(target) if os.path.isdir(target) else [target])
+    report = templatize(paths, args.template, workers=args.workers, indent=args.indent)
+    _print_report(report, args.verbose)
+    return 1 if report["failed"] else 0
+
+
+def _print_report(report, verbose):
+    if verbose:
+        for status in ("created", "updated", "unchanged"):
+            for name in report[status]:
+                print(f"{status:<10} {name}")
+    for name, error in report["failed"]:
+        print(f"failed     {name}: {error}", file=sys.stderr)
+    print(format_report(report))
+
+
+def cmd_validate(args):
+    """并行校验配置文件（结果按内容哈希缓存）"""
+    paths = []
+    for target in args.paths or [resource_path('configs')]:
+        paths.extend(list_config_files(target) if os.path.isdir(target) else [target])
+    backend = get_backend(args.backend)
+    validator = PreflightValidator(args.core or backend.default_executable(), use_core_test=not args.no_core_test,
+                                   backend=backend)
+    results = validator.validate_many(paths, workers=args.workers)
+    failures = 0
+    for path, (ok, problems, cached) in results.items():
+        if not ok:
+            failures += 1
+            print(f"FAIL {path}: {'; '.join(problems)}")
+        elif args.verbose:
+            print(f"ok   {path}{' (cached)' if cached else ''}")
+    print(f"{len(results) - failures} passed, {failures} failed")
+    return 1 if failures else 0
+
+
+def cmd_loadgen(args):
+    """通过本地入站发起大量短连接，测试连接建立速率"""
+    echo = None
+    if args.target:
+        host, _, port = args.target.rpartition(":")
+        target_host, target_port = host.strip("[]"), int(port)
+    else:
+        # 未指定目标时使用本地回显替身服务器，无需外网
+        echo = LocalEchoServer().start()
+        target_host, target_port = echo.host, echo.port
+    try:
+        for kind in _split(args.proxy):
+            port = args.socks_port if kind == "socks" else args.http_port
+            report = run_load(kind, port, target_host, target_port, connections=args.connections,
+                              concurrency=args.concurrency, rate=args.rate, payload_size=args.payload,
+                              timeout=args.timeout)
+            print(format_load_report(report))
+    finally:
+        if echo:
+            echo.stop()
+    return 0
+
+
+def cmd_udp_test(args):
+    """通过 SOCKS5 UDP ASSOCIATE 测试UDP路径的延迟、抖动、丢包和乱序"""
+    echo = None
+    if args.target:
+        host, _, port = args.target.rpartition(":")
+        target_host, target_port = host.strip("[]"), int(port)
+    else:
+        echo = LocalUDPEchoServer().start()
+        target_host, target_port = echo.host, echo.port
+    try:
+        report = run_udp_test(args.socks_port, target_host, target_port, count=args.count,
+                              interval=args.interval, payload_size=args.payload, timeout=args.timeout)
+    finally:
+        if echo:
+            echo.stop()
+    print(format_udp_report(report))
+    return 0
+
+
+def cmd_probe(args):
+    """对服务器的全部 A/AAAA 地址测试TCP连接延迟，并标出较快的地址族"""
+    targets = []
+    for target in args.targets or [resource_path('configs')]:
+        if os.path.isdir(target) or target.lower().endswith(".json"):
+            for path in list_config_files(target) if os.path.isdir(target) else [target]:
+                try:
+                    address, port, _ = load_config_details(path)
+                except (OSError, ValueError) as e:
+                    print(f"{os.path.basename(path)}: {e}")
+                    continue
+                if address and port:
+                    targets.append((os.path.basename(path), address, int(port)))
+        else:
+            host, _, port = target.rpartition(":")
+            targets.append((target, host.strip("[]"), int(port)))
+    for name, address, port in targets:
+        try:
+            result = probe_families(address, port, timeout=args.timeout)
+        except OSError as e:
+            print(f"{name}: cannot resolve {address}: {e}")
+            continue
+        line = f"{name}: {format_family_report(result)}"
+        if args.strategy and result["preferred"] and len(result["families"]) > 1:
+            line += f"  -> domain_strategy={FAMILY_DOMAIN_STRATEGIES[result['preferred']]}"
+        print(line)
+    return 0
+
+
+def cmd_subscribe(args):
+    """刷新订阅：条件请求下载，只增删改有变化的服务器配置"""
+    sources = []
+    for item in args.sources:
+        name, sep, url = item.partition("=")
+        if not sep:
+            print(f"无效的订阅 {item!r}，应为 名称=URL", file=sys.stderr)
+            return 2
+        sources.append({"name": name.strip(), "url": url.strip()})
+    settings = load_app_settings()
+    sources = sources or settings.get("subscriptions", [])
+    if not sources:
+        print("没有订阅；使用 名称=URL 指定，或在客户端中添加")
+        return 1
+    refresher = SubscriptionRefresher(sources, print, args.output or os.path.join(resource_path('configs'), SUBSCRIPTION_DIR),
+                                      interval=args.interval or settings.get("subscription_interval", 3600),
+                                      timeout=args.timeout, template=args.template)
+    if args.watch:
+        refresher.start()
+        try:
+            while refresher.thread.is_alive():
+                refresher.thread.join(1)
+        except KeyboardInterrupt:
+            refresher.stop()
+        return 0
+    results = refresher.refresh_all(force=args.force)
+    for result in results:
+        print(f"{result['name']}: {format_result(result)}")
+        if args.verbose:
+            for status in ("added", "removed", "changed"):
+                for filename in result[status]:
+                    print(f"  {status:<8} {filename}")
+            for link, reason in result["skipped_links"]:
+                print(f"  skipped  {link}: {reason}")
+    return 1 if any(result["status"] == "failed" for result in results) else 0
+
+
+def cmd_startup_stats(args):
+    """汇总每次启动核心到入站就绪的耗时"""
+    entries = load_startup_history(args.history, limit=args.last)
+    if not entries:
+        print("没有启动记录")
+        return 1
+    print(format_startup_summary(summarize_startups(entries)))
+    if args.verbose:
+        for entry in entries:
+            ready = f"{entry['ready_ms']:.0f} ms" if entry.get("ready") else entry.get("reason")
+            print(f"{entry.get('time')}  {entry.get('backend'):<8} {entry.get('config')}: {ready}")
+    return 0
+
+
+def cmd_cluster_probe(args):
+    """按解析IP网段和主机名模式对服务器分组，先测代表节点，只展开有希望的集群"""
+    entries = []
+    for target in args.targets or [resource_path('configs')]:
+        for path in list_config_files(target) if os.path.isdir(target) else [target]:
+            try:
+                address, port, _ = load_config_details(path)
+            except (OSError, ValueError) as e:
+                print(f"{os.path.basename(path)}: {e}", file=sys.stderr)
+                continue
+            if address and port:
+                entries.append(ServerEntry(os.path.splitext(os.path.basename(path))[0], path, address, int(port)))
+    if not entries:
+        print("没有可测试的服务器")
+        return 1
+    prober = ClusteredProber(workers=args.workers, timeout=args.timeout, keys=_split(args.keys),
+                             factor=args.factor, max_latency=args.max_latency)
+    report = prober.run(entries)
+    full = prober.full_scan(entries) if args.compare else None
+    print(format_cluster_report(report, full))
+    if args.verbose:
+        for entry in sorted(report["measured"], key=lambda e: (e.latency is None, e.latency or 0.0)):
+            latency = f"{entry.latency:.1f} ms" if entry.latency is not None else "failed"
+            print(f"  {entry.name}: {latency}")
+    return 0
+
+
+def cmd_route_advice(args):
+    """比较各域名直连与经本地入站代理的延迟和速度，给出 direct/proxy 路由规则建议"""
+    domains = list(args.domains)
+    if not domains:
+        log_path = args.access_log or get_persistent_data_path(ACCESS_LOG_FILE)
+        if not os.path.exists(log_path):
+            print(f"没有指定域名，且找不到访问日志 {log_path}", file=sys.stderr)
+            return 1
+        domains = top_domains_from_log(log_path, args.top)
+        print(f"使用访问日志中最常访问的 {len(domains)} 个域名")
+    if not domains:
+        print("没有可测试的域名")
+        return 1
+    kwargs = {"repeats": args.repeats, "workers": args.workers, "timeout": args.timeout, "scheme": args.scheme,
+              "min_gain": args.min_gain, "use_geosite": not args.no_geosite, "log_callback": print}
+    config_path = args.config or (args.apply[0] if args.apply and not args.proxy else None)
+    if config_path:
+        # 代理路径经独立核心（去掉直连规则）测量，不受当前路由和上次建议的影响
+        try:
+            advice = advise_with_config(domains, load_config(config_path), executable=args.core,
+                                        backend=args.backend, **kwargs)
+        except (OSError, ValueError, RuntimeError) as e:
+            print(f"无法用 {config_path} 启动独立核心: {e}", file=sys.stderr)
+            return 1
+    else:
+        print("注意: 经本地入站测量时，已被当前路由直连的域名两条路径结果相同；建议使用 --config")
+        advice = advise(domains, args.proxy or f"http://127.0.0.1:{HTTP_INBOUND_PORT}", **kwargs)
+    print(format_advice(advice))
+    rules = build_rules(advice)
+    if not rules:
+        print("没有需要添加的规则")
+        return 0
+    print(json.dumps({"routing": {"rules": rules}}, indent=2, ensure_ascii=False))
+    for path in args.apply or []:
+        print(f"{path}: {apply_rules_to_file(path, rules)}")
+    return 0
+
+
+def cmd_tls_profile(args):
+    """对启用TLS的服务器重复握手，比较完整/恢复握手、协议版本、ALPN和证书链，并给出设置建议"""
+    standin = None
+    targets = []
+    if args.local:
+        standin = LocalTLSServer().start()
+        targets.append({"address": standin.host, "port": standin.port, "server_name": "localhost",
+                        "network": args.network, "alpn": None})
+    for target in args.targets or ([] if args.local else [resource_path('configs')]):
+        if os.path.isdir(target) or target.lower().endswith(".json"):
+            for path in list_config_files(target) if os.path.isdir(target) else [target]:
+                try:
+                    targets.extend(tls_targets_from_config(load_config(path)))
+                except (OSError, ValueError) as e:
+                    print(f"{os.path.basename(path)}: {e}", file=sys.stderr)
+        else:
+            address, _, server_name = target.partition("@")
+            host, _, port = address.rpartition(":")
+            host = host.strip("[]")
+            targets.append({"address": host, "port": int(port), "server_name": server_name or host,
+                            "network": args.network, "alpn": None})
+    if not targets:
+        print("没有启用TLS的服务器")
+        return 1
+    try:
+        profiles = profile_servers(targets, repeats=args.repeats, timeout=args.timeout, workers=args.workers)
+    finally:
+        if standin:
+            standin.stop()
+    for profile in profiles:
+        print(format_profile(profile))
+        if profile["options"]:
+            print(f"  建议选项: {json.dumps(profile['options'])}")
+    return 0
+
+
+def cmd_record(args):
+    """在本地入站前录制连接时间线（时间、目标和字节数，不保存内容），按 Ctrl+C 结束"""
+    with TrafficRecorder(args.output, upstream_socks_port=args.socks_port, upstream_http_port=args.http_port,
+                         socks_listen=args.listen_socks, http_listen=args.listen_http):
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+def cmd_replay(args):
+    """将录制的连接时间线通过指定配置重放到回放接收服务器，报告延迟和完成时间分布"""
+    if args.config and not args.sink:
+        # 本地接收服务器只能经回环地址访问，远程服务器连不到它
+        print("使用 --config 时必须用 --sink 指定远程服务器可访问的回放接收服务器（可在服务器上运行 sink 命令）",
+              file=sys.stderr)
+        return 2
+    records = load_recording(args.recording)
+    sink_host = sink_port = None
+    if args.sink:
+        host, _, port = args.sink.rpartition(":")
+        sink_host, sink_port = host.strip("[]"), int(port)
+    kwargs = {"speed": args.speed, "timeout": args.timeout}
+    if not args.config:
+        port = args.socks_port if args.proxy == "socks" else args.http_port
+        report = replay(records, args.proxy, port, sink_host, sink_port, **kwargs)
+    else:
+        try:
+            # Template overlays are resolved like every other command that takes --config
+            config = load_config(args.config)
+        except (OSError, ValueError) as e:
+            print(f"无法读取配置 {args.config}: {e}", file=sys.stderr)
+            return 1
+        with IsolatedCore(config, executable=args.core, backend=args.backend) as core:
+            port = core.socks_port if args.proxy == "socks" else core.http_port
+            report = replay(records, args.proxy, port, sink_host, sink_port, **kwargs)
+    print(format_replay_report(report))
+    return 0
+
+
+def cmd_sink(args):
+    """运行回放接收服务器，例如在服务器端运行以测量真实链路"""
+    sink = LocalSinkServer(args.host, args.port).start()
+    print(f"Replay sink listening on {sink.host}:{sink.port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    sink.stop()
+    return 0
+
+
+def cmd_echo(args):
+    """在同一端口运行TCP和UDP回显服务器，在服务器端运行后可作为 loadgen / udp-test 的目标"""
+    tcp = LocalEchoServer(args.host, args.port).start()
+    udp = LocalUDPEchoServer(args.host, tcp.port).start()
+    print(f"Echo server listening on {tcp.host}:{tcp.port} (TCP and UDP)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    tcp.stop()
+    udp.stop()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="v2py", description="V2fly 客户端命令行工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    bench = subparsers.add_parser("benchmark", help="传输方式对比测试")
+    bench.add_argument("--address", default="127.0.0.1", help="服务器地址")
+    bench.add_argument("--port", type=int, default=443, help="服务器端口")
+    bench.add_argument("--uuid", required=True, help="用户UUID")
+    bench.add_argument("--networks", default="tcp,ws", help="逗号分隔的传输协议列表")
+    bench.add_argument("--ws-path", default="/", help="WebSocket 路径")
+    bench.add_argument("--mux", action="store_true", help="同时测试启用Mux的组合")
+    bench.add_argument("--tls", action="store_true", help="同时测试启用TLS的组合")
+    bench.add_argument("--repeats", type=int, default=5, help="每个组合的延迟测试次数")
+    bench.add_argument("--latency-url", default=DEFAULT_LATENCY_URL)
+    bench.add_argument("--throughput-url", default=DEFAULT_THROUGHPUT_URL)
+    bench.add_argument("--core", help="核心可执行文件路径")
+    bench.add_argument("--local", action="store_true", help="使用本地替身服务器和测试目标离线运行")
+    bench.add_argument("--local-bytes", type=int, default=8 * 1024 * 1024, help="本地吞吐测试的下载大小")
+    bench.set_defaults(func=cmd_benchmark)
+
+    compare = subparsers.add_parser("compare-cores", help="不同核心（v2ray/Xray/sing-box）对比测试")
+    compare.add_argument("--address", default="127.0.0.1", help="服务器地址")
+    compare.add_argument("--port", type=int, default=443, help="服务器端口")
+    compare.add_argument("--uuid", required=True, help="用户UUID")
+    compare.add_argument("--network", default="tcp", help="传输协议")
+    compare.add_argument("--ws-path", default="/", help="WebSocket 路径")
+    compare.add_argument("--mux", action="store_true", help="启用Mux")
+    compare.add_argument("--backends", default=",".join(BACKENDS), help="逗号分隔的核心列表")
+    for name in BACKENDS:
+        compare.add_argument(f"--{name}", help=f"{name} 可执行文件路径")
+    compare.add_argument("--repeats", type=int, default=5, help="每个核心的延迟测试次数")
+    compare.add_argument("--latency-url", default=DEFAULT_LATENCY_URL)
+    compare.add_argument("--throughput-url", default=DEFAULT_THROUGHPUT_URL)
+    compare.add_argument("--local", action="store_true", help="使用本地替身服务器和测试目标离线运行")
+    compare.add_argument("--local-bytes", type=int, default=8 * 1024 * 1024, help="本地吞吐测试的下载大小")
+    compare.set_defaults(func=cmd_compare_cores)
+
+    bulk = subparsers.add_parser("bulk-generate", help="根据服务器清单批量生成配置")
+    bulk.add_argument("inventory", help="CSV/JSON/YAML 服务器清单")
+    bulk.add_argument("--output", help="输出目录，默认为 configs/")
+    bulk.add_argument("--workers", type=int, default=8, help="并行写入的线程数")
+    bulk.add_argument("--indent", type=int, default=None, help="JSON 缩进；默认输出紧凑格式")
+    bulk.add_argument("--template", help="基础模板文件；每个服务器只生成与模板不同的叠加部分")
+    bulk.add_argument("-v", "--verbose", action="store_true", help="列出每个文件的状态")
+    bulk.set_defaults(func=cmd_bulk_generate)
+
+    templ = subparsers.add_parser("templatize", help="将完整配置改写为基于模板的叠加文件")
+    templ.add_argument("template", help="基础模板文件，建议放在 configs/templates/ 下")
+    templ.add_argument("paths", nargs="*", help="配置文件或目录，默认为 configs/")
+    templ.add_argument("--workers", type=int, default=8, help="并行写入的线程数")
+    templ.add_argument("--indent", type=int, default=None, help="JSON 缩进；默认输出紧凑格式")
+    templ.add_argument("-v", "--verbose", action="store_true", help="列出每个文件的状态")
+    templ.set_defaults(func=cmd_templatize)
+
+    validate = subparsers.add_parser("validate", help="校验配置文件")
+    validate.add_argument("paths", nargs="*", help="配置文件或目录，默认为 configs/")
+    validate.add_argument("--core", help="核心可执行文件路径")
+    validate.add_argument("--backend", choices=list(BACKENDS), default=DEFAULT_BACKEND, help="核心类型")
+    validate.add_argument("--workers", type=int, default=None, help="并行校验的线程数")
+    validate.add_argument("--no-core-test", action="store_true", help="只做结构检查，不调用核心的 test 模式")
+    validate.add_argument("-v", "--verbose", action="store_true")
+    validate.set_defaults(func=cmd_validate)
+
+    load = subparsers.add_parser("loadgen", help="短连接并发压测")
+    load.add_argument("--proxy", default="socks,http", help="要测试的入站: socks、http 或两者")
+    load.add_argument("--socks-port", type=int, default=SOCKS_INBOUND_PORT)
+    load.add_argument("--http-port", type=int, default=HTTP_INBOUND_PORT)
+    load.add_argument("--target", help="目标 host:port；默认启动本地回显服务器")
+    load.add_argument("--connections", type=int, default=1000, help="总连接数")
+    load.add_argument("--concurrency", type=int, default=100, help="最大并发连接数")
+    load.add_argument("--rate", type=float, default=0.0, help="每秒新建连接数上限，0 表示不限")
+    load.add_argument("--payload", type=int, default=64, help="每个连接回显的字节数")
+    load.add_argument("--timeout", type=float, default=10.0, help="单个连接的超时（秒）")
+    load.set_defaults(func=cmd_loadgen)
+
+    udp = subparsers.add_parser("udp-test", help="UDP 路径测试 (SOCKS5 UDP ASSOCIATE)")
+    udp.add_argument("--socks-port", type=int, default=SOCKS_INBOUND_PORT)
+    udp.add_argument("--target", help="UDP 回显目标 host:port；默认启动本地回显服务器")
+    udp.add_argument("--count", type=int, default=200, help="发送的数据报数量")
+    udp.add_argument("--interval", type=float, default=0.02, help="数据报发送间隔（秒）")
+    udp.add_argument("--payload", type=int, default=64, help="数据报大小（字节）")
+    udp.add_argument("--timeout", type=float, default=2.0, help="最后一个数据报后等待回复的时间（秒）")
+    udp.set_defaults(func=cmd_udp_test)
+
+    probe = subparsers.add_parser("probe", help="按地址族 (IPv4/IPv6) 测试服务器连接延迟")
+    probe.add_argument("targets", nargs="*", help="host:port、配置文件或目录，默认为 configs/")
+    probe.add_argument("--timeout", type=float, default=5.0, help="每个服务器的超时（秒）")
+    probe.add_argument("--strategy", action="store_true", help="建议用于固定较快地址族的 domain_strategy")
+    probe.set_defaults(func=cmd_probe)
+
+    subscribe = subparsers.add_parser("subscribe", help="增量刷新订阅")
+    subscribe.add_argument("sources", nargs="*", help="名称=URL；默认使用客户端中保存的订阅")
+    subscribe.add_argument("--output", help="输出目录，默认为 configs/subscriptions/")
+    subscribe.add_argument("--template", help="基础模板文件；服务器配置写为叠加文件")
+    subscribe.add_argument("--force", action="store_true", help="忽略刷新间隔和失败退避，立即刷新")
+    subscribe.add_argument("--watch", action="store_true", help="持续运行，按间隔定时刷新")
+    subscribe.add_argument("--interval", type=float, help="刷新间隔（秒），默认使用客户端设置")
+    subscribe.add_argument("--timeout", type=float, default=15.0, help="下载超时（秒）")
+    subscribe.add_argument("-v", "--verbose", action="store_true", help="列出增删改的服务器")
+    subscribe.set_defaults(func=cmd_subscribe)
+
+    startup = subparsers.add_parser("startup-stats", help="核心启动就绪耗时统计")
+    startup.add_argument("--history", help="启动记录文件，默认为数据目录下的 startup_times.jsonl")
+    startup.add_argument("--last", type=int, help="只统计最近 N 次启动")
+    startup.add_argument("-v", "--verbose", action="store_true", help="列出每次启动")
+    startup.set_defaults(func=cmd_startup_stats)
+
+    cluster = subparsers.add_parser("cluster-probe", help="分集群测试大量服务器的延迟")
+    cluster.add_argument("targets", nargs="*", help="配置文件或目录，默认为 configs/")
+    cluster.add_argument("--keys", default=",".join(DEFAULT_CLUSTER_KEYS),
+                         help=f"分组依据，逗号分隔，可选 {', '.join(CLUSTER_KEYS)}")
+    cluster.add_argument("--factor", type=float, default=2.0, help="代表节点延迟不超过最佳值的几倍时展开该集群")
+    cluster.add_argument("--max-latency", type=float, help="代表节点延迟上限（毫秒），超过则不展开")
+    cluster.add_argument("--workers", type=int, default=32, help="并发测试数")
+    cluster.add_argument("--timeout", type=float, default=5.0, help="单次测试超时（秒）")
+    cluster.add_argument("--compare", action="store_true", help="再做一次全量测试并对比探测次数和耗时")
+    cluster.add_argument("-v", "--verbose", action="store_true", help="列出每个已测服务器的延迟")
+    cluster.set_defaults(func=cmd_cluster_probe)
+
+    advice = subparsers.add_parser("route-advice", help="按域名比较直连与代理，生成路由规则建议")
+    advice.add_argument("domains", nargs="*", help="要测试的域名；默认取访问日志中最常访问的域名")
+    advice.add_argument("--access-log", help="访问日志文件，默认为数据目录下的 access.log")
+    advice.add_argument("--top", type=int, default=20, help="从访问日志中取前 N 个域名")
+    advice.add_argument("--config", help="用此配置（去掉直连规则）启动独立核心测量代理路径；默认为 --apply 的第一个配置")
+    advice.add_argument("--core", help="核心可执行文件路径")
+    advice.add_argument("--backend", choices=list(BACKENDS), default=DEFAULT_BACKEND, help="核心类型")
+    advice.add_argument("--proxy", help=f"不使用独立核心，经此 HTTP 入站测量，例如 http://127.0.0.1:{HTTP_INBOUND_PORT}")
+    advice.add_argument("--scheme", choices=("https", "http"), default="https")
+    advice.add_argument("--repeats", type=int, default=3, help="每条路径的测试次数")
+    advice.add_argument("--workers", type=int, default=16, help="并发请求数")
+    advice.add_argument("--timeout", type=float, default=10.0, help="单次请求超时（秒）")
+    advice.add_argument("--min-gain", type=float, default=0.2, help="建议规则所需的最小延迟改善比例")
+    advice.add_argument("--no-geosite", action="store_true", help="不查询 geosite 分类")
+    advice.add_argument("--apply", nargs="+", metavar="CONFIG", help="将建议的规则写入这些配置文件")
+    advice.set_defaults(func=cmd_route_advice)
+
+    tls = subparsers.add_parser("tls-profile", help="TLS 握手分析（会话恢复、ALPN、证书链）")
+    tls.add_argument("targets", nargs="*", help="host:port[@SNI]、配置文件或目录，默认为 configs/")
+    tls.add_argument("--network", default="tcp", help="host:port 目标使用的传输方式，用于选择要比较的 ALPN")
+    tls.add_argument("--repeats", type=int, default=5, help="每种 ALPN 的握手次数")
+    tls.add_argument("--timeout", type=float, default=10.0, help="单次握手超时（秒）")
+    tls.add_argument("--workers", type=int, default=8, help="并发分析的服务器数")
+    tls.add_argument("--local", action="store_true", help="同时分析本地自签名证书的 TLS 替身服务器")
+    tls.set_defaults(func=cmd_tls_profile)
+
+    record = subparsers.add_parser("record", help="录制本地入站的连接时间线")
+    record.add_argument("output", help="JSONL 输出文件（追加写入）")
+    record.add_argument("--socks-port", type=int, default=SOCKS_INBOUND_PORT, help="核心的 SOCKS5 入站端口")
+    record.add_argument("--http-port", type=int, default=HTTP_INBOUND_PORT, help="核心的 HTTP 入站端口")
+    record.add_argument("--listen-socks", type=int, default=0, help="录制用 SOCKS5 端口，0 表示自动选择")
+    record.add_argument("--listen-http", type=int, default=0, help="录制用 HTTP 端口，0 表示自动选择")
+    record.set_defaults(func=cmd_record)
+
+    replay_parser = subparsers.add_parser("replay", help="重放录制的连接时间线")
+    replay_parser.add_argument("recording", help="record 生成的 JSONL 文件")
+    replay_parser.add_argument("--config", help="用此配置启动独立核心；默认使用正在运行的本地入站")
+    replay_parser.add_argument("--core", help="核心可执行文件路径")
+    replay_parser.add_argument("--backend", choices=list(BACKENDS), default=DEFAULT_BACKEND, help="核心类型")
+    replay_parser.add_argument("--proxy", choices=("socks", "http"), default="socks", help="重放使用的入站")
+    replay_parser.add_argument("--socks-port", type=int, default=SOCKS_INBOUND_PORT)
+    replay_parser.add_argument("--http-port", type=int, default=HTTP_INBOUND_PORT)
+    replay_parser.add_argument("--sink", help="回放接收服务器 host:port；不使用 --config 时默认启动本地接收服务器")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="重放倍速，例如 10 表示快十倍")
+    replay_parser.add_argument("--timeout", type=float, default=30.0, help="单步操作的超时（秒）")
+    replay_parser.set_defaults(func=cmd_replay)
+
+    sink = subparsers.add_parser("sink", help="运行回放接收服务器")
+    sink.add_argument("--host", default="0.0.0.0", help="监听地址")
+    sink.add_argument("--port", type=int, default=9999, help="监听端口")
+    sink.set_defaults(func=cmd_sink)
+
+    echo = subparsers.add_parser("echo", help="运行TCP/UDP回显服务器（压测和UDP测试的目标）")
+    echo.add_argument("--host", default="0.0.0.0", help="监听地址")
+    echo.add_argument("--port", type=int, default=9998, help="监听端口（TCP和UDP）")
+    echo.set_defaults(func=cmd_echo)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import time
+import threading
+import ipaddress
+from functools import lru_cache
+from collections import deque
+
+# e.g. "2024/01/02 03:04:05 127.0.0.1:50000 accepted tcp:www.google.com:443 [socks -> proxy]"
+_ENTRY_PATTERN = re.compile(
+    r'^(?P<timestamp>\S+ \S+) (?:from )?(?P<source>\S+) (?P<status>accepted|rejected)\s+'
+    r'(?:(?P<network>tcp|udp):)?(?P<destination>\S+)'
+    r'(?: \[(?:[^\]]*? (?:->|>>) )?(?P<outbound>[^\]]*)\])?'
+)
+
+
+@lru_cache(maxsize=256)
+def _parse_timestamp(text):
+    """Converts a log timestamp ("2024/01/02 03:04:05", optionally with fractions) in local time to epoch seconds."""
+    try:
+        return time.mktime(time.strptime(text.split(".", 1)[0], "%Y/%m/%d %H:%M:%S"))
+    except (ValueError, OverflowError):
+        return None
+
+
+def parse_access_line(line):
+    """
+    Parses one access log line.
+
+    :return: A dict with time (epoch seconds, or None if the timestamp is unreadable), source,
+             destination, host, port, network, outbound and accepted, or None if the line is not
+             an access entry.
+    """
+    match = _ENTRY_PATTERN.match(line)
+    if not match:
+        return None
+    destination = match.group("destination")
+    host, _, port = destination.rpartition(":")
+    if not host:
+        host, port = destination, ""
+    return {
+        "time": _parse_timestamp(match.group("timestamp")),
+        "source": match.group("source"),
+        "destination": destination,
+        "host": host.strip("[]"),
+        "port": port,
+        "network": match.group("network") or "tcp",
+        "outbound": match.group("outbound") or "default",
+        "accepted": match.group("status") == "accepted",
+    }
+
+
+def is_ip_address(host):
+    """Checks whether a host string is a literal IPv4/IPv6 address."""
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+class SpaceSaving:
+    """
+    Space-saving heavy-hitter counter (Metwally et al.).
+
+    Keeps at most `capacity` keys. When a new key arrives and the table is full it
+    replaces the key with the smallest count and inherits that count, so the
+    reported counts overestimate by at most the evicted minimum (kept as error).
+    """
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+
+    def add(self, key, amount=1):
+        if key in self.counts:
+            self.counts[key] += amount
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[key] = amount
+            self.errors[key] = 0
+            return
+        victim = min(self.counts, key=self.counts.__getitem__)
+        floor = self.counts.pop(victim)
+        del self.errors[victim]
+        self.counts[key] = floor + amount
+        self.errors[key] = floor
+
+    def top(self, n=10):
+        """Returns [(key, count, max_overestimate)] sorted by count, highest first."""
+        ranked = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:n]
+        return [(key, count, self.errors[key]) for key, count in ranked]
+
+
+class RateCounter:
+    """Per-key event rates over a sliding window, kept as per-second buckets."""
+    def __init__(self, window=60):
+        self.window = window
+        self.buckets = {}
+
+    def add(self, key, now=None):
+        second = int(now if now is not None else time.time())
+        buckets = self.buckets.setdefault(key, deque())
+        if buckets and buckets[-1][0] == second:
+            buckets[-1][1] += 1
+        elif not buckets or buckets[-1][0] < second:
+            buckets.append([second, 1])
+        else:
+            # An older event (log lines are not strictly ordered); keep the buckets sorted
+            index = len(buckets) - 1
+            while index >= 0 and buckets[index][0] > second:
+                index -= 1
+            if index >= 0 and buckets[index][0] == second:
+                buckets[index][1] += 1
+            else:
+                buckets.insert(index + 1, [second, 1])
+        self._expire(buckets, buckets[-1][0])
+
+    def _expire(self, buckets, second):
+        while buckets and buckets[0][0] <= second - self.window:
+            buckets.popleft()
+
+    def rates(self, now=None):
+        """Returns {key: events per second} over the window."""
+        second = int(now if now is not None else time.time())
+        result = {}
+        for key, buckets in self.buckets.items():
+            self._expire(buckets, second)
+            result[key] = sum(count for _, count in buckets) / self.window
+        return result
+
+
+class AccessLogAnalyzer:
+    """
+    Tails the core's access log incrementally and keeps bounded-memory statistics:
+    top domains, top destinations, accepted/rejected counts and per-outbound rates.
+    """
+    def __init__(self, path, capacity=100, window=60, log_callback=None):
+        """
+        :param path: The access log file written by the core.
+        :param capacity: Number of keys tracked by each heavy-hitter table.
+        :param window: Length in seconds of the per-outbound rate window.
+        """
+        self.path = path
+        self.log_callback = log_callback
+        self.offset = 0
+        self.file_id = None
+        self.partial = b""
+        self.lock = threading.Lock()
+        self.top_domains = SpaceSaving(capacity)
+        self.top_destinations = SpaceSaving(capacity)
+        self.outbound_rates = RateCounter(window)
+        self.outbound_totals = {}
+        self.accepted = 0
+        self.rejected = 0
+        self.unparsed = 0
+
+    def poll(self, max_bytes=4 * 1024 * 1024):
+        """Reads whatever was appended since the last call. Returns the number of entries parsed."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return 0
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id != self.file_id or stat.st_size < self.offset:
+            # The log was rotated or truncated; start over from the beginning
+            self.file_id = file_id
+            self.offset = 0
+            self.partial = b""
+        if stat.st_size == self.offset:
+            return 0
+
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(max_bytes)
+        self.offset += len(data)
+
+        lines = (self.partial + data).split(b"\n")
+        self.partial = lines.pop()
+        parsed = 0
+        now = time.time()
+        with self.lock:
+            for raw in lines:
+                entry = parse_access_line(raw.decode('utf-8', errors='replace').strip())
+                if entry is None:
+                    self.unparsed += 1
+                    continue
+                self._record(entry, now)
+                parsed += 1
+        return parsed
+
+    def _record(self, entry, now):
+        if entry["accepted"]:
+            self.accepted += 1
+        else:
+            self.rejected += 1
+        if not is_ip_address(entry["host"]):
+            self.top_domains.add(entry["host"])
+        self.top_destinations.add(entry["destination"])
+        outbound = entry["outbound"]
+        # Bucket by when the core logged the entry, so a backlog read in one poll is not
+        # counted as a burst in the current second
+        self.outbound_rates.add(outbound, entry["time"] if entry["time"] is not None else now)
+        self.outbound_totals[outbound] = self.outbound_totals.get(outbound, 0) + 1
+
+    def snapshot(self, n=10):
+        """Returns a consistent copy of the current statistics."""
+        with self.lock:
+            return {
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "unparsed": self.unparsed,
+                "top_domains": self.top_domains.top(n),
+                "top_destinations": self.top_destinations.top(n),
+                "outbound_rates": self.outbound_rates.rates(),
+                "outbound_totals": dict(self.outbound_totals),
+            }
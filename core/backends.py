@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import subprocess
+
+from core.utils import resource_path
+from core.settings import get_persistent_data_path
+from core.constants import V2RAY_CORE_PATH, XRAY_CORE_PATH, SING_BOX_CORE_PATH, CORE_LOG_LEVELS
+from core.log_reader import parse_level
+from core.config_builder import build_config
+
+BACKEND_CACHE_FILE = "core_backends.json"
+
+# Transports whose support is probed with the core's own config check
+PROBE_NETWORKS = ("tcp", "ws", "grpc", "h2", "quic")
+# Routing rule conditions of the v2ray dialect that have no sing-box counterpart here
+_SING_BOX_UNSUPPORTED_RULE_KEYS = ("user", "attrs")
+
+
+class CoreBackend:
+    """
+    A proxy core the client can drive.
+
+    Configs are always authored in the v2ray JSON dialect (see core.config_builder);
+    a backend translates them into its own dialect right before launch. The base
+    class implements the v2ray CLI and dialect.
+    """
+    name = "v2ray"
+    display_name = "V2Ray"
+    default_path = V2RAY_CORE_PATH
+    # Logged once the inbounds are up ("V2Ray 5.x started"), at the config log levels below
+    ready_marker = b" started"
+    ready_marker_levels = ("debug", "info", "warning")
+
+    def default_executable(self):
+        return resource_path(self.default_path)
+
+    def run_command(self, executable, config_path):
+        return [executable, "run", "-c", config_path]
+
+    def test_command(self, executable, config_path):
+        return [executable, "test", "-c", config_path]
+
+    def version_command(self, executable):
+        return [executable, "version"]
+
+    def parse_version(self, output):
+        """Extracts the version number from the output of version_command()."""
+        match = re.search(r"\b(\d+\.\d+(?:\.\d+)?)\b", output)
+        return match.group(1) if match else None
+
+    def translate_config(self, config):
+        """
+        Converts a v2ray-dialect config into this backend's dialect.
+
+        :return: (config, notes) where notes lists settings that could not be carried over.
+        """
+        return config, []
+
+    def logs_ready_marker(self, config):
+        """Whether the core prints ready_marker when run with this (v2ray-dialect) config."""
+        return config.get("log", {}).get("loglevel", "warning") in self.ready_marker_levels
+
+    def parse_level(self, buffer, default, start=0, end=None):
+        """Returns the numeric level of a raw core log line, see core.log_reader.parse_level()."""
+        return parse_level(buffer, default, start, end)
+
+
+class XrayBackend(CoreBackend):
+    """Xray-core: same CLI and config dialect as v2ray v4, with "run -test" for checks."""
+    name = "xray"
+    display_name = "Xray"
+    default_path = XRAY_CORE_PATH
+
+    def test_command(self, executable, config_path):
+        return [executable, "run", "-test", "-c", config_path]
+
+
+# sing-box log prefix, e.g. "+0000 2024-01-02 03:04:05 INFO ..." or "INFO[0000] ..."
+_SING_BOX_LEVEL_PATTERN = re.compile(
+    rb'(?:[+-]\d{4} )?(?:\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} )?(TRACE|DEBUG|INFO|WARN|ERROR|FATAL|PANIC)\b')
+_SING_BOX_LEVELS = {
+    b"TRACE": CORE_LOG_LEVELS["debug"], b"DEBUG": CORE_LOG_LEVELS["debug"], b"INFO": CORE_LOG_LEVELS["info"],
+    b"WARN": CORE_LOG_LEVELS["warning"], b"ERROR": CORE_LOG_LEVELS["error"],
+    b"FATAL": CORE_LOG_LEVELS["error"], b"PANIC": CORE_LOG_LEVELS["error"],
+}
+_SING_BOX_DOMAIN_STRATEGIES = {"UseIP": "prefer_ipv4", "UseIPv4": "ipv4_only", "UseIPv6": "ipv6_only"}
+_SING_BOX_LOG_LEVELS = {"debug": "debug", "info": "info", "warning": "warn", "error": "error", "none": "panic"}
+
+
+class SingBoxBackend(CoreBackend):
+    """sing-box: its own config dialect, "check" for config tests."""
+    name = "sing-box"
+    display_name = "sing-box"
+    default_path = SING_BOX_CORE_PATH
+    # "sing-box started (0.01s)" is an INFO line
+    ready_marker_levels = ("debug", "info")
+
+    def test_command(self, executable, config_path):
+        return [executable, "check", "-c", config_path]
+
+    def parse_level(self, buffer, default, start=0, end=None):
+        match = _SING_BOX_LEVEL_PATTERN.match(buffer, start, len(buffer) if end is None else end)
+        if not match:
+            return default
+        return _SING_BOX_LEVELS[match.group(1)]
+
+    def translate_config(self, config):
+        notes = []
+        result = {
+            "log": {"level": _SING_BOX_LOG_LEVELS.get(config.get("log", {}).get("loglevel", "warning"), "warn"),
+                    "timestamp": True},
+            "inbounds": [],
+            "outbounds": [],
+        }
+        if config.get("log", {}).get("access"):
+            notes.append("access log is not supported by sing-box")
+        if config.get("policy"):
+            notes.append("policy timeouts/buffers are not carried over")
+
+        for inbound in config.get("inbounds", []):
+            protocol = inbound.get("protocol")
+            if protocol not in ("socks", "http"):
+                notes.append(f"inbound protocol {protocol} dropped")
+                continue
+            result["inbounds"].append({
+                "type": protocol,
+                "tag": inbound.get("tag") or f"{protocol}-in",
+                "listen": inbound.get("listen", "127.0.0.1"),
+                "listen_port": inbound.get("port"),
+            })
+            if inbound.get("sniffing", {}).get("enabled"):
+                # Routing rules on "protocol" need the sniffed protocol
+                result["inbounds"][-1]["sniff"] = True
+
+        for index, outbound in enumerate(config.get("outbounds", [])):
+            translated = self._translate_outbound(outbound, index, notes)
+            if translated:
+                result["outbounds"].append(translated)
+
+        rules = []
+        for rule in config.get("routing", {}).get("rules", []):
+            translated = self._translate_rule(rule, notes)
+            if translated:
+                rules.append(translated)
+        route = {"rules": rules}
+        if result["outbounds"]:
+            route["final"] = result["outbounds"][0]["tag"]
+        result["route"] = route
+        return result, notes
+
+    def _translate_outbound(self, outbound, index, notes):
+        protocol = outbound.get("protocol")
+        tag = outbound.get("tag") or f"out-{index}"
+        if protocol == "freedom":
+            return {"type": "direct", "tag": tag}
+        if protocol == "blackhole":
+            return {"type": "block", "tag": tag}
+        if protocol not in ("vmess", "vless"):
+            notes.append(f"outbound protocol {protocol} dropped")
+            return None
+
+        server = outbound.get("settings", {}).get("vnext", [{}])[0]
+        user = (server.get("users") or [{}])[0]
+        result = {"type": protocol, "tag": tag, "server": server.get("address"),
+                  "server_port": server.get("port"), "uuid": user.get("id")}
+        if protocol == "vmess":
+            result["security"] = user.get("security", "auto")
+            result["alter_id"] = user.get("alterId", 0)
+        elif user.get("flow"):
+            result["flow"] = user["flow"]
+
+        stream = outbound.get("streamSettings", {})
+        network = stream.get("network", "tcp")
+        if network == "ws":
+            ws = stream.get("wsSettings", {})
+            result["transport"] = {"type": "ws", "path": ws.get("path", "/")}
+            if ws.get("headers"):
+                result["transport"]["headers"] = ws["headers"]
+        elif network == "grpc":
+            result["transport"] = {"type": "grpc", "service_name": stream.get("grpcSettings", {}).get("serviceName", "")}
+        elif network in ("h2", "http"):
+            http = stream.get("httpSettings", {})
+            result["transport"] = {"type": "http", "path": http.get("path", "/"), "host": http.get("host", [])}
+        elif network == "quic":
+            result["transport"] = {"type": "quic"}
+            if stream.get("quicSettings", {}).get("security", "none") != "none":
+                notes.append("QUIC header obfuscation is not supported by sing-box")
+        elif network != "tcp":
+            notes.append(f"transport {network} is not supported by sing-box")
+
+        if stream.get("security") == "tls":
+            tls = stream.get("tlsSettings", {})
+            result["tls"] = {"enabled": True, "server_name": tls.get("serverName", server.get("address"))}
+            if tls.get("alpn"):
+                result["tls"]["alpn"] = tls["alpn"]
+            if tls.get("fingerprint"):
+                result["tls"]["utls"] = {"enabled": True, "fingerprint": tls["fingerprint"]}
+
+        sockopt = stream.get("sockopt", {})
+        if sockopt.get("tcpFastOpen"):
+            result["tcp_fast_open"] = True
+        if sockopt.get("mark"):
+            result["routing_mark"] = sockopt["mark"]
+        if sockopt.get("domainStrategy") in _SING_BOX_DOMAIN_STRATEGIES:
+            result["domain_strategy"] = _SING_BOX_DOMAIN_STRATEGIES[sockopt["domainStrategy"]]
+        if sockopt.get("tcpKeepAliveInterval"):
+            notes.append("tcpKeepAliveInterval is not carried over")
+
+        mux = outbound.get("mux", {})
+        if mux.get("enabled"):
+            result["multiplex"] = {"enabled": True, "max_streams": max(1, mux.get("concurrency", 8))}
+        return result
+
+    def _translate_rule(self, rule, notes):
+        # A condition that cannot be carried over would widen the rule, so the whole rule is dropped
+        for key in _SING_BOX_UNSUPPORTED_RULE_KEYS:
+            if rule.get(key):
+                notes.append(f"rule to {rule.get('outboundTag') or rule.get('balancerTag')} uses {key}, "
+                             f"which is not carried over; the rule was dropped")
+                return None
+        if not rule.get("outboundTag"):
+            if rule.get("balancerTag"):
+                notes.append(f"balancer {rule['balancerTag']} is not supported by sing-box; the rule was dropped")
+            return None
+        result = {}
+        for ip in rule.get("ip", []):
+            if ip == "geoip:private":
+                result["ip_is_private"] = True
+            elif ip.startswith("geoip:"):
+                notes.append(f"{ip} needs a sing-box rule set and was dropped")
+            else:
+                result.setdefault("ip_cidr", []).append(ip)
+        for domain in rule.get("domain", []):
+            if domain.startswith("full:"):
+                result.setdefault("domain", []).append(domain[5:])
+            elif domain.startswith("domain:"):
+                result.setdefault("domain_suffix", []).append(domain[7:])
+            elif domain.startswith("regexp:"):
+                result.setdefault("domain_regex", []).append(domain[7:])
+            elif domain.startswith("geosite:"):
+                notes.append(f"{domain} needs a sing-box rule set and was dropped")
+            else:
+                result.setdefault("domain_keyword", []).append(domain.split(":", 1)[-1])
+        for key, prefix in (("port", ""), ("sourcePort", "source_")):
+            if rule.get(key) is not None:
+                ports, ranges = _parse_port_list(rule[key])
+                if ports:
+                    result[prefix + "port"] = ports
+                if ranges:
+                    result[prefix + "port_range"] = ranges
+        for source in rule.get("source", []):
+            if source.startswith("geoip:"):
+                notes.append(f"source {source} needs a sing-box rule set and was dropped")
+            else:
+                result.setdefault("source_ip_cidr", []).append(source)
+        if rule.get("network"):
+            networks = [network.strip() for network in rule["network"].split(",") if network.strip()]
+            result["network"] = networks[0] if len(networks) == 1 else networks
+        if rule.get("inboundTag"):
+            result["inbound"] = list(rule["inboundTag"])
+        if rule.get("protocol"):
+            result["protocol"] = list(rule["protocol"])
+        # A matcher list whose every entry was dropped would otherwise match everything
+        for key, translated_keys in (("ip", ("ip_is_private", "ip_cidr")), ("source", ("source_ip_cidr",)),
+                                     ("domain", ("domain", "domain_suffix", "domain_regex", "domain_keyword"))):
+            if rule.get(key) and not any(name in result for name in translated_keys):
+                notes.append(f"rule to {rule['outboundTag']} has no {key} left after translation; the rule was dropped")
+                return None
+        if not result:
+            return None
+        result["outbound"] = rule["outboundTag"]
+        return result
+
+
+def _parse_port_list(value):
+    """
+    Splits a v2ray rule port ("53", "1000-2000", "53,443,1000-2000" or an int) into
+    sing-box single ports and "start:end" ranges.
+    """
+    ports, ranges = [], []
+    for part in str(value).split(","):
+        part = part.strip()
+        if "-" in part:
+            start, end = part.split("-", 1)
+            ranges.append(f"{int(start)}:{int(end)}")
+        elif part:
+            ports.append(int(part))
+    return ports, ranges
+
+
+BACKENDS = {backend.name: backend for backend in (CoreBackend(), XrayBackend(), SingBoxBackend())}
+DEFAULT_BACKEND = "v2ray"
+
+
+def get_backend(name):
+    """Returns the backend called name, falling back to v2ray for unknown names."""
+    return BACKENDS.get(name, BACKENDS[DEFAULT_BACKEND])
+
+
+def available_backends(paths=None):
+    """
+    Lists the backends whose binary exists.
+
+    :param paths: Optional {backend_name: executable} overrides.
+    :return: A list of (backend, executable).
+    """
+    found = []
+    for name, backend in BACKENDS.items():
+        executable = (paths or {}).get(name) or backend.default_executable()
+        if os.path.exists(executable):
+            found.append((backend, executable))
+    return found
+
+
+def write_translated_config(backend, config_path, directory=None):
+    """
+    Writes the backend's translation of a v2ray-dialect config file to a temp file.
+
+    :return: (path, notes); path is config_path itself when no translation is needed.
+    """
+    if type(backend).translate_config is CoreBackend.translate_config:
+        return config_path, []
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    translated, notes = backend.translate_config(config)
+    fd, path = tempfile.mkstemp(prefix=f"v2py-{backend.name}-", suffix=".json", dir=directory)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(translated, f, indent=2)
+    return path, notes
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _probe_config(network):
+    return build_config("127.0.0.1", 443, "00000000-0000-0000-0000-000000000000",
+                        {"network": network, "grpc_service_name": "probe", "tls": network in ("h2", "quic")})
+
+
+class BackendProber:
+    """
+    Probes a core binary for its version and supported transports.
+
+    Results are cached in the data directory by the SHA-256 of the binary, so each
+    core build is probed once; the hash itself is memoised by (path, size, mtime).
+    """
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path or get_persistent_data_path(BACKEND_CACHE_FILE)
+        self.lock = threading.Lock()
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                self.cache = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self.cache = {}
+        self.cache.setdefault("hashes", {})
+        self.cache.setdefault("probes", {})
+
+    def binary_hash(self, executable):
+        stat = os.stat(executable)
+        identity = f"{os.path.abspath(executable)}:{stat.st_size}:{int(stat.st_mtime)}"
+        with self.lock:
+            digest = self.cache["hashes"].get(identity)
+        if not digest:
+            digest = _file_sha256(executable)
+            with self.lock:
+                self.cache["hashes"][identity] = digest
+        return digest
+
+    def probe(self, backend, executable, refresh=False):
+        """
+        :return: {"backend", "version", "networks", "sha256"}.
+        :raises OSError: If the binary cannot be read or run.
+        """
+        digest = self.binary_hash(executable)
+        key = f"{backend.name}:{digest}"
+        with self.lock:
+            cached = self.cache["probes"].get(key)
+        if cached and not refresh:
+            return cached
+
+        creationflags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+        result = subprocess.run(backend.version_command(executable), capture_output=True, timeout=20,
+                                creationflags=creationflags)
+        version = backend.parse_version((result.stdout + result.stderr).decode('utf-8', errors='replace'))
+
+        networks = []
+        with tempfile.TemporaryDirectory(prefix="v2py-probe-") as directory:
+            for network in PROBE_NETWORKS:
+                source = os.path.join(directory, f"{network}.json")
+                with open(source, 'w', encoding='utf-8') as f:
+                    json.dump(_probe_config(network), f)
+                path, notes = write_translated_config(backend, source, directory)
+                if notes:
+                    continue
+                try:
+                    check = subprocess.run(backend.test_command(executable, path), capture_output=True,
+                                           timeout=20, creationflags=creationflags)
+                except subprocess.TimeoutExpired:
+                    continue
+                if check.returncode == 0:
+                    networks.append(network)
+
+        probe = {"backend": backend.name, "version": version, "networks": networks,
+                 "sha256": digest, "probed_at": int(time.time())}
+        with self.lock:
+            self.cache["probes"][key] = probe
+            data = json.dumps(self.cache)
+        temp_path = self.cache_path + ".tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(temp_path, self.cache_path)
+        except OSError:
+            pass
+        return probe
+
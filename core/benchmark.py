@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+import time
+import itertools
+import subprocess
+import urllib.request
+
+from core.config_builder import build_config, validate_options, without_direct_rules
+from core.isolated_core import IsolatedCore
+from core.backends import BackendProber, DEFAULT_BACKEND
+from core.stats import confidence_interval
+from core.utils import find_free_port
+
+DEFAULT_LATENCY_URL = "http://www.gstatic.com/generate_204"
+DEFAULT_THROUGHPUT_URL = "http://cachefly.cachefly.net/10mb.test"
+
+
+def expand_matrix(base_options=None, networks=("tcp", "ws"), mux_values=(False, True), tls_values=(False, True)):
+    """
+    Expands one server's options into transport x mux x TLS variants.
+    Combinations the config builder rejects are skipped.
+
+    :return: A list of (variant_name, options) tuples.
+    """
+    base_options = dict(base_options or {})
+    variants = []
+    for network, mux, tls in itertools.product(networks, mux_values, tls_values):
+        options = dict(base_options, network=network, mux=mux, tls=tls)
+        if validate_options(options):
+            continue
+        name = network + ("+tls" if tls else "") + ("+mux" if mux else "")
+        variants.append((name, options))
+    return variants
+
+
+def build_server_config(port, user_uuid, options):
+    """
+    Builds a vmess server config matching the client options, so the core itself can
+    act as a local stand-in server. TLS variants are not supported (no certificate).
+    """
+    network = options.get("network", "tcp")
+    stream_settings = {"network": network}
+    if network == "ws":
+        stream_settings["wsSettings"] = {"path": options.get("ws_path", "/")}
+    elif network == "grpc":
+        stream_settings["grpcSettings"] = {"serviceName": options.get("grpc_service_name", "")}
+    return {
+        "log": {"loglevel": "warning"},
+        "inbounds": [{
+            "port": port,
+            "listen": "127.0.0.1",
+            "protocol": "vmess",
+            "settings": {"clients": [{"id": user_uuid, "alterId": 0}]},
+            "streamSettings": stream_settings,
+        }],
+        "outbounds": [{"protocol": "freedom"}],
+    }
+
+
+def _timed_fetch(opener, url, timeout):
+    """Fetches url and returns (elapsed_seconds, bytes_received)."""
+    start = time.perf_counter()
+    received = 0
+    with opener.open(url, timeout=timeout) as response:
+        while True:
+            chunk = response.read(65536)
+            if not chunk:
+                break
+            received += len(chunk)
+    return time.perf_counter() - start, received
+
+
+def measure_variant(http_proxy, latency_url, throughput_url, repeats=5, timeout=30):
+    """
+    Runs latency and throughput tests through an HTTP proxy.
+
+    :return: A dict of raw samples and error count.
+    """
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler({'http': http_proxy, 'https': http_proxy}))
+    latencies, throughputs, errors = [], [], 0
+    for _ in range(repeats):
+        try:
+            elapsed, _ = _timed_fetch(opener, latency_url, timeout)
+            latencies.append(elapsed * 1000)
+        except Exception:
+            errors += 1
+    for _ in range(max(1, repeats // 2)):
+        try:
+            elapsed, received = _timed_fetch(opener, throughput_url, timeout)
+            if elapsed > 0:
+                throughputs.append(received * 8 / elapsed / 1e6)
+        except Exception:
+            errors += 1
+    return {"latencies_ms": latencies, "throughputs_mbps": throughputs, "errors": errors}
+
+
+def run_benchmark(address, port, user_uuid, variants, latency_url=DEFAULT_LATENCY_URL,
+                  throughput_url=DEFAULT_THROUGHPUT_URL, repeats=5, executable=None,
+                  local_server=False, log_callback=print):
+    """
+    Starts an isolated core per variant and measures it.
+
+    :param variants: Output of expand_matrix().
+    :param local_server: Also start a stand-in vmess server per variant on a free
+                         local port (address/port are then ignored).
+    :return: Results ranked best first, see rank_results().
+    """
+    results = []
+    for name, options in variants:
+        if local_server and options.get("tls"):
+            log_callback(f"Skipping variant {name}: the local stand-in server has no TLS certificate.")
+            continue
+        log_callback(f"Benchmarking variant {name}...")
+        results.append(_run_variant(name, address, port, user_uuid, options, latency_url, throughput_url, repeats,
+                                    executable, executable, DEFAULT_BACKEND, local_server, log_callback))
+    return rank_results(results)
+
+
+def compare_backends(address, port, user_uuid, options, backends, latency_url=DEFAULT_LATENCY_URL,
+                     throughput_url=DEFAULT_THROUGHPUT_URL, repeats=5, server_executable=None,
+                     local_server=False, prober=None, log_callback=print):
+    """
+    Runs the same server through each core backend side by side.
+
+    :param backends: A list of (backend, executable), e.g. core.backends.available_backends().
+    :param server_executable: v2ray binary for the local stand-in server.
+    :return: Results ranked best first, see rank_results(); variants are named after the cores.
+    """
+    if local_server and options.get("tls"):
+        raise ValueError("the local stand-in server has no TLS certificate")
+    prober = prober or BackendProber()
+    network = options.get("network", "tcp")
+    results = []
+    for backend, executable in backends:
+        try:
+            probe = prober.probe(backend, executable)
+        except (OSError, subprocess.SubprocessError) as e:
+            log_callback(f"Skipping {backend.display_name}: probing failed: {e}")
+            continue
+        if network not in probe["networks"]:
+            log_callback(f"Skipping {backend.display_name} {probe['version']}: transport {network} is not supported.")
+            continue
+        name = f"{backend.name} {probe['version'] or ''}".strip()
+        log_callback(f"Benchmarking {name}...")
+        results.append(_run_variant(name, address, port, user_uuid, options, latency_url, throughput_url, repeats,
+                                    executable, server_executable, backend.name, local_server, log_callback))
+    return rank_results(results)
+
+
+def _run_variant(name, address, port, user_uuid, options, latency_url, throughput_url, repeats,
+                 executable, server_executable, backend, local_server, log_callback):
+    """Starts one isolated client core (and optionally a local stand-in server) and measures it."""
+    server = None
+    try:
+        target_address, target_port = address, port
+        if local_server:
+            target_address, target_port = "127.0.0.1", find_free_port()
+            server = IsolatedCore(build_server_config(target_port, user_uuid, options),
+                                  executable=server_executable, rewrite_ports=False).start()
+        config = build_config(target_address, target_port, user_uuid, options)
+        if local_server:
+            # The local test targets are on loopback, which the default routing sends direct
+            config = without_direct_rules(config)
+        with IsolatedCore(config, executable=executable, backend=backend) as core:
+            samples = measure_variant(core.http_proxy, latency_url, throughput_url, repeats)
+        return dict(samples, variant=name)
+    except Exception as e:
+        log_callback(f"Variant {name} failed: {e}")
+        return {"variant": name, "latencies_ms": [], "throughputs_mbps": [], "errors": repeats, "failure": str(e)}
+    finally:
+        if server:
+            server.stop()
+
+
+def rank_results(results):
+    """Adds mean/CI summaries and sorts by throughput (desc), then latency (asc)."""
+    for result in results:
+        result["latency"] = confidence_interval(result["latencies_ms"])
+        result["throughput"] = confidence_interval(result["throughputs_mbps"])
+    return sorted(results, key=lambda r: (not r["latencies_ms"], -r["throughput"][0], r["latency"][0]))
+
+
+def format_table(results):
+    """Renders ranked results as a fixed-width text table."""
+    lines = [f"{'#':>2}  {'variant':<20} {'latency ms (95% CI)':>22} {'Mbps (95% CI)':>20} {'errors':>6}"]
+    for rank, result in enumerate(results, 1):
+        latency, latency_ci = result["latency"]
+        throughput, throughput_ci = result["throughput"]
+        if result["latencies_ms"]:
+            latency_text = f"{latency:.1f} ± {latency_ci:.1f}"
+        else:
+            latency_text = "n/a"
+        throughput_text = f"{throughput:.2f} ± {throughput_ci:.2f}" if result["throughputs_mbps"] else "n/a"
+        lines.append(f"{rank:>2}  {result['variant']:<20} {latency_text:>22} {throughput_text:>20} {result['errors']:>6}")
+    return "\n".join(lines)
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import csv
+import json
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from core.config_builder import build_config, DEFAULT_OPTIONS
+from core.templates import make_overlay, TEMPLATE_KEY
+
+_TRUE_STRINGS = {"1", "true", "yes", "y", "on"}
+_REQUIRED_FIELDS = ("address", "port", "uuid")
+_UNSAFE_FILENAME = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+
+
+def load_inventory(path):
+    """
+    Reads a server inventory from a CSV, JSON or YAML file.
+
+    JSON/YAML files hold either a list of rows or {"defaults": {...}, "servers": [...]}.
+    :return: (defaults, rows) where each row is a dict.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if ext == ".csv":
+            return {}, [row for row in csv.DictReader(f)]
+        if ext in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("PyYAML is not installed; use a CSV or JSON inventory instead.")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    if isinstance(data, dict):
+        return data.get("defaults", {}), data.get("servers", [])
+    return {}, data
+
+
+def _coerce_option(key, value):
+    """Converts an inventory value (possibly a CSV string) to the option's type."""
+    default = DEFAULT_OPTIONS[key]
+    if not isinstance(value, str):
+        return value
+    value = value.strip()
+    if isinstance(default, bool):
+        return value.lower() in _TRUE_STRINGS
+    if isinstance(default, int) or (default is None and key != "access_log"):
+        return int(value) if value else default
+    if isinstance(default, list):
+        return [item.strip() for item in value.replace(";", ",").split(",") if item.strip()]
+    return value or default
+
+
+def row_options(row, defaults=None):
+    """Merges inventory defaults with the row's own option overrides."""
+    options = {}
+    for source in (defaults or {}, row):
+        for key, value in source.items():
+            if key in DEFAULT_OPTIONS and value not in (None, ""):
+                options[key] = _coerce_option(key, value)
+    return options
+
+
+def safe_filename(text):
+    """Strips path separators and characters Windows rejects; "." and ".." become empty."""
+    return _UNSAFE_FILENAME.sub("_", str(text)).strip(" .")
+
+
+def contained_path(output_dir, filename):
+    """Joins filename to output_dir, refusing names that would leave the directory."""
+    root = os.path.abspath(output_dir)
+    path = os.path.abspath(os.path.join(root, filename))
+    if os.path.dirname(path) != root:
+        raise ValueError(f"unsafe file name {filename!r}")
+    return path
+
+
+def row_filename(row):
+    """
+    The output file name of a row: its filename/name column, else address_port, with
+    path separators and other unsafe characters replaced.
+
+    :raises ValueError: If the row is not a mapping or leaves no usable name.
+    :raises KeyError: If the row has no name and no address/port.
+    """
+    if not isinstance(row, dict):
+        raise ValueError(f"row is not a mapping: {row!r}"[:200])
+    name = safe_filename(row.get("filename") or row.get("name") or f"{row['address']}_{row['port']}")
+    if not name:
+        raise ValueError("empty file name")
+    return name if name.lower().endswith(".json") else name + ".json"
+
+
+def render_row(row, defaults=None, indent=None, template=None, output_dir="."):
+    """
+    Renders one inventory row to config file bytes.
+
+    :param template: Path of a base template; the row is then written as a small
+                     overlay holding only what differs from it (see core.templates).
+    """
+    missing = [field for field in _REQUIRED_FIELDS if not str(row.get(field, "")).strip()]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    config = build_config(str(row["address"]).strip(), int(row["port"]), str(row["uuid"]).strip(),
+                          row_options(row, defaults))
+    if template:
+        config = make_overlay(config, template, output_dir)
+    separators = None if indent else (",", ":")
+    return json.dumps(config, indent=indent, separators=separators, ensure_ascii=False).encode('utf-8')
+
+
+def file_digest(path):
+    """SHA-256 of a file's content, or None if it cannot be read."""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def write_if_changed(path, data):
+    """
+    Atomically writes data to path unless the file already holds the same content.
+
+    :return: "created", "updated" or "unchanged".
+    """
+    existed = os.path.exists(path)
+    if existed and os.path.getsize(path) == len(data) and file_digest(path) == hashlib.sha256(data).hexdigest():
+        return "unchanged"
+    directory = os.path.dirname(path) or "."
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return "updated" if existed else "created"
+
+
+def bulk_generate(rows, output_dir, defaults=None, workers=8, indent=None, template=None):
+    """
+    Renders every inventory row and writes the configs in parallel.
+
+    :param rows: Inventory rows, see load_inventory().
+    :param defaults: Options applied to every row before its own overrides.
+    :param template: Base template path; rows are written as overlays on top of it.
+    :return: A report {"created": [...], "updated": [...], "unchanged": [...], "failed": [(name, error)]}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    report = {"created": [], "updated": [], "unchanged": [], "failed": []}
+
+    # Rows sharing a file name would race each other; only the first one is written
+    jobs, owners = [], {}
+    for index, row in enumerate(rows, 1):
+        try:
+            name = row_filename(row)
+            path = contained_path(output_dir, name)
+        except KeyError as e:
+            report["failed"].append((f"row {index}", f"missing {e}"))
+            continue
+        except (ValueError, TypeError, AttributeError) as e:
+            report["failed"].append((f"row {index}", str(e)))
+            continue
+        key = name.lower()
+        if key in owners:
+            report["failed"].append((name, f"row {index} has the same file name as row {owners[key]}"))
+            continue
+        owners[key] = index
+        jobs.append((name, path, row))
+
+    def job(item):
+        name, path, row = item
+        try:
+            return write_if_changed(path, render_row(row, defaults, indent, template, output_dir)), name
+        except Exception as e:
+            return "failed", (name, str(e))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for status, item in executor.map(job, jobs):
+            report[status].append(item)
+    return report
+
+
+def templatize(paths, template, workers=8, indent=None):
+    """
+    Rewrites plain config files as overlays on a template, in place.
+    Overlays and files that fail to parse are reported as unchanged/failed.
+
+    :return: A report like bulk_generate()'s.
+    """
+    report = {"created": [], "updated": [], "unchanged": [], "failed": []}
+    template = os.path.abspath(template)
+
+    def job(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+            if TEMPLATE_KEY in config or os.path.abspath(path) == template:
+                return "unchanged", path
+            overlay = make_overlay(config, template, os.path.dirname(os.path.abspath(path)))
+            separators = None if indent else (",", ":")
+            data = json.dumps(overlay, indent=indent, separators=separators, ensure_ascii=False).encode('utf-8')
+            return write_if_changed(path, data), path
+        except Exception as e:
+            return "failed", (path, str(e))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for status, item in executor.map(job, paths):
+            report[status].append(item)
+    return report
+
+
+def format_report(report):
+    """One-line summary of a bulk_generate() report."""
+    return (f"created {len(report['created'])}, updated {len(report['updated'])}, "
+            f"unchanged {len(report['unchanged'])}, failed {len(report['failed'])}")
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+
+import re
+import time
+import socket
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor
+
+from core.probe import tcp_ping
+
+# Criteria servers can be grouped by; entries sharing any selected key end up in one cluster
+CLUSTER_KEYS = ("ip", "prefix", "hostname")
+DEFAULT_CLUSTER_KEYS = ("prefix", "hostname")
+IPV4_PREFIX = 24
+IPV6_PREFIX = 48
+# A cluster is expanded when its representative is within this factor of the best one...
+PROMISING_FACTOR = 2.0
+# ...or within this many milliseconds of it (keeps clusters close to a very fast best)
+PROMISING_SLACK_MS = 50.0
+# Members tried per cluster before it counts as unreachable (a representative may be down alone)
+REPRESENTATIVE_ATTEMPTS = 3
+
+_DIGITS = re.compile(r"\d+")
+
+
+def hostname_pattern(address):
+    """
+    Generalises a hostname by replacing digit runs, e.g. hk01.example.com and
+    hk12.example.com both become hk#.example.com. IP literals have no pattern.
+    """
+    try:
+        ipaddress.ip_address(address.strip("[]"))
+        return None
+    except ValueError:
+        return _DIGITS.sub("#", address.lower().rstrip("."))
+
+
+def network_prefix(ip):
+    """The /24 (IPv4) or /48 (IPv6) network of an address, as a string."""
+    address = ipaddress.ip_address(ip)
+    length = IPV4_PREFIX if address.version == 4 else IPV6_PREFIX
+    return str(ipaddress.ip_network(f"{address}/{length}", strict=False))
+
+
+def resolve_all(addresses, workers=32):
+    """
+    Resolves each distinct address once, concurrently.
+
+    :return: {address: [ip, ...]}; names that do not resolve map to an empty list.
+    """
+    def resolve(address):
+        try:
+            infos = socket.getaddrinfo(address.strip("[]"), None, socket.AF_UNSPEC, socket.SOCK_STREAM)
+        except (OSError, UnicodeError):
+            return address, []
+        ips = []
+        for info in infos:
+            if info[4][0] not in ips:
+                ips.append(info[4][0])
+        return address, ips
+
+    unique = list(dict.fromkeys(addresses))
+    if not unique:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(workers, len(unique))) as executor:
+        return dict(executor.map(resolve, unique))
+
+
+def cluster_servers(entries, keys=DEFAULT_CLUSTER_KEYS, resolved=None):
+    """
+    Groups servers that most likely share a host or network.
+
+    Each entry is labelled with one key per selected criterion - its resolved IPs
+    ("ip"), their /24 or /48 networks ("prefix") and its hostname pattern
+    ("hostname") - and entries sharing any label are merged (union-find).
+
+    :param entries: Objects with .address and .port (e.g. ServerEntry).
+    :param resolved: {address: [ip, ...]} from resolve_all(); resolved here when omitted.
+    :return: A list of clusters, each a list of entries, largest first.
+    """
+    unknown = [key for key in keys if key not in CLUSTER_KEYS]
+    if unknown:
+        raise ValueError(f"unknown cluster keys: {', '.join(unknown)}")
+    if resolved is None:
+        resolved = resolve_all([entry.address for entry in entries])
+
+    parent = list(range(len(entries)))
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    owner = {}
+    for index, entry in enumerate(entries):
+        ips = resolved.get(entry.address, [])
+        labels = []
+        if "ip" in keys:
+            labels.extend(("ip", ip) for ip in ips)
+        if "prefix" in keys:
+            labels.extend(("prefix", network_prefix(ip)) for ip in ips)
+        if "hostname" in keys:
+            pattern = hostname_pattern(entry.address)
+            if pattern:
+                labels.append(("hostname", pattern))
+        if not labels:
+            labels.append(("address", entry.address.lower()))
+        for label in labels:
+            other = owner.setdefault(label, index)
+            if other != index:
+                parent[find(index)] = find(other)
+
+    groups = {}
+    for index, entry in enumerate(entries):
+        groups.setdefault(find(index), []).append(entry)
+    return sorted(groups.values(), key=len, reverse=True)
+
+
+def candidate_order(cluster):
+    """Members in the order they are tried as representative: best previous latency first, then list order."""
+    measured = sorted((entry for entry in cluster if getattr(entry, "latency", None) is not None),
+                      key=lambda entry: entry.latency)
+    measured_ids = {id(entry) for entry in measured}
+    return measured + [entry for entry in cluster if id(entry) not in measured_ids]
+
+
+def pick_representative(cluster):
+    """The member probed first: the one with the best previous latency, else the first one."""
+    return candidate_order(cluster)[0]
+
+
+class ClusteredProber:
+    """
+    Probes a large server list in two phases.
+
+    Phase 1 probes one representative per cluster; when it fails, up to
+    `attempts` members in total are tried before the cluster counts as unreachable.
+    Phase 2 probes the remaining members of "promising" clusters only - those whose
+    representative answered within PROMISING_FACTOR times (or PROMISING_SLACK_MS of)
+    the best representative, optionally also under an absolute max_latency. Members
+    of other clusters are not probed: they keep their previous latency but are marked
+    stale (entry.stale = True) so it is not mistaken for a fresh measurement.
+    """
+    def __init__(self, probe=None, workers=32, timeout=5.0, keys=DEFAULT_CLUSTER_KEYS,
+                 factor=PROMISING_FACTOR, slack_ms=PROMISING_SLACK_MS, max_latency=None,
+                 attempts=REPRESENTATIVE_ATTEMPTS):
+        """
+        :param probe: probe(address, port, timeout) -> latency in ms, raising OSError on failure;
+                      defaults to core.probe.tcp_ping.
+        :param attempts: Members tried per cluster in phase 1 until one answers.
+        """
+        self.probe = probe or tcp_ping
+        self.workers = workers
+        self.timeout = timeout
+        self.keys = keys
+        self.factor = factor
+        self.slack_ms = slack_ms
+        self.max_latency = max_latency
+        self.attempts = max(1, attempts)
+
+    def _probe_all(self, entries):
+        """Probes entries concurrently; returns {id(entry): latency or None}."""
+        def probe(entry):
+            try:
+                return id(entry), self.probe(entry.address, entry.port, self.timeout)
+            except OSError:
+                return id(entry), None
+
+        if not entries:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(entries))) as executor:
+            return dict(executor.map(probe, entries))
+
+    def is_promising(self, latency, best):
+        if latency is None or best is None:
+            return False
+        if self.max_latency is not None and latency > self.max_latency:
+            return False
+        return latency <= max(best * self.factor, best + self.slack_ms)
+
+    def run(self, entries):
+        """
+        Probes the entries, storing each measured latency in entry.latency and
+        entry.stale = False; entries left unprobed get entry.stale = True.
+
+        :return: A report {"entries", "clusters", "promising_clusters", "probes", "fallback_probes",
+                 "measured", "reachable", "elapsed", "cluster_s", "representative_s", "expansion_s", "best"}.
+        """
+        entries = list(entries)
+        started = time.perf_counter()
+        clusters = cluster_servers(entries, self.keys)
+        clustered = time.perf_counter()
+
+        # Phase 1: one member per cluster, falling back to the next candidate while they fail
+        candidates = [candidate_order(cluster) for cluster in clusters]
+        representatives = [None] * len(clusters)
+        results = {}
+        pending = list(range(len(clusters)))
+        fallback_probes = 0
+        for attempt in range(self.attempts):
+            batch = {index: candidates[index][attempt] for index in pending if attempt < len(candidates[index])}
+            if not batch:
+                break
+            if attempt:
+                fallback_probes += len(batch)
+            results.update(self._probe_all(list(batch.values())))
+            for index, entry in batch.items():
+                representatives[index] = entry
+            pending = [index for index, entry in batch.items() if results[id(entry)] is None]
+        rep_latencies = [results[id(rep)] for rep in representatives]
+        best = min((latency for latency in rep_latencies if latency is not None), default=None)
+        probed_representatives = time.perf_counter()
+
+        promising = [cluster for cluster, latency in zip(clusters, rep_latencies) if self.is_promising(latency, best)]
+        results.update(self._probe_all([entry for cluster in promising for entry in cluster
+                                        if id(entry) not in results]))
+        finished = time.perf_counter()
+
+        best_entry = None
+        for entry in entries:
+            entry.stale = id(entry) not in results
+            if not entry.stale:
+                entry.latency = results[id(entry)]
+                if entry.latency is not None and (best_entry is None or entry.latency < best_entry.latency):
+                    best_entry = entry
+        return {
+            "entries": len(entries),
+            "clusters": len(clusters),
+            "promising_clusters": len(promising),
+            "probes": len(results),
+            "fallback_probes": fallback_probes,
+            "measured": [entry for entry in entries if id(entry) in results],
+            "reachable": sum(1 for latency in results.values() if latency is not None),
+            "elapsed": finished - started,
+            "cluster_s": clustered - started,
+            "representative_s": probed_representatives - clustered,
+            "expansion_s": finished - probed_representatives,
+            "best": best_entry,
+        }
+
+    def full_scan(self, entries):
+        """
+        Probes every entry (the baseline the clustered scan is compared with).
+
+        :return: {"probes", "reachable", "elapsed", "best"} - entry latencies are not modified.
+        """
+        entries = list(entries)
+        started = time.perf_counter()
+        results = self._probe_all(entries)
+        elapsed = time.perf_counter() - started
+        reachable = [entry for entry in entries if results[id(entry)] is not None]
+        best = min(reachable, key=lambda entry: results[id(entry)], default=None)
+        return {"probes": len(entries), "reachable": len(reachable), "elapsed": elapsed, "best": best,
+                "best_latency": results[id(best)] if best else None}
+
+
+def format_cluster_report(report, full=None):
+    """Human-readable summary of ClusteredProber.run(), optionally against full_scan()."""
+    lines = [
+        f"{report['entries']} servers in {report['clusters']} clusters, "
+        f"{report['promising_clusters']} promising",
+        f"clustered scan: {report['probes']} probes ({report['fallback_probes']} after a failed representative), "
+        f"{report['reachable']} reachable, {report['elapsed']:.2f} s "
+        f"(clustering {report['cluster_s']:.2f} s, representatives {report['representative_s']:.2f} s, "
+        f"expansion {report['expansion_s']:.2f} s)",
+    ]
+    if report["best"] is not None:
+        lines.append(f"best: {report['best'].address}:{report['best'].port} ({report['best'].latency:.1f} ms)")
+    if full is not None:
+        saved = 1 - report["probes"] / full["probes"] if full["probes"] else 0.0
+        speedup = full["elapsed"] / report["elapsed"] if report["elapsed"] else 0.0
+        lines.append(f"full scan: {full['probes']} probes, {full['reachable']} reachable, {full['elapsed']:.2f} s "
+                     f"-> {saved:.0%} fewer probes, {speedup:.1f}x faster")
+        if full["best"] is not None:
+            found = "found" if full["best"] in report["measured"] else "missed"
+            lines.append(f"full-scan best {full['best'].address}:{full['best'].port} "
+                         f"({full['best_latency']:.1f} ms) was {found} by the clustered scan")
+    else:
+        lines.append(f"a full scan would need {report['entries']} probes "
+                     f"({1 - report['probes'] / max(1, report['entries']):.0%} saved)")
+    return "\n".join(lines)
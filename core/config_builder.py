@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+
+import copy
+
+from core.constants import SOCKS_INBOUND_PORT, HTTP_INBOUND_PORT
+from core.templates import load_config
+
+NETWORKS = ["tcp", "ws", "grpc", "h2", "quic"]
+ALPN_VALUES = ["h2", "http/1.1", "h3"]
+FINGERPRINTS = ["", "chrome", "firefox", "safari", "ios", "edge", "randomized"]
+QUIC_SECURITIES = ["none", "aes-128-gcm", "chacha20-poly1305"]
+QUIC_HEADERS = ["none", "srtp", "utp", "wechat-video", "dtls", "wireguard"]
+# sockopt.domainStrategy: how the core resolves the server address ("" leaves the core default)
+DOMAIN_STRATEGIES = ["", "AsIs", "UseIP", "UseIPv4", "UseIPv6"]
+
+DEFAULT_OPTIONS = {
+    "network": "tcp",
+    "ws_path": "/",
+    "grpc_service_name": "",
+    "grpc_multi_mode": False,
+    "h2_path": "/",
+    "h2_host": "",
+    "quic_security": "none",
+    "quic_key": "",
+    "quic_header": "none",
+    "tls": False,
+    "server_name": "",
+    "alpn": [],
+    "fingerprint": "",
+    "mux": False,
+    "mux_concurrency": 8,
+    "tcp_fast_open": False,
+    "tcp_keepalive_interval": 0,
+    "mark": 0,
+    "domain_strategy": "",
+    "handshake_timeout": None,
+    "conn_idle_timeout": None,
+    "buffer_size": None,
+    "access_log": None,
+    "socks_port": SOCKS_INBOUND_PORT,
+    "http_port": HTTP_INBOUND_PORT,
+}
+
+
+def _is_int_in_range(value, low, high):
+    return isinstance(value, int) and not isinstance(value, bool) and low <= value <= high
+
+
+def validate_options(options):
+    """
+    Checks generator options for invalid values and unsupported combinations.
+
+    :param options: A dict of options; missing keys take their DEFAULT_OPTIONS value.
+    :return: A list of human-readable problems (empty if the options are usable).
+    """
+    opts = dict(DEFAULT_OPTIONS, **options)
+    problems = []
+    unknown = set(options) - set(DEFAULT_OPTIONS)
+    if unknown:
+        problems.append(f"Unknown options: {', '.join(sorted(unknown))}")
+
+    network = opts["network"]
+    if network not in NETWORKS:
+        problems.append(f"Unsupported transport '{network}', expected one of {', '.join(NETWORKS)}")
+    if network == "grpc" and not opts["grpc_service_name"]:
+        problems.append("gRPC transport requires a service name")
+    if network == "h2" and not opts["tls"]:
+        problems.append("h2 transport requires TLS")
+    if network == "quic":
+        if opts["quic_security"] not in QUIC_SECURITIES:
+            problems.append(f"Unsupported QUIC security '{opts['quic_security']}'")
+        if opts["quic_security"] != "none" and not opts["quic_key"]:
+            problems.append("QUIC encryption requires a key")
+        if opts["quic_header"] not in QUIC_HEADERS:
+            problems.append(f"Unsupported QUIC header type '{opts['quic_header']}'")
+        if opts["tcp_fast_open"]:
+            problems.append("TCP Fast Open has no effect on the QUIC transport")
+
+    if opts["mux"]:
+        if network in ("quic", "grpc", "h2"):
+            problems.append(f"Mux cannot be combined with the {network} transport, which already multiplexes streams")
+        if not _is_int_in_range(opts["mux_concurrency"], 1, 1024):
+            problems.append("Mux concurrency must be an integer between 1 and 1024")
+
+    if opts["alpn"] or opts["fingerprint"]:
+        if not opts["tls"]:
+            problems.append("ALPN and fingerprint settings require TLS")
+    for value in opts["alpn"]:
+        if value not in ALPN_VALUES:
+            problems.append(f"Unsupported ALPN value '{value}'")
+        elif value == "h3" and network != "quic":
+            problems.append("ALPN h3 is only meaningful on the QUIC transport")
+    if opts["fingerprint"] not in FINGERPRINTS:
+        problems.append(f"Unsupported TLS fingerprint '{opts['fingerprint']}'")
+
+    if not _is_int_in_range(opts["tcp_keepalive_interval"], 0, 86400):
+        problems.append("TCP keep-alive interval must be between 0 and 86400 seconds")
+    if not _is_int_in_range(opts["mark"], 0, 2 ** 32 - 1):
+        problems.append("Socket mark must be an unsigned 32-bit integer")
+    if opts["domain_strategy"] not in DOMAIN_STRATEGIES:
+        problems.append(f"Unsupported domain strategy '{opts['domain_strategy']}'")
+
+    for key, high in (("handshake_timeout", 300), ("conn_idle_timeout", 86400), ("buffer_size", 1024 * 1024)):
+        value = opts[key]
+        if value is not None and not _is_int_in_range(value, 0, high):
+            problems.append(f"{key} must be an integer between 0 and {high}")
+
+    for key in ("socks_port", "http_port"):
+        if not _is_int_in_range(opts[key], 1, 65535):
+            problems.append(f"{key} must be between 1 and 65535")
+    if opts["socks_port"] == opts["http_port"]:
+        problems.append("SOCKS and HTTP inbounds cannot share a port")
+    return problems
+
+
+def build_config(address, port, user_uuid, options=None):
+    """
+    Builds a v2ray client config with a SOCKS and an HTTP inbound and one vmess outbound.
+
+    :param options: Generator options, see DEFAULT_OPTIONS.
+    :raises ValueError: If the options are invalid or form an unsupported combination.
+    """
+    options = options or {}
+    problems = validate_options(options)
+    if problems:
+        raise ValueError("; ".join(problems))
+    opts = dict(DEFAULT_OPTIONS, **options)
+    network = opts["network"]
+
+    config = {
+        "log": {"loglevel": "warning"},
+        "inbounds": [
+            {"port": opts["socks_port"], "listen": "127.0.0.1", "protocol": "socks", "settings": {"auth": "noauth", "udp": True}},
+            {"port": opts["http_port"], "listen": "127.0.0.1", "protocol": "http", "settings": {"auth": "noauth"}}
+        ],
+        "outbounds": [
+            {
+                "protocol": "vmess",
+                "tag": "proxy",
+                "settings": {
+                    "vnext": [
+                        {"address": address, "port": port, "users": [{"id": user_uuid, "alterId": 0}]}
+                    ]
+                },
+                "streamSettings": {"network": network}
+            },
+            {"protocol": "freedom", "tag": "direct"}
+        ],
+        "routing": {
+            "domainStrategy": "AsIs",
+            "rules": [{"type": "field", "ip": ["geoip:private"], "outboundTag": "direct"}]
+        }
+    }
+
+    outbound = config["outbounds"][0]
+    stream_settings = outbound["streamSettings"]
+
+    if network == "ws":
+        stream_settings["wsSettings"] = {"path": opts["ws_path"]}
+    elif network == "grpc":
+        stream_settings["grpcSettings"] = {"serviceName": opts["grpc_service_name"], "multiMode": opts["grpc_multi_mode"]}
+    elif network == "h2":
+        stream_settings["httpSettings"] = {"path": opts["h2_path"], "host": [opts["h2_host"] or address]}
+    elif network == "quic":
+        stream_settings["quicSettings"] = {"security": opts["quic_security"], "key": opts["quic_key"],
+                                           "header": {"type": opts["quic_header"]}}
+
+    if opts["tls"]:
+        stream_settings["security"] = "tls"
+        tls_settings = {"serverName": opts["server_name"] or address}
+        if opts["alpn"]:
+            tls_settings["alpn"] = list(opts["alpn"])
+        if opts["fingerprint"]:
+            tls_settings["fingerprint"] = opts["fingerprint"]
+        stream_settings["tlsSettings"] = tls_settings
+
+    sockopt = {}
+    if opts["tcp_fast_open"]:
+        sockopt["tcpFastOpen"] = True
+    if opts["tcp_keepalive_interval"]:
+        sockopt["tcpKeepAliveInterval"] = opts["tcp_keepalive_interval"]
+    if opts["mark"]:
+        sockopt["mark"] = opts["mark"]
+    if opts["domain_strategy"]:
+        sockopt["domainStrategy"] = opts["domain_strategy"]
+    if sockopt:
+        stream_settings["sockopt"] = sockopt
+
+    if opts["mux"]:
+        outbound["mux"] = {"enabled": True, "concurrency": opts["mux_concurrency"]}
+
+    level_policy = {}
+    for key, name in (("handshake_timeout", "handshake"), ("conn_idle_timeout", "connIdle"), ("buffer_size", "bufferSize")):
+        if opts[key] is not None:
+            level_policy[name] = opts[key]
+    if level_policy:
+        config["policy"] = {"levels": {"0": level_policy}}
+
+    if opts["access_log"]:
+        config["log"]["access"] = opts["access_log"]
+
+    return config
+
+
+
+def with_inbound_ports(config, socks_port, http_port):
+    """Returns a copy of config whose SOCKS and HTTP inbounds listen on the given ports."""
+    config = copy.deepcopy(config)
+    for inbound in config.get("inbounds", []):
+        if inbound.get("protocol") == "socks":
+            inbound["port"] = socks_port
+        elif inbound.get("protocol") == "http":
+            inbound["port"] = http_port
+    return config
+
+
+def without_direct_rules(config):
+    """
+    Returns a copy of config without routing rules that bypass the proxy, so that
+    test targets on loopback/private addresses are reached through the server.
+    """
+    config = copy.deepcopy(config)
+    routing = config.get("routing")
+    if routing:
+        routing["rules"] = [rule for rule in routing.get("rules", []) if rule.get("outboundTag") != "direct"]
+    return config
+
+
+def parse_config_details(config):
+    """
+    Extracts the first vmess/vless server and the HTTP inbound port from a config dict.
+
+    :return: (address, port, http_port); missing values are None.
+    """
+    address, port, http_port = None, None, None
+    for outbound in config.get("outbounds", []):
+        if outbound.get("protocol") in ["vmess", "vless"]:
+            vnext = outbound.get("settings", {}).get("vnext", [])
+            if vnext:
+                address = vnext[0].get("address")
+                port = vnext[0].get("port")
+                break
+    for inbound in config.get("inbounds", []):
+        if inbound.get("protocol") == "http":
+            http_port = inbound.get("port")
+            break
+    return address, port, http_port
+
+
+def load_config_details(path):
+    """Reads a config file (resolving template overlays) and returns parse_config_details() of it."""
+    return parse_config_details(load_config(path))
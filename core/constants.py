@@ -5,9 +5,20 @@ import os
 APP_NAME = "V2flyClient"
 SETTINGS_FILE = "settings.json"
 LAST_CONFIG_FILE = "last_config.txt"
+ACCESS_LOG_FILE = "access.log"
 
 DEFAULT_CONFIG_PATH = os.path.join('configs', 'default.json')
 V2RAY_CORE_PATH = os.path.join('v2fly-core', 'v2ray.exe')
+# Alternative cores, see core.backends
+XRAY_CORE_PATH = os.path.join('xray-core', 'xray.exe')
+SING_BOX_CORE_PATH = os.path.join('sing-box', 'sing-box.exe')
 
 SOCKS_INBOUND_PORT = 10808
 HTTP_INBOUND_PORT = 10809
+
+# Numeric severities of the core's log levels, lowest first
+CORE_LOG_LEVELS = {"debug": 0, "info": 1, "warning": 2, "error": 3}
+
+# geoip/geosite data shipped next to the core
+GEOIP_DAT_PATH = os.path.join('v2fly-core', 'geoip.dat')
+GEOSITE_DAT_PATH = os.path.join('v2fly-core', 'geosite.dat')
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import threading
+
+from core.config_builder import load_config_details
+from core.probe import tcp_ping, proxy_ping, PROXY_PROBE_URL
+from core.templates import materialize
+
+_WILDCARD_ADDRESSES = ("0.0.0.0", "::", "[::]")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    """
+    Per-server circuit breaker.
+
+    closed    -> probes and switching allowed; failure_threshold consecutive failures open it.
+    open      -> server is skipped until reset_timeout has elapsed, then it turns half-open.
+    half-open -> one trial probe; success closes the breaker, failure opens it again.
+    """
+    def __init__(self, failure_threshold=3, reset_timeout=120.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_latency = None
+
+    def current_state(self, now=None):
+        now = now if now is not None else time.monotonic()
+        if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        return self.state
+
+    def allows_traffic(self, now=None):
+        return self.current_state(now) != OPEN
+
+    def record_success(self, latency):
+        self.state = CLOSED
+        self.failures = 0
+        self.last_latency = latency
+
+    def record_failure(self, now=None):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = now if now is not None else time.monotonic()
+
+
+def local_inbound(config_path):
+    """
+    Returns (host, port, protocol) of the first socks or http inbound of a config,
+    or None if it has none with a fixed port.
+    """
+    with open(materialize(config_path), 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    for inbound in config.get("inbounds", []):
+        protocol = inbound.get("protocol")
+        if protocol in ("socks", "http") and isinstance(inbound.get("port"), int):
+            host = inbound.get("listen", "127.0.0.1")
+            if host in _WILDCARD_ADDRESSES:
+                host = "::1" if ":" in host else "127.0.0.1"
+            return host.strip("[]"), inbound["port"], protocol
+    return None
+
+
+class FailoverController:
+    """
+    Health-checks the active server and fails over to the most preferred healthy one.
+
+    The active server is probed every `interval` seconds with a request sent through the
+    running core's local inbound, so a server that accepts TCP but no longer relays
+    traffic counts as failed; candidates are not running yet and get a TCP probe. After
+    `failure_threshold` consecutive failed probes the controller walks the preference-ordered
+    server list, skipping servers whose breaker is open, and restarts the core on the first
+    one that answers a probe. A switch is never made less than `min_dwell` seconds after the
+    previous one, to avoid flapping between two degraded servers.
+    """
+    def __init__(self, v2ray_manager, config_paths, log_callback, interval=10.0, failure_threshold=3,
+                 min_dwell=60.0, reset_timeout=120.0, probe_timeout=3.0, on_exit_callback=None, on_switch=None,
+                 probe_url=PROXY_PROBE_URL):
+        """
+        :param v2ray_manager: The V2rayManager used to restart the core.
+        :param config_paths: Config files in preference order.
+        :param on_exit_callback: Passed to V2rayManager.start() when restarting.
+        :param on_switch: Called with the new config path after a successful switch.
+        :param probe_url: Fetched through the active core's inbound by the health check.
+        """
+        self.v2ray_manager = v2ray_manager
+        self.config_paths = list(config_paths)
+        self.log_callback = log_callback
+        self.interval = interval
+        self.failure_threshold = failure_threshold
+        self.min_dwell = min_dwell
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        self.on_exit_callback = on_exit_callback
+        self.on_switch = on_switch
+        self.probe_url = probe_url
+        # True while switch_to() restarts the core; exit callbacks of the old core can be ignored
+        self.switching = False
+        self.breakers = {path: CircuitBreaker(failure_threshold, reset_timeout) for path in self.config_paths}
+        self.active_path = None
+        self.consecutive_failures = 0
+        self.last_switch = 0.0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _breaker(self, path):
+        """Returns the breaker of a server, creating it with the controller's settings."""
+        if path not in self.breakers:
+            self.breakers[path] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self.breakers[path]
+
+    def start(self, active_path):
+        """Starts health-checking; active_path is the config the core is currently running."""
+        self.active_path = active_path
+        self.last_switch = time.monotonic()
+        self.consecutive_failures = 0
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        self.log_callback(f"Failover: monitoring {os.path.basename(active_path)} every {self.interval:g}s "
+                          f"({len(self.config_paths)} servers in preference order).")
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _loop(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.check_once()
+            except Exception as e:
+                self.log_callback(f"Failover: health check error: {e}")
+
+    def probe(self, path, through_core=False):
+        """
+        Probes a server; updates its breaker and returns the latency in ms or None.
+
+        :param through_core: Send the probe through the running core's local inbound (for the
+                             active server) instead of connecting to the server directly.
+        """
+        breaker = self._breaker(path)
+        try:
+            inbound = local_inbound(path) if through_core else None
+            if inbound:
+                latency = proxy_ping(*inbound, url=self.probe_url, timeout=self.probe_timeout)
+            else:
+                address, port, _ = load_config_details(path)
+                if not address or not port:
+                    raise ValueError("no server address in config")
+                latency = tcp_ping(address, port, self.probe_timeout)
+        except Exception as e:
+            breaker.record_failure()
+            self.log_callback(f"Failover: probe of {os.path.basename(path)} failed ({e}); breaker {breaker.current_state()}.")
+            return None
+        breaker.record_success(latency)
+        return latency
+
+    def check_once(self):
+        """Runs one health check of the active server and fails over if needed."""
+        if not self.active_path or not self.v2ray_manager.is_running():
+            return
+        if self.probe(self.active_path, through_core=True) is not None:
+            self.consecutive_failures = 0
+            return
+
+        self.consecutive_failures += 1
+        if self.consecutive_failures < self.failure_threshold:
+            return
+        dwell = time.monotonic() - self.last_switch
+        if dwell < self.min_dwell:
+            self.log_callback(f"Failover: active server unhealthy but only {dwell:.0f}s since last switch "
+                              f"(minimum dwell {self.min_dwell:g}s); staying.")
+            return
+
+        candidate = self.pick_candidate()
+        if candidate is None:
+            self.log_callback("Failover: no healthy alternative server; staying on the current one.")
+            return
+        self.switch_to(candidate)
+
+    def pick_candidate(self):
+        """Returns the most preferred server, other than the active one, that passes a probe."""
+        for path in self.config_paths:
+            if path == self.active_path:
+                continue
+            breaker = self._breaker(path)
+            if not breaker.allows_traffic():
+                self.log_callback(f"Failover: skipping {os.path.basename(path)} (breaker open).")
+                continue
+            latency = self.probe(path)
+            if latency is not None:
+                self.log_callback(f"Failover: candidate {os.path.basename(path)} healthy ({latency:.0f} ms).")
+                return path
+        return None
+
+    def switch_to(self, path):
+        """
+        Restarts the core on the given config.
+
+        While the restart is in progress `switching` is set, so an exit callback of the old core
+        that arrives between stop and start can be told apart from a real stop. If the core is not
+        running once the switch is over, on_exit_callback is called again so the caller catches up.
+        """
+        self.log_callback(f"Failover: switching from {os.path.basename(self.active_path)} to {os.path.basename(path)} "
+                          f"after {self.consecutive_failures} failed probes.")
+        self.switching = True
+        try:
+            self.v2ray_manager.stop()
+            if not self.v2ray_manager.start(path, self.on_exit_callback):
+                self.log_callback("Failover: restart failed.")
+                return False
+            # Wait for the new core's inbounds so callers do not route traffic into a closed port
+            if not self.v2ray_manager.wait_ready(self.v2ray_manager.ready_timeout):
+                self.log_callback(f"Failover: {os.path.basename(path)} did not become ready in time.")
+            self.active_path = path
+            self.consecutive_failures = 0
+            self.last_switch = time.monotonic()
+        finally:
+            self.switching = False
+            if not self.v2ray_manager.is_running() and self.on_exit_callback:
+                self.on_exit_callback()
+        if self.on_switch:
+            self.on_switch(path)
+        return True
@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import mmap
+import sqlite3
+import threading
+import ipaddress
+
+from core.settings import get_persistent_data_path
+from core.utils import resource_path
+from core.constants import GEOIP_DAT_PATH, GEOSITE_DAT_PATH
+
+GEODATA_CACHE_DIR = "geodata"
+
+# routercommon.Domain.Type
+DOMAIN_PLAIN, DOMAIN_REGEX, DOMAIN_ROOT, DOMAIN_FULL = 0, 1, 2, 3
+DOMAIN_TYPE_NAMES = {DOMAIN_PLAIN: "keyword", DOMAIN_REGEX: "regexp", DOMAIN_ROOT: "domain", DOMAIN_FULL: "full"}
+
+_WIRE_VARINT, _WIRE_64BIT, _WIRE_LENGTH, _WIRE_32BIT = 0, 1, 2, 5
+
+
+def read_varint(buf, pos):
+    """Decodes a protobuf varint at pos; returns (value, new_pos)."""
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def iter_fields(buf, start, end):
+    """
+    Iterates the fields of a protobuf message stored in buf[start:end] without copying.
+
+    Yields (field_number, wire_type, value). For length-delimited fields the value is
+    the (start, end) range of the payload inside buf.
+    """
+    pos = start
+    while pos < end:
+        key, pos = read_varint(buf, pos)
+        field, wire = key >> 3, key & 7
+        if wire == _WIRE_VARINT:
+            value, pos = read_varint(buf, pos)
+        elif wire == _WIRE_LENGTH:
+            length, pos = read_varint(buf, pos)
+            value = (pos, pos + length)
+            pos += length
+        elif wire == _WIRE_64BIT:
+            value, pos = None, pos + 8
+        elif wire == _WIRE_32BIT:
+            value, pos = None, pos + 4
+        else:
+            raise ValueError(f"unsupported protobuf wire type {wire} at offset {pos}")
+        yield field, wire, value
+
+
+def _cache_stem(path):
+    stat = os.stat(path)
+    directory = get_persistent_data_path(GEODATA_CACHE_DIR)
+    os.makedirs(directory, exist_ok=True)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(directory, f"{name}-{stat.st_size}-{int(stat.st_mtime)}")
+
+
+class GeoDataFile:
+    """
+    Lazy reader for v2ray's geoip.dat / geosite.dat.
+
+    The file is memory-mapped. Listing categories only walks the top-level message
+    (the result is cached on disk as category -> offset). Expanding a category decodes
+    just that entry. Matching a domain or IP uses an SQLite index that is built once
+    per file version, so neither operation loads the whole file into Python objects.
+    """
+    def __init__(self, path, kind=None):
+        """
+        :param path: Path of the .dat file.
+        :param kind: "geoip" or "geosite"; guessed from the file name when omitted.
+        """
+        self.path = path
+        self.kind = kind or ("geosite" if "geosite" in os.path.basename(path).lower() else "geoip")
+        self._file = open(path, 'rb')
+        # mmap cannot map an empty file; an empty .dat simply has no categories
+        if os.fstat(self._file.fileno()).st_size:
+            self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.data = b""
+        self.cache_stem = _cache_stem(path)
+        self._offsets = None
+        self._db_lock = threading.Lock()
+        self._keyword_cache = None
+        self._regex_cache = None
+        self._ip_prefixes = None
+        self._inverse_categories = None
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._file.close()
+
+    # --- category index ---
+    def offsets(self):
+        """Returns {category: (start, end)} of each entry, cached on disk."""
+        if self._offsets is not None:
+            return self._offsets
+        index_path = self.cache_stem + ".idx.json"
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                self._offsets = {code: tuple(span) for code, span in json.load(f).items()}
+            return self._offsets
+        except (OSError, ValueError):
+            pass
+
+        offsets = {}
+        for field, wire, span in iter_fields(self.data, 0, len(self.data)):
+            if field != 1 or wire != _WIRE_LENGTH:
+                continue
+            for inner_field, inner_wire, value in iter_fields(self.data, *span):
+                if inner_field == 1 and inner_wire == _WIRE_LENGTH:
+                    offsets[self.data[value[0]:value[1]].decode('utf-8').lower()] = span
+                    break
+        try:
+            with open(index_path, 'w', encoding='utf-8') as f:
+                json.dump(offsets, f)
+        except OSError:
+            pass
+        self._offsets = offsets
+        return offsets
+
+    def categories(self):
+        return sorted(self.offsets())
+
+    # --- lazy entry decoding ---
+    def expand(self, category):
+        """
+        Decodes one category.
+
+        :return: For geoip a list of CIDR strings; for geosite a list of (type_name, value, attributes).
+        """
+        span = self.offsets().get(category.lower())
+        if span is None:
+            raise KeyError(category)
+        if self.kind == "geoip":
+            return [str(network) for network, _ in self._iter_cidrs(span)]
+        return [(DOMAIN_TYPE_NAMES.get(t, str(t)), value, attrs) for t, value, attrs in self._iter_domains(span)]
+
+    def _iter_cidrs(self, span):
+        """Yields (ip_network, inverse_match) of a GeoIP entry."""
+        inverse = False
+        cidr_spans = []
+        for field, wire, value in iter_fields(self.data, *span):
+            if field == 2 and wire == _WIRE_LENGTH:
+                cidr_spans.append(value)
+            elif field == 3 and wire == _WIRE_VARINT:
+                inverse = bool(value)
+        for cidr_span in cidr_spans:
+            ip, prefix = b"", 0
+            for field, wire, value in iter_fields(self.data, *cidr_span):
+                if field == 1 and wire == _WIRE_LENGTH:
+                    ip = self.data[value[0]:value[1]]
+                elif field == 2 and wire == _WIRE_VARINT:
+                    prefix = value
+            if len(ip) not in (4, 16):
+                continue
+            address = ipaddress.ip_address(ip)
+            yield ipaddress.ip_network((address, prefix), strict=False), inverse
+
+    def _iter_domains(self, span):
+        """Yields (type, value, [attribute keys]) of a GeoSite entry."""
+        for field, wire, value in iter_fields(self.data, *span):
+            if field != 2 or wire != _WIRE_LENGTH:
+                continue
+            domain_type, domain_value, attrs = DOMAIN_PLAIN, "", []
+            for inner_field, inner_wire, inner in iter_fields(self.data, *value):
+                if inner_field == 1 and inner_wire == _WIRE_VARINT:
+                    domain_type = inner
+                elif inner_field == 2 and inner_wire == _WIRE_LENGTH:
+                    domain_value = self.data[inner[0]:inner[1]].decode('utf-8')
+                elif inner_field == 3 and inner_wire == _WIRE_LENGTH:
+                    for attr_field, attr_wire, attr in iter_fields(self.data, *inner):
+                        if attr_field == 1 and attr_wire == _WIRE_LENGTH:
+                            attrs.append(self.data[attr[0]:attr[1]].decode('utf-8'))
+            yield domain_type, domain_value, attrs
+
+    # --- lookup index ---
+    def _connect(self):
+        """Opens (building on first use) the SQLite lookup index of this file."""
+        db_path = self.cache_stem + ".sqlite"
+        with self._db_lock:
+            if not os.path.exists(db_path):
+                self._build_index(db_path)
+        return sqlite3.connect(db_path)
+
+    def _build_index(self, db_path):
+        temp_path = db_path + ".tmp"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        db = sqlite3.connect(temp_path)
+        try:
+            if self.kind == "geoip":
+                db.execute("CREATE TABLE cidrs (version INTEGER, prefix INTEGER, network BLOB, category TEXT, inverse INTEGER)")
+                for category, span in self.offsets().items():
+                    db.executemany("INSERT INTO cidrs VALUES (?, ?, ?, ?, ?)",
+                                   ((net.version, net.prefixlen, net.network_address.packed, category, int(inverse))
+                                    for net, inverse in self._iter_cidrs(span)))
+                db.execute("CREATE INDEX cidrs_lookup ON cidrs (version, prefix, network)")
+            else:
+                db.execute("CREATE TABLE domains (value TEXT, type INTEGER, category TEXT, attrs TEXT)")
+                for category, span in self.offsets().items():
+                    db.executemany("INSERT INTO domains VALUES (?, ?, ?, ?)",
+                                   ((value.lower(), t, category, ",".join(attrs))
+                                    for t, value, attrs in self._iter_domains(span)))
+                db.execute("CREATE INDEX domains_value ON domains (value)")
+            db.commit()
+        finally:
+            db.close()
+        os.replace(temp_path, db_path)
+
+    def build_index(self):
+        """Builds the lookup index now (it is otherwise built on the first lookup)."""
+        self._connect().close()
+
+    def match_domain(self, domain):
+        """
+        Returns [(category, rule)] of geosite rules matching a domain, e.g.
+        [("google", "domain:google.com")].
+        """
+        domain = domain.strip().lower().rstrip(".")
+        labels = domain.split(".")
+        suffixes = [".".join(labels[i:]) for i in range(len(labels))]
+        matches = []
+        db = self._connect()
+        try:
+            placeholders = ",".join("?" * len(suffixes))
+            for value, domain_type, category in db.execute(
+                    f"SELECT value, type, category FROM domains WHERE value IN ({placeholders})", suffixes):
+                if domain_type == DOMAIN_ROOT or (domain_type == DOMAIN_FULL and value == domain):
+                    matches.append((category, f"{DOMAIN_TYPE_NAMES[domain_type]}:{value}"))
+            if self._keyword_cache is None:
+                self._keyword_cache = db.execute("SELECT value, category FROM domains WHERE type = ?",
+                                                 (DOMAIN_PLAIN,)).fetchall()
+            if self._regex_cache is None:
+                self._regex_cache = []
+                for value, category in db.execute("SELECT value, category FROM domains WHERE type = ?", (DOMAIN_REGEX,)):
+                    try:
+                        self._regex_cache.append((re.compile(value), value, category))
+                    except re.error:
+                        continue
+        finally:
+            db.close()
+        for value, category in self._keyword_cache:
+            if value in domain:
+                matches.append((category, f"keyword:{value}"))
+        for pattern, value, category in self._regex_cache:
+            if pattern.search(domain):
+                matches.append((category, f"regexp:{value}"))
+        return sorted(set(matches))
+
+    def match_ip(self, ip):
+        """
+        Returns [(category, reason)] of geoip categories matching an IP address: reason is
+        the containing cidr, or "not in <n> listed cidrs" for an inverse-match category whose
+        list does not contain the address. An address inside an inverse-match entry does
+        not match it.
+        """
+        address = ipaddress.ip_address(ip.strip())
+        bits = address.max_prefixlen
+        value = int(address)
+        matches = []
+        excluded = set()
+        db = self._connect()
+        try:
+            if self._ip_prefixes is None:
+                self._ip_prefixes = {}
+                for version, prefix in db.execute("SELECT DISTINCT version, prefix FROM cidrs"):
+                    self._ip_prefixes.setdefault(version, []).append(prefix)
+                self._inverse_categories = dict(db.execute(
+                    "SELECT category, COUNT(*) FROM cidrs WHERE inverse = 1 GROUP BY category"))
+            for prefix in self._ip_prefixes.get(address.version, []):
+                mask = ((1 << bits) - 1) ^ ((1 << (bits - prefix)) - 1)
+                network = (value & mask).to_bytes(bits // 8, "big")
+                for category, inverse in db.execute(
+                        "SELECT category, inverse FROM cidrs WHERE version = ? AND prefix = ? AND network = ?",
+                        (address.version, prefix, network)):
+                    if inverse:
+                        excluded.add(category)
+                    else:
+                        matches.append((category, f"{ipaddress.ip_address(network)}/{prefix}"))
+        finally:
+            db.close()
+        matches.extend((category, f"not in {count} listed cidrs")
+                       for category, count in self._inverse_categories.items() if category not in excluded)
+        return sorted(matches)
+
+
+_open_files = {}
+_open_lock = threading.Lock()
+
+
+def open_geodata(kind):
+    """Returns the shared GeoDataFile for "geoip" or "geosite", or None if the file is missing."""
+    path = resource_path(GEOIP_DAT_PATH if kind == "geoip" else GEOSITE_DAT_PATH)
+    with _open_lock:
+        cached = _open_files.get(kind)
+        if cached and cached.path == path and os.path.exists(path) and cached.cache_stem == _cache_stem(path):
+            return cached
+        if cached:
+            # The file was replaced or removed. Other threads may still be reading the old
+            # instance, so it is only dropped here; its mapping goes when the last user lets go
+            del _open_files[kind]
+        if not os.path.exists(path):
+            return None
+        _open_files[kind] = GeoDataFile(path, kind)
+        return _open_files[kind]
+
+
+def close_all():
+    """
+    Closes the shared GeoDataFiles. Call before replacing geoip.dat/geosite.dat:
+    Windows does not allow replacing a file that is still memory-mapped.
+    """
+    with _open_lock:
+        for geodata in _open_files.values():
+            geodata.close()
+        _open_files.clear()
+
+
+def unknown_geo_references(config):
+    """
+    Lists geoip:/geosite: references in a config's routing rules that the shipped
+    .dat files do not contain. References to files that are missing are not reported.
+    """
+    problems = []
+    for rule in config.get("routing", {}).get("rules", []):
+        for key, kind in (("ip", "geoip"), ("domain", "geosite"), ("domains", "geosite")):
+            for item in rule.get(key, []) or []:
+                if not isinstance(item, str) or not item.startswith(kind + ":"):
+                    continue
+                category = item[len(kind) + 1:].split("@", 1)[0].lstrip("!").lower()
+                geodata = open_geodata(kind)
+                if geodata is not None and category not in geodata.offsets():
+                    problems.append(f"routing rule references unknown category {kind}:{category}")
+    return problems
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import json
+import tempfile
+import subprocess
+
+from core.utils import find_free_port, wait_for_port
+from core.backends import get_backend, DEFAULT_BACKEND
+from core.config_builder import with_inbound_ports
+from core.resource_limits import build_launch, apply_limits, remove_cgroup
+
+
+class IsolatedCore:
+    """
+    Runs a throwaway core instance on free local ports, independent of the
+    V2rayManager that drives the UI. Intended for benchmarks and tests.
+
+    Usage:
+        with IsolatedCore(config) as core:
+            urllib.request.build_opener(urllib.request.ProxyHandler({"http": core.http_proxy}))
+    """
+    def __init__(self, config, executable=None, rewrite_ports=True, ready_timeout=10.0, launch_limits=None,
+                 backend=DEFAULT_BACKEND):
+        """
+        :param config: The config dict to run.
+        :param executable: Path of the core binary; defaults to the backend's bundled binary.
+        :param rewrite_ports: Move the SOCKS/HTTP inbounds onto free ports.
+        :param launch_limits: Scheduling/resource limits for the core (see core.resource_limits).
+        :param backend: Name of the core backend; the config is translated into its dialect.
+        """
+        self.backend = get_backend(backend)
+        self.executable = executable or self.backend.default_executable()
+        self.ready_timeout = ready_timeout
+        self.launch_limits = launch_limits
+        self.socks_port = None
+        self.http_port = None
+        if rewrite_ports:
+            self.socks_port = find_free_port()
+            self.http_port = find_free_port()
+            config = with_inbound_ports(config, self.socks_port, self.http_port)
+        self.config = config
+        self.process = None
+        self.cgroup = None
+        self.config_file = None
+        self.output_file = None
+
+    @property
+    def http_proxy(self):
+        return f"127.0.0.1:{self.http_port}"
+
+    def start(self):
+        """Starts the core and waits until its first inbound accepts connections."""
+        fd, self.config_file = tempfile.mkstemp(prefix="v2py-", suffix=".json")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.backend.translate_config(self.config)[0], f)
+        # Output goes to a temp file so a chatty core can never block on a full pipe
+        self.output_file = tempfile.TemporaryFile()
+        command, launch_kwargs = build_launch(self.backend.run_command(self.executable, self.config_file),
+                                              self.launch_limits, log_callback=lambda message: None)
+        creationflags = launch_kwargs.pop("creationflags", 0)
+        if sys.platform == "win32":
+            creationflags |= subprocess.CREATE_NO_WINDOW
+        self.process = subprocess.Popen(
+            command,
+            stdout=self.output_file,
+            stderr=subprocess.STDOUT,
+            creationflags=creationflags,
+            **launch_kwargs
+        )
+        if self.launch_limits:
+            self.cgroup = apply_limits(self.process.pid, self.launch_limits,
+                                       f"isolated-{os.getpid()}-{id(self):x}", log_callback=lambda message: None)
+        ports = [inbound.get("port") for inbound in self.config.get("inbounds", []) if inbound.get("port")]
+        deadline = time.monotonic() + self.ready_timeout
+        for port in ports:
+            while not wait_for_port("127.0.0.1", port, timeout=0.2):
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    output = self.read_output()
+                    self.stop()
+                    raise RuntimeError(f"Core did not become ready on port {port}: {output.strip()[-500:]}")
+        return self
+
+    def read_output(self):
+        """Returns everything the core has written so far."""
+        if not self.output_file:
+            return ""
+        self.output_file.seek(0)
+        return self.output_file.read().decode('utf-8', errors='replace')
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+        remove_cgroup(self.cgroup)
+        self.cgroup = None
+        if self.output_file:
+            self.output_file.close()
+            self.output_file = None
+        if self.config_file and os.path.exists(self.config_file):
+            os.remove(self.config_file)
+        self.config_file = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
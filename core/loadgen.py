@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+import time
+import socket
+import struct
+import asyncio
+import ipaddress
+from collections import Counter
+
+from core.stats import percentiles
+
+SOCKS = "socks"
+HTTP = "http"
+
+
+class ProxyHandshakeError(Exception):
+    """The local inbound refused or failed the proxy handshake."""
+
+
+def socks5_address(host, port):
+    """Encodes a SOCKS5 DST.ADDR/DST.PORT pair."""
+    try:
+        ip = ipaddress.ip_address(host)
+        atyp = b"\x01" if ip.version == 4 else b"\x04"
+        return atyp + ip.packed + struct.pack("!H", port)
+    except ValueError:
+        encoded = host.encode("idna")
+        return b"\x03" + bytes([len(encoded)]) + encoded + struct.pack("!H", port)
+
+
+async def read_socks5_reply(reader):
+    """Reads a SOCKS5 reply and returns the bound (host, port)."""
+    head = await reader.readexactly(4)
+    if head[0] != 5 or head[1] != 0:
+        raise ProxyHandshakeError(f"socks reply {head[1]}")
+    atyp = head[3]
+    if atyp == 1:
+        host = socket.inet_ntoa(await reader.readexactly(4))
+    elif atyp == 4:
+        host = socket.inet_ntop(socket.AF_INET6, await reader.readexactly(16))
+    else:
+        length = (await reader.readexactly(1))[0]
+        host = (await reader.readexactly(length)).decode("idna")
+    port = struct.unpack("!H", await reader.readexactly(2))[0]
+    return host, port
+
+
+async def socks5_handshake(reader, writer, command, host, port):
+    """Performs a no-auth SOCKS5 handshake and returns the reply's bound address."""
+    writer.write(b"\x05\x01\x00")
+    await writer.drain()
+    method = await reader.readexactly(2)
+    if method != b"\x05\x00":
+        raise ProxyHandshakeError("socks auth rejected")
+    writer.write(b"\x05" + bytes([command]) + b"\x00" + socks5_address(host, port))
+    await writer.drain()
+    return await read_socks5_reply(reader)
+
+
+async def http_connect_handshake(reader, writer, host, port):
+    """Performs an HTTP CONNECT handshake."""
+    target = f"[{host}]:{port}" if ":" in host else f"{host}:{port}"
+    writer.write(f"CONNECT {target} HTTP/1.1\r\nHost: {target}\r\n\r\n".encode("ascii"))
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = head.split(b"\r\n", 1)[0].split()
+    if len(status) < 2 or status[1] != b"200":
+        raise ProxyHandshakeError(f"http status {status[1].decode('ascii', 'replace') if len(status) > 1 else '?'}")
+
+
+async def open_tunnel(proxy_kind, proxy_host, proxy_port, target_host, target_port):
+    """Opens a connection to the target through a local SOCKS5 or HTTP inbound."""
+    reader, writer = await asyncio.open_connection(proxy_host, proxy_port)
+    try:
+        if proxy_kind == SOCKS:
+            await socks5_handshake(reader, writer, 1, target_host, target_port)
+        else:
+            await http_connect_handshake(reader, writer, target_host, target_port)
+    except BaseException:
+        writer.close()
+        raise
+    return reader, writer
+
+
+async def _one_connection(proxy_kind, proxy_host, proxy_port, target_host, target_port, payload, timeout):
+    """Returns (handshake_ms, total_ms); raises on failure."""
+    start = time.perf_counter()
+
+    async def exchange():
+        reader, writer = await open_tunnel(proxy_kind, proxy_host, proxy_port, target_host, target_port)
+        handshake = time.perf_counter()
+        try:
+            writer.write(payload)
+            await writer.drain()
+            await reader.readexactly(len(payload))
+        finally:
+            writer.close()
+        return handshake
+
+    handshake = await asyncio.wait_for(exchange(), timeout)
+    return (handshake - start) * 1000, (time.perf_counter() - start) * 1000
+
+
+def _error_name(error):
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(error, asyncio.IncompleteReadError):
+        return "closed early"
+    if isinstance(error, ProxyHandshakeError):
+        return str(error)
+    return type(error).__name__
+
+
+async def run_load_async(proxy_kind, proxy_port, target_host, target_port, connections=500,
+                         concurrency=50, rate=0.0, payload_size=64, timeout=10.0, proxy_host="127.0.0.1"):
+    """
+    Opens `connections` short-lived connections through the local inbound.
+
+    :param concurrency: Maximum connections in flight.
+    :param rate: Connection starts per second (0 = as fast as concurrency allows).
+    :return: A report dict, see format_load_report().
+    """
+    payload = b"x" * payload_size
+    semaphore = asyncio.Semaphore(concurrency)
+    handshakes, totals, errors = [], [], Counter()
+    interval = 1.0 / rate if rate > 0 else 0.0
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    async def worker(index):
+        if interval:
+            delay = started + index * interval - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        async with semaphore:
+            try:
+                handshake_ms, total_ms = await _one_connection(proxy_kind, proxy_host, proxy_port,
+                                                               target_host, target_port, payload, timeout)
+                handshakes.append(handshake_ms)
+                totals.append(total_ms)
+            except Exception as e:
+                errors[_error_name(e)] += 1
+
+    await asyncio.gather(*(worker(i) for i in range(connections)))
+    elapsed = loop.time() - started
+    return {
+        "proxy": proxy_kind,
+        "connections": connections,
+        "succeeded": len(totals),
+        "elapsed": elapsed,
+        "cps": len(totals) / elapsed if elapsed > 0 else 0.0,
+        "handshake_ms": percentiles(handshakes, (50, 90, 99)),
+        "total_ms": percentiles(totals, (50, 90, 99)),
+        "errors": dict(errors),
+    }
+
+
+def run_load(*args, **kwargs):
+    """Synchronous wrapper around run_load_async() for threads and the CLI."""
+    return asyncio.run(run_load_async(*args, **kwargs))
+
+
+def format_load_report(report):
+    hs, total = report["handshake_ms"], report["total_ms"]
+    lines = [
+        f"{report['proxy']}: {report['succeeded']}/{report['connections']} connections in {report['elapsed']:.2f}s "
+        f"({report['cps']:.1f} conn/s)",
+        f"  handshake ms  p50 {hs['p50']:.1f}  p90 {hs['p90']:.1f}  p99 {hs['p99']:.1f}",
+        f"  complete ms   p50 {total['p50']:.1f}  p90 {total['p90']:.1f}  p99 {total['p99']:.1f}",
+    ]
+    if report["errors"]:
+        lines.append("  errors: " + ", ".join(f"{name} x{count}" for name, count in sorted(report["errors"].items())))
+    return "\n".join(lines)
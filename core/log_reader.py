@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+import re
+import sys
+import selectors
+
+from core.constants import CORE_LOG_LEVELS
+
+# v2ray log prefix, e.g. "2024/01/02 03:04:05 [Warning] ..." (the fractional part is optional)
+_LEVEL_PATTERN = re.compile(rb'\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)? \[(\w+)\]')
+_LEVEL_BY_NAME = {name.encode('ascii'): value for name, value in CORE_LOG_LEVELS.items()}
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def parse_level(buffer, default, start=0, end=None):
+    """
+    Returns the numeric log level of a raw (bytes) core log line.
+
+    :param buffer: The bytes holding the line; only buffer[start:end] is inspected.
+    :param default: The level used when the line carries no recognised prefix.
+    """
+    match = _LEVEL_PATTERN.match(buffer, start, len(buffer) if end is None else end)
+    if not match:
+        return default
+    return _LEVEL_BY_NAME.get(match.group(1).lower(), default)
+
+
+class CoreOutputReader:
+    """
+    Reads stdout/stderr of the core process on the calling thread.
+
+    Both pipes are read in binary mode through a selector (POSIX), lines are split
+    from reusable buffers and their level prefix is inspected before decoding, so
+    lines below the forwarding threshold cost almost nothing. On Windows, where
+    pipes cannot be selected, stderr is expected to be merged into stdout and a
+    single pipe is read the same way.
+    """
+    def __init__(self, log_callback, threshold="info", sample_every=0, level_parser=parse_level):
+        """
+        :param log_callback: A function to call with forwarded log lines.
+        :param threshold: Name of the lowest level that is always forwarded.
+        :param sample_every: Forward one in N lines below the threshold (0 drops them all).
+        :param level_parser: parse_level() or a core backend's equivalent for its log format.
+        """
+        self.log_callback = log_callback
+        self.level_parser = level_parser
+        self.threshold = CORE_LOG_LEVELS[threshold]
+        self.sample_every = sample_every
+        self.dropped = 0
+        self._marker = None
+        self._marker_event = None
+
+    def set_threshold(self, threshold):
+        """Changes the forwarding threshold; safe to call from any thread."""
+        self.threshold = CORE_LOG_LEVELS[threshold]
+
+    def watch_for(self, marker, event):
+        """
+        Sets event once a line containing marker (bytes) is read, whatever its level.
+        Only one marker is watched at a time; it is forgotten once seen.
+        """
+        self._marker_event = event
+        self._marker = marker
+
+    def read_pipes(self, streams):
+        """
+        Reads until every stream reaches EOF.
+
+        :param streams: A list of (raw_stream, name, default_level) tuples. The
+                        streams must be unbuffered (Popen(bufsize=0)).
+        """
+        # One read buffer per call, reused for every chunk of this process's output
+        chunk = bytearray(READ_CHUNK_SIZE)
+        if sys.platform == "win32":
+            for stream, name, default_level in streams:
+                pending = bytearray()
+                while self._read_once(chunk, stream, name, default_level, pending):
+                    pass
+            return
+
+        with selectors.DefaultSelector() as selector:
+            for stream, name, default_level in streams:
+                selector.register(stream, selectors.EVENT_READ, (name, default_level, bytearray()))
+            while selector.get_map():
+                for key, _ in selector.select():
+                    name, default_level, pending = key.data
+                    if not self._read_once(chunk, key.fileobj, name, default_level, pending):
+                        selector.unregister(key.fileobj)
+
+    def _read_once(self, chunk, stream, name, default_level, pending):
+        """Reads one chunk and emits complete lines. Returns False on EOF."""
+        view = memoryview(chunk)
+        try:
+            count = stream.readinto(view)
+        except OSError:
+            count = 0
+        if not count:
+            if pending:
+                self._emit(pending, 0, len(pending), name, default_level)
+                del pending[:]
+            return False
+
+        pending += view[:count]
+        start = 0
+        while True:
+            end = pending.find(b'\n', start)
+            if end < 0:
+                break
+            self._emit(pending, start, end, name, default_level)
+            start = end + 1
+        if start:
+            del pending[:start]
+        return True
+
+    def _emit(self, buffer, start, end, name, default_level):
+        if self._marker is not None and buffer.find(self._marker, start, end) >= 0:
+            self._marker = None
+            self._marker_event.set()
+        level = self.level_parser(buffer, default_level, start, end)
+        if level < self.threshold:
+            self.dropped += 1
+            if not self.sample_every or self.dropped % self.sample_every:
+                return
+            name = f"{name} sampled"
+        text = buffer[start:end].decode('utf-8', errors='replace').strip()
+        if text:
+            self.log_callback(f"[{name}] {text}")
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import socket
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from core.settings import get_persistent_data_path
+from core.utils import resource_path
+from core.constants import GEOIP_DAT_PATH, GEOSITE_DAT_PATH
+from core.geodata import unknown_geo_references
+from core.backends import get_backend, write_translated_config, DEFAULT_BACKEND
+from core.templates import materialize, is_template_path, TemplateError
+
+PREFLIGHT_CACHE_FILE = "preflight_cache.json"
+PREFLIGHT_CACHE_LIMIT = 5000
+
+# streamSettings.network values understood by v2ray
+KNOWN_NETWORKS = {"tcp", "kcp", "mkcp", "ws", "websocket", "http", "h2", "domainsocket", "quic", "grpc", "gun", "httpupgrade"}
+SERVER_PROTOCOLS = {"vmess", "vless"}
+
+
+def structural_checks(config):
+    """
+    Static sanity checks that need neither the core nor the network.
+
+    :return: A list of problems (empty if none were found).
+    """
+    problems = []
+    if not isinstance(config, dict):
+        return ["config root is not a JSON object"]
+
+    outbounds = config.get("outbounds")
+    if not outbounds:
+        problems.append("no outbounds defined")
+    for index, outbound in enumerate(outbounds or []):
+        tag = outbound.get("tag") or f"#{index}"
+        protocol = outbound.get("protocol")
+        if protocol in SERVER_PROTOCOLS:
+            vnext = outbound.get("settings", {}).get("vnext")
+            if not vnext:
+                problems.append(f"outbound {tag}: {protocol} without vnext")
+            for server in vnext or []:
+                if not server.get("address"):
+                    problems.append(f"outbound {tag}: server without address")
+                port = server.get("port")
+                if not isinstance(port, int) or not 1 <= port <= 65535:
+                    problems.append(f"outbound {tag}: invalid server port {port!r}")
+                if not server.get("users"):
+                    problems.append(f"outbound {tag}: server without users")
+        network = outbound.get("streamSettings", {}).get("network", "tcp")
+        if network not in KNOWN_NETWORKS:
+            problems.append(f"outbound {tag}: unknown transport '{network}'")
+
+    seen_ports = {}
+    for index, inbound in enumerate(config.get("inbounds", [])):
+        port = inbound.get("port")
+        if port in seen_ports:
+            problems.append(f"inbound #{index}: port {port} is already used by inbound #{seen_ports[port]}")
+        else:
+            seen_ports[port] = index
+    return problems
+
+
+def busy_inbound_ports(config):
+    """Returns the inbound ports that another process is already listening on."""
+    busy = []
+    for inbound in config.get("inbounds", []):
+        port = inbound.get("port")
+        if not isinstance(port, int):
+            continue
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            if sys.platform != "win32":
+                # Lets the bind succeed over TIME_WAIT sockets of a core that just stopped; a
+                # listening socket still makes it fail. (On Windows the flag would allow port theft.)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                sock.bind((inbound.get("listen", "127.0.0.1"), port))
+            except OSError:
+                busy.append(port)
+    return busy
+
+
+def core_test(executable, config_path, timeout=20, backend=None):
+    """
+    Runs the core's own config check ("test -c" for v2ray).
+
+    :param backend: The core backend (see core.backends); defaults to v2ray.
+    :return: (problems, conclusive) - problems holds the core's error output (empty if the
+             test passed); conclusive is False when the test could not run or timed out.
+    """
+    backend = backend or get_backend(DEFAULT_BACKEND)
+    creationflags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+    test_path = config_path
+    try:
+        test_path, _ = write_translated_config(backend, config_path)
+        result = subprocess.run(backend.test_command(executable, test_path), capture_output=True,
+                                timeout=timeout, creationflags=creationflags)
+    except subprocess.TimeoutExpired:
+        return [f"core config test timed out after {timeout}s"], False
+    except (OSError, ValueError) as e:
+        return [f"core config test could not run: {e}"], False
+    finally:
+        if test_path != config_path:
+            os.remove(test_path)
+    if result.returncode == 0:
+        return [], True
+    output = (result.stdout + result.stderr).decode('utf-8', errors='replace').strip()
+    return [f"core config test failed (exit {result.returncode}): {output[-800:]}"], True
+
+
+def _executable_identity(executable):
+    try:
+        stat = os.stat(executable)
+        return f"{os.path.abspath(executable)}:{stat.st_size}:{int(stat.st_mtime)}"
+    except OSError:
+        return executable
+
+
+def _geodata_identity():
+    """Identifies the shipped geoip/geosite files, which both the geo check and the core test read."""
+    return ",".join(_executable_identity(resource_path(path)) for path in (GEOIP_DAT_PATH, GEOSITE_DAT_PATH))
+
+
+class PreflightValidator:
+    """
+    Validates configs before launch and caches the verdict by content hash.
+
+    The cache key covers the config bytes, the core binary, the geoip/geosite files
+    (path, size, mtime) and whether the core test is used, so an unchanged config is
+    validated once per core and geodata version. Checks that depend on the machine state, such as busy inbound ports, and
+    core tests that timed out or could not run are never cached.
+    """
+    def __init__(self, executable, cache_path=None, use_core_test=True, backend=None):
+        self.executable = executable
+        self.backend = backend or get_backend(DEFAULT_BACKEND)
+        self.cache_path = cache_path or get_persistent_data_path(PREFLIGHT_CACHE_FILE)
+        self.use_core_test = use_core_test
+        self.lock = threading.Lock()
+        self.cache = self._load_cache()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def save_cache(self):
+        with self.lock:
+            if len(self.cache) > PREFLIGHT_CACHE_LIMIT:
+                # Oldest entries first (dicts keep insertion order)
+                for key in list(self.cache)[:len(self.cache) - PREFLIGHT_CACHE_LIMIT]:
+                    del self.cache[key]
+            data = json.dumps(self.cache)
+        temp_path = self.cache_path + ".tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(temp_path, self.cache_path)
+        except OSError:
+            pass
+
+    def validate(self, config_path, check_ports=False, save=True):
+        """
+        :return: (ok, problems, cached)
+        """
+        try:
+            # Overlays are checked as the merged runtime config the core will run
+            config_path = materialize(config_path)
+        except TemplateError as e:
+            return False, [str(e)], False
+        except OSError as e:
+            return False, [f"cannot read config: {e}"], False
+        try:
+            with open(config_path, 'rb') as f:
+                content = f.read()
+        except OSError as e:
+            return False, [f"cannot read config: {e}"], False
+
+        # A structural-only verdict (use_core_test=False) must never stand in for a core-tested one
+        identity = (f"{self.backend.name}:{_executable_identity(self.executable)}:{_geodata_identity()}"
+                    f":{'core' if self.use_core_test else 'static'}")
+        key = hashlib.sha256(content + identity.encode('utf-8')).hexdigest()
+        with self.lock:
+            verdict = self.cache.get(key)
+        cached = verdict is not None
+        try:
+            config = json.loads(content)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            config, verdict = None, [f"invalid JSON: {e}"]
+
+        if verdict is None:
+            conclusive = True
+            verdict = structural_checks(config)
+            if not verdict:
+                verdict = unknown_geo_references(config)
+            if not verdict and self.use_core_test:
+                verdict, conclusive = core_test(self.executable, config_path, backend=self.backend)
+            if conclusive:
+                with self.lock:
+                    self.cache[key] = verdict
+                if save:
+                    self.save_cache()
+
+        problems = list(verdict)
+        if check_ports and config is not None and not problems:
+            problems.extend(f"inbound port {port} is already in use" for port in busy_inbound_ports(config))
+        return not problems, problems, cached
+
+    def validate_many(self, config_paths, workers=None):
+        """
+        Validates many configs in parallel; the core test runs in subprocesses,
+        so a thread pool is enough to keep every CPU busy.
+
+        :return: {path: (ok, problems, cached)}
+        """
+        workers = workers or min(16, (os.cpu_count() or 2) * 2)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = dict(zip(config_paths, executor.map(lambda p: self.validate(p, save=False), config_paths)))
+        self.save_cache()
+        return results
+
+
+def list_config_files(directory):
+    """Lists the .json files of a config directory, recursively, leaving out templates."""
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(".json"))
+    return sorted(path for path in paths if not is_template_path(path))
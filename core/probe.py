@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+import errno
+import socket
+import time
+import selectors
+import urllib.parse
+
+from core.loadgen import socks5_address
+
+# Delay between connection attempts (RFC 8305 recommends 250 ms)
+CONNECTION_ATTEMPT_DELAY = 0.25
+
+FAMILY_NAMES = {socket.AF_INET: "ipv4", socket.AF_INET6: "ipv6"}
+# sockopt.domainStrategy value that pins each family
+FAMILY_DOMAIN_STRATEGIES = {"ipv4": "UseIPv4", "ipv6": "UseIPv6"}
+# Fetched through the local inbound by proxy_ping()
+PROXY_PROBE_URL = "http://www.gstatic.com/generate_204"
+
+
+def resolve_addresses(address, port):
+    """
+    Resolves all A/AAAA records of address.
+
+    :return: [(family, sockaddr)] interleaved by family, IPv6 first (RFC 8305).
+    :raises socket.gaierror: If the name cannot be resolved.
+    """
+    by_family = {}
+    for family, _, _, _, sockaddr in socket.getaddrinfo(address, port, socket.AF_UNSPEC, socket.SOCK_STREAM):
+        if family in FAMILY_NAMES and sockaddr not in by_family.setdefault(family, []):
+            by_family[family].append(sockaddr)
+    ordered = []
+    for index in range(max((len(queue) for queue in by_family.values()), default=0)):
+        for family in (socket.AF_INET6, socket.AF_INET):
+            queue = by_family.get(family, [])
+            if index < len(queue):
+                ordered.append((family, queue[index]))
+    return ordered
+
+
+def probe_families(address, port, timeout=10, attempt_delay=CONNECTION_ATTEMPT_DELAY, all_families=True):
+    """
+    Races TCP connections to every resolved address, happy-eyeballs style: attempts
+    start attempt_delay apart (sooner when one fails) and alternate between families.
+
+    :param all_families: Keep going after the first success until every family has a
+                         result, so both can be reported; otherwise stop at the winner.
+    :return: {"winner": {"family", "ip", "latency_ms"} or None,
+              "families": {"ipv4": {"ip", "latency_ms", "error"}, ...},
+              "preferred": the family with the lower connect latency, or None}
+    :raises socket.gaierror: If the name cannot be resolved.
+    """
+    candidates = resolve_addresses(address, port)
+    families = {}
+    winner = None
+    pending = {}
+    selector = selectors.DefaultSelector()
+    deadline = time.perf_counter() + timeout
+    next_start = time.perf_counter()
+
+    def family_done(name):
+        return name in families and families[name]["latency_ms"] is not None
+
+    def fail(name, ip, error):
+        families.setdefault(name, {"ip": ip, "latency_ms": None, "error": error})
+
+    try:
+        while True:
+            now = time.perf_counter()
+            # Start the next attempt when it is due, skipping families that already succeeded
+            while candidates and (now >= next_start or not pending):
+                family, sockaddr = candidates.pop(0)
+                name = FAMILY_NAMES[family]
+                if family_done(name):
+                    continue
+                sock = socket.socket(family, socket.SOCK_STREAM)
+                sock.setblocking(False)
+                code = sock.connect_ex(sockaddr)
+                if code not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, getattr(errno, "WSAEWOULDBLOCK", -1)):
+                    sock.close()
+                    fail(name, sockaddr[0], errno.errorcode.get(code, str(code)))
+                    continue
+                pending[sock] = (name, sockaddr[0], now)
+                selector.register(sock, selectors.EVENT_WRITE)
+                next_start = now + attempt_delay
+                break
+
+            if not pending and not candidates:
+                break
+            now = time.perf_counter()
+            if now >= deadline:
+                for name, ip, _ in pending.values():
+                    fail(name, ip, "timeout")
+                break
+            wait = deadline - now
+            if candidates:
+                wait = min(wait, max(0.0, next_start - now))
+            for key, _ in selector.select(wait):
+                sock = key.fileobj
+                if sock not in pending:
+                    # Closed above after another attempt of its family won in this same batch
+                    continue
+                name, ip, started = pending.pop(sock)
+                selector.unregister(sock)
+                error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                sock.close()
+                if error:
+                    fail(name, ip, errno.errorcode.get(error, str(error)))
+                    next_start = time.perf_counter()  # Failed attempts hand over immediately
+                    continue
+                latency = (time.perf_counter() - started) * 1000
+                if not family_done(name):
+                    families[name] = {"ip": ip, "latency_ms": latency, "error": None}
+                if winner is None:
+                    winner = {"family": name, "ip": ip, "latency_ms": latency}
+                # Attempts of a family that has a result are no longer needed
+                for other, (other_name, _, _) in list(pending.items()):
+                    if other_name == name:
+                        selector.unregister(other)
+                        other.close()
+                        del pending[other]
+            if winner and not all_families:
+                break
+    finally:
+        for sock in pending:
+            sock.close()
+        selector.close()
+
+    measured = {name: result for name, result in families.items() if result["latency_ms"] is not None}
+    preferred = min(measured, key=lambda name: measured[name]["latency_ms"]) if measured else None
+    return {"winner": winner, "families": families, "preferred": preferred}
+
+
+def tcp_ping(address, port, timeout=10):
+    """
+    Measures the time to open a TCP connection over whichever address family
+    connects first (IPv4 and IPv6 are raced).
+
+    :return: The connect latency in milliseconds.
+    :raises OSError: (including socket.timeout / socket.gaierror) if the connection fails.
+    """
+    result = probe_families(address, port, timeout, all_families=False)
+    if result["winner"]:
+        return result["winner"]["latency_ms"]
+    errors = {info["error"] for info in result["families"].values()}
+    if errors == {"timeout"}:
+        raise socket.timeout(f"connecting to {address}:{port} timed out")
+    raise OSError(f"cannot connect to {address}:{port}: {', '.join(sorted(errors)) or 'no addresses'}")
+
+
+def proxy_ping(proxy_host, proxy_port, protocol, url=PROXY_PROBE_URL, timeout=10):
+    """
+    Sends an HTTP request through a local socks or http inbound, so the whole path
+    (inbound, core, server and destination) is exercised rather than just the server's port.
+
+    :param protocol: "socks" or "http", the protocol of the inbound.
+    :return: Milliseconds until the response status line arrived.
+    :raises OSError: If the connection, the proxy handshake or the request fails.
+    """
+    parsed = urllib.parse.urlsplit(url)
+    host, port = parsed.hostname, parsed.port or 80
+    start = time.perf_counter()
+    with socket.create_connection((proxy_host, proxy_port), timeout=timeout) as sock:
+        if protocol == "socks":
+            sock.sendall(b"\x05\x01\x00")
+            if _recv_exact(sock, 2) != b"\x05\x00":
+                raise ConnectionError("socks no-auth method rejected")
+            sock.sendall(b"\x05\x01\x00" + socks5_address(host, port))
+            head = _recv_exact(sock, 4)
+            if head[1] != 0:
+                raise ConnectionError(f"socks connect rejected (reply {head[1]})")
+            # Skip the bound address (IPv4, IPv6 or length-prefixed domain) and port
+            length = {1: 4, 4: 16}.get(head[3]) or _recv_exact(sock, 1)[0]
+            _recv_exact(sock, length + 2)
+            target = parsed.path or "/"
+        else:
+            target = url  # Absolute form for an HTTP proxy
+        sock.sendall(f"GET {target} HTTP/1.1\r\nHost: {parsed.netloc}\r\nConnection: close\r\n\r\n".encode("ascii"))
+        status_line = sock.makefile("rb").readline(1024)
+    parts = status_line.split()
+    if len(parts) < 2 or not parts[0].startswith(b"HTTP/"):
+        raise ConnectionError("no HTTP response through the proxy")
+    if not parts[1].startswith((b"2", b"3")):
+        raise ConnectionError(f"HTTP {parts[1].decode('ascii', errors='replace')} through the proxy")
+    return (time.perf_counter() - start) * 1000
+
+
+def _recv_exact(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("proxy closed the connection during the handshake")
+        data += chunk
+    return data
+
+
+def format_family_report(result):
+    """Human-readable per-family summary of probe_families()."""
+    parts = []
+    for name in ("ipv4", "ipv6"):
+        info = result["families"].get(name)
+        if not info:
+            continue
+        if info["latency_ms"] is not None:
+            mark = " *" if name == result["preferred"] and len(result["families"]) > 1 else ""
+            parts.append(f"{name.upper()} {info['ip']}: {info['latency_ms']:.1f} ms{mark}")
+        else:
+            parts.append(f"{name.upper()} {info['ip']}: {info['error']}")
+    return "; ".join(parts) or "no addresses"
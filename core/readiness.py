@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import socket
+import threading
+import statistics
+
+from core.settings import get_persistent_data_path
+
+STARTUP_LOG_FILE = "startup_times.jsonl"
+DEFAULT_READY_TIMEOUT = 15.0
+# Interval between connection attempts to inbounds that are not listening yet
+POLL_INTERVAL = 0.02
+# Listen addresses meaning "every interface"; readiness is checked through loopback
+_WILDCARD_ADDRESSES = {"", "0.0.0.0", "::", "[::]"}
+
+
+def inbound_endpoints(config):
+    """
+    Returns the (host, port) pairs the core accepts TCP connections on once it is up.
+
+    Inbounds without a fixed port (port ranges, env/allocation settings) and
+    UDP-only dokodemo-door inbounds are skipped.
+    """
+    endpoints = []
+    for inbound in config.get("inbounds", []):
+        port = inbound.get("port")
+        if not isinstance(port, int):
+            continue
+        network = str(inbound.get("settings", {}).get("network", "tcp"))
+        if "tcp" not in network.split(","):
+            continue
+        host = inbound.get("listen", "127.0.0.1")
+        if host in _WILDCARD_ADDRESSES:
+            host = "::1" if ":" in host else "127.0.0.1"
+        endpoints.append((host.strip("[]"), port))
+    return endpoints
+
+
+def _accepts(host, port):
+    try:
+        with socket.create_connection((host, port), timeout=POLL_INTERVAL * 10):
+            return True
+    except OSError:
+        return False
+
+
+class ReadinessWatcher:
+    """
+    Decides when a freshly spawned core is ready to carry traffic.
+
+    The core counts as ready once every inbound accepts TCP connections and, when a
+    marker event is given, the core has also logged its start-up line (the event is
+    set by CoreOutputReader.watch_for()). Times are measured from `spawned_at`, a
+    time.monotonic() value taken right before the process was spawned.
+    """
+    def __init__(self, process, endpoints, spawned_at, marker_event=None, timeout=DEFAULT_READY_TIMEOUT):
+        """
+        :param process: The core's subprocess.Popen object; an early exit ends the wait.
+        :param endpoints: (host, port) pairs from inbound_endpoints().
+        :param marker_event: threading.Event set when the log marker is seen, or None to skip it.
+        """
+        self.process = process
+        self.endpoints = list(endpoints)
+        self.spawned_at = spawned_at
+        self.marker_event = marker_event
+        self.timeout = timeout
+
+    def wait(self):
+        """
+        Blocks until the core is ready, exits or the timeout expires.
+
+        :return: {"ready": bool, "ready_ms", "ports_ms", "marker_ms": ms since spawn or None,
+                  "reason": None, "timeout" or "exited", "waiting_for": [unready "host:port" / "log marker"]}
+        """
+        deadline = self.spawned_at + self.timeout
+        pending = list(self.endpoints)
+        ports_ms = marker_ms = None
+        reason = "timeout"
+        while True:
+            now = time.monotonic()
+            pending = [endpoint for endpoint in pending if not _accepts(*endpoint)]
+            if not pending and ports_ms is None:
+                ports_ms = (time.monotonic() - self.spawned_at) * 1000
+            if self.marker_event is not None and marker_ms is None and self.marker_event.is_set():
+                marker_ms = (time.monotonic() - self.spawned_at) * 1000
+            if ports_ms is not None and (self.marker_event is None or marker_ms is not None):
+                reason = None
+                break
+            if self.process.poll() is not None:
+                reason = "exited"
+                break
+            if now >= deadline:
+                break
+            time.sleep(POLL_INTERVAL)
+
+        waiting_for = [f"{host}:{port}" for host, port in pending]
+        if self.marker_event is not None and marker_ms is None:
+            waiting_for.append("log marker")
+        ready_ms = max(ports_ms, marker_ms or 0) if reason is None else None
+        return {"ready": reason is None, "ready_ms": ready_ms, "ports_ms": ports_ms, "marker_ms": marker_ms,
+                "reason": reason, "waiting_for": waiting_for}
+
+
+_log_lock = threading.Lock()
+
+
+def record_startup(entry, path=None):
+    """Appends one start-up measurement to the JSONL history."""
+    path = path or get_persistent_data_path(STARTUP_LOG_FILE)
+    line = json.dumps(entry, ensure_ascii=False)
+    with _log_lock:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+
+
+def load_startup_history(path=None, limit=None):
+    """Reads the start-up history, oldest first; unreadable lines are skipped."""
+    path = path or get_persistent_data_path(STARTUP_LOG_FILE)
+    if not os.path.exists(path):
+        return []
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return entries[-limit:] if limit else entries
+
+
+def summarize_startups(entries):
+    """
+    Aggregates start-up measurements per backend.
+
+    :return: {backend: {"starts", "failures", "median_ms", "p95_ms", "max_ms", "last_ms"}}
+    """
+    grouped = {}
+    for entry in entries:
+        grouped.setdefault(entry.get("backend", "?"), []).append(entry)
+    summary = {}
+    for backend, items in grouped.items():
+        times = sorted(item["ready_ms"] for item in items if item.get("ready"))
+        summary[backend] = {
+            "starts": len(items),
+            "failures": sum(1 for item in items if not item.get("ready")),
+            "median_ms": statistics.median(times) if times else None,
+            "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))] if times else None,
+            "max_ms": times[-1] if times else None,
+            "last_ms": items[-1].get("ready_ms"),
+        }
+    return summary
+
+
+def format_startup_summary(summary):
+    """Plain-text table of summarize_startups()."""
+    def ms(value):
+        return f"{value:.0f}" if value is not None else "-"
+
+    lines = [f"{'backend':<10} {'starts':>6} {'failed':>6} {'median':>8} {'p95':>8} {'max':>8} {'last':>8}"]
+    for backend, row in sorted(summary.items()):
+        lines.append(f"{backend:<10} {row['starts']:>6} {row['failures']:>6} {ms(row['median_ms']):>8} "
+                     f"{ms(row['p95_ms']):>8} {ms(row['max_ms']):>8} {ms(row['last_ms']):>8}")
+    return "\n".join(lines)
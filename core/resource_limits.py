@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import shutil
+import subprocess
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+# Keys of a launch-limits dict; None/empty means "leave the default"
+DEFAULT_LIMITS = {
+    "nice": None,               # niceness increment (POSIX) / priority class (Windows)
+    "ionice_class": None,       # "idle" or "best-effort" (Linux, via the ionice tool)
+    "ionice_level": 7,          # 0 (highest) .. 7 (lowest) for best-effort
+    "cpu_affinity": [],         # CPU indices (Linux)
+    "nofile": None,             # RLIMIT_NOFILE
+    "address_space_mb": None,   # RLIMIT_AS
+    "cgroup_memory_mb": None,   # cgroup v2 memory.max (Linux)
+    "cgroup_cpu_percent": None, # cgroup v2 cpu.max, percent of one CPU (Linux)
+}
+
+_IONICE_CLASSES = {"best-effort": "2", "idle": "3"}
+
+
+def validate_limits(limits):
+    """Returns a list of problems with a launch-limits dict."""
+    opts = dict(DEFAULT_LIMITS, **limits)
+    problems = []
+    if opts["nice"] is not None and not -20 <= opts["nice"] <= 19:
+        problems.append("nice must be between -20 and 19")
+    if opts["ionice_class"] not in (None, "", *_IONICE_CLASSES):
+        problems.append("ionice class must be 'idle' or 'best-effort'")
+    if not 0 <= opts["ionice_level"] <= 7:
+        problems.append("ionice level must be between 0 and 7")
+    cpu_count = os.cpu_count() or 1
+    if any(not 0 <= cpu < cpu_count for cpu in opts["cpu_affinity"]):
+        problems.append(f"CPU affinity entries must be between 0 and {cpu_count - 1}")
+    for key in ("nofile", "address_space_mb", "cgroup_memory_mb", "cgroup_cpu_percent"):
+        if opts[key] is not None and opts[key] <= 0:
+            problems.append(f"{key} must be positive")
+    return problems
+
+
+def _own_cgroup():
+    """Path of this process's cgroup v2 directory, or None."""
+    try:
+        with open("/proc/self/cgroup", 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith("0::"):
+                    return os.path.join(CGROUP_ROOT, line[3:].strip().lstrip("/"))
+    except OSError:
+        pass
+    return None
+
+
+def prepare_cgroup(name, memory_mb=None, cpu_percent=None):
+    """
+    Creates a cgroup v2 sibling of our own cgroup with memory/CPU caps.
+
+    :return: The cgroup directory.
+    :raises OSError: If cgroup v2 is unavailable or not delegated to this user.
+    """
+    own = _own_cgroup()
+    if not own or not os.path.exists(os.path.join(CGROUP_ROOT, "cgroup.controllers")):
+        raise OSError("cgroup v2 is not available")
+    path = os.path.join(os.path.dirname(own), f"v2py-{name}")
+    os.makedirs(path, exist_ok=True)
+    if memory_mb:
+        with open(os.path.join(path, "memory.max"), 'w') as f:
+            f.write(str(int(memory_mb) * 1024 * 1024))
+    if cpu_percent:
+        period = 100000
+        with open(os.path.join(path, "cpu.max"), 'w') as f:
+            f.write(f"{int(period * cpu_percent / 100)} {period}")
+    return path
+
+
+def remove_cgroup(path):
+    """Removes a cgroup created by prepare_cgroup() once its processes have exited."""
+    if not path:
+        return
+    try:
+        os.rmdir(path)
+    except OSError:
+        pass
+
+
+def build_launch(command, limits, log_callback=print):
+    """
+    Turns the launch-time part of the limits into Popen arguments: the Windows
+    priority class and the nice/taskset/ionice wrappers. Niceness and CPU affinity
+    are per thread on Linux, so they are set before the core starts and every thread
+    it creates inherits them. Everything else is applied to the running process by
+    apply_limits(), from the parent, so nothing runs between fork and exec.
+
+    :return: (command, popen_kwargs). Limits that cannot be applied on this
+             platform are reported through log_callback and skipped.
+    """
+    opts = dict(DEFAULT_LIMITS, **(limits or {}))
+    kwargs = {}
+
+    if sys.platform == "win32":
+        if opts["nice"] is not None and opts["nice"] > 0:
+            kwargs["creationflags"] = (subprocess.IDLE_PRIORITY_CLASS if opts["nice"] >= 15
+                                       else subprocess.BELOW_NORMAL_PRIORITY_CLASS)
+        unsupported = [key for key in ("ionice_class", "cpu_affinity", "nofile", "address_space_mb",
+                                       "cgroup_memory_mb", "cgroup_cpu_percent") if opts[key]]
+        if unsupported:
+            log_callback(f"Resource limits not supported on Windows, ignored: {', '.join(unsupported)}")
+        return command, kwargs
+
+    if opts["cpu_affinity"]:
+        taskset = shutil.which("taskset")
+        if taskset:
+            command = [taskset, "-c", ",".join(str(cpu) for cpu in opts["cpu_affinity"])] + command
+        elif hasattr(os, "sched_setaffinity"):
+            log_callback("taskset is not installed; CPU affinity is applied to each thread after spawn.")
+    if opts["nice"]:
+        nice = shutil.which("nice")
+        if nice:
+            # Like the setting, nice -n is an increment over our own niceness
+            command = [nice, "-n", str(int(opts["nice"]))] + command
+        else:
+            log_callback("nice is not installed; priority is applied to each thread after spawn.")
+    if opts["ionice_class"]:
+        ionice = shutil.which("ionice")
+        if ionice:
+            command = [ionice, "-c", _IONICE_CLASSES[opts["ionice_class"]]] + \
+                      (["-n", str(opts["ionice_level"])] if opts["ionice_class"] == "best-effort" else []) + command
+        else:
+            log_callback("ionice is not installed; I/O priority left unchanged.")
+    return command, kwargs
+
+
+def apply_limits(pid, limits, name, log_callback=print):
+    """
+    Applies scheduling and resource limits to a freshly spawned process (POSIX).
+    Each limit is applied on its own; one that fails is logged and the process keeps
+    running without it.
+
+    :param name: Unique name of the cgroup to create for this process.
+    :return: The cgroup directory the process was moved into, or None; pass it to
+             remove_cgroup() after the process has exited.
+    """
+    opts = dict(DEFAULT_LIMITS, **(limits or {}))
+    if sys.platform == "win32":
+        return None
+
+    cgroup = None
+    if opts["cgroup_memory_mb"] or opts["cgroup_cpu_percent"]:
+        try:
+            cgroup = prepare_cgroup(name, opts["cgroup_memory_mb"], opts["cgroup_cpu_percent"])
+            with open(os.path.join(cgroup, "cgroup.procs"), 'w') as f:
+                f.write(str(pid))
+        except OSError as e:
+            log_callback(f"cgroup limits not applied: {e}")
+            remove_cgroup(cgroup)
+            cgroup = None
+
+    # Fallbacks for when build_launch() found no nice/taskset wrapper: these calls only
+    # reach one thread, so they are repeated for every thread the process has by now
+    if opts["nice"] and not shutil.which("nice"):
+        try:
+            # Like nice(1), the setting is an increment over our own niceness
+            own = os.getpriority(os.PRIO_PROCESS, 0)
+            for tid in _thread_ids(pid):
+                os.setpriority(os.PRIO_PROCESS, tid, max(-20, min(19, own + int(opts["nice"]))))
+        except OSError as e:
+            log_callback(f"Priority not applied: {e}")
+
+    if opts["cpu_affinity"] and not shutil.which("taskset"):
+        if hasattr(os, "sched_setaffinity"):
+            try:
+                for tid in _thread_ids(pid):
+                    os.sched_setaffinity(tid, list(opts["cpu_affinity"]))
+            except OSError as e:
+                log_callback(f"CPU affinity not applied: {e}")
+        else:
+            log_callback("CPU affinity is not supported on this OS.")
+
+    rlimits = []
+    if resource is not None:
+        if opts["nofile"]:
+            rlimits.append(("nofile", resource.RLIMIT_NOFILE, int(opts["nofile"])))
+        if opts["address_space_mb"] and hasattr(resource, "RLIMIT_AS"):
+            rlimits.append(("address space", resource.RLIMIT_AS, int(opts["address_space_mb"]) * 1024 * 1024))
+    if rlimits and not hasattr(resource, "prlimit"):
+        log_callback("Resource limits (nofile/address space) are not supported on this OS.")
+        rlimits = []
+    for label, which, value in rlimits:
+        try:
+            _, hard = resource.prlimit(pid, which)
+            if hard != resource.RLIM_INFINITY:
+                value = min(value, hard)
+            resource.prlimit(pid, which, (value, hard))
+        except (OSError, ValueError) as e:
+            log_callback(f"{label} limit not applied: {e}")
+    return cgroup
+
+
+def _thread_ids(pid):
+    """Lists the thread ids of a process (Linux), or just the pid where /proc is unavailable."""
+    try:
+        return [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+    except OSError:
+        return [pid]
+
+
+def read_applied_limits(pid):
+    """
+    Reads back the scheduling and resource limits actually in effect for a process.
+    Niceness and CPU affinity are read from every thread and the least restricted
+    value is reported (lowest nice, union of CPUs), so one unlimited thread shows.
+
+    :return: A dict of human-readable values (only those this OS can report).
+    """
+    applied = {}
+    tids = _thread_ids(pid)
+    if hasattr(os, "getpriority"):
+        try:
+            applied["nice"] = min(os.getpriority(os.PRIO_PROCESS, tid) for tid in tids)
+        except OSError:
+            pass
+    if hasattr(os, "sched_getaffinity"):
+        try:
+            applied["cpu_affinity"] = sorted(set().union(*(os.sched_getaffinity(tid) for tid in tids)))
+        except OSError:
+            pass
+    if resource is not None and hasattr(resource, "prlimit"):
+        for key, which in (("nofile", resource.RLIMIT_NOFILE), ("address_space", getattr(resource, "RLIMIT_AS", None))):
+            if which is None:
+                continue
+            try:
+                soft, _ = resource.prlimit(pid, which)
+                applied[key] = "unlimited" if soft == resource.RLIM_INFINITY else soft
+            except OSError:
+                pass
+    try:
+        with open(f"/proc/{pid}/cgroup", 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith("0::"):
+                    applied["cgroup"] = line[3:].strip()
+    except OSError:
+        pass
+    return applied
+
+
+def format_applied_limits(applied):
+    """One-line summary for the status bar."""
+    parts = []
+    if "nice" in applied:
+        parts.append(f"nice={applied['nice']}")
+    if "cpu_affinity" in applied:
+        cpus = applied["cpu_affinity"]
+        parts.append(f"CPU={','.join(map(str, cpus))}" if len(cpus) < (os.cpu_count() or 1) else "CPU=all")
+    if "nofile" in applied:
+        parts.append(f"nofile={applied['nofile']}")
+    if applied.get("address_space") not in (None, "unlimited"):
+        parts.append(f"AS={applied['address_space'] // (1024 * 1024)}MB")
+    if "v2py-" in applied.get("cgroup", ""):
+        parts.append(f"cgroup={os.path.basename(applied['cgroup'])}")
+    return " ".join(parts)
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+import copy
+import json
+import time
+import statistics
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from core.access_log import AccessLogAnalyzer, is_ip_address
+from core.geodata import open_geodata
+from core.templates import resolve_config, is_overlay
+from core.bulk_generate import write_if_changed
+from core.backends import DEFAULT_BACKEND
+from core.config_builder import without_direct_rules
+from core.isolated_core import IsolatedCore
+
+DIRECT, PROXY = "direct", "proxy"
+# Relative latency gain one path needs before a rule is suggested
+MIN_GAIN = 0.2
+# Bytes read per fetch for the throughput figure
+MAX_FETCH_BYTES = 1024 * 1024
+# Marks rules written by the advisor so they can be replaced on the next run
+ADVISOR_RULE_TAG = "routing-advisor"
+
+
+def _fetch(opener, url, timeout, max_bytes):
+    """Fetches url; returns (ms to response headers, Mbps of the body read, bytes read)."""
+    start = time.perf_counter()
+    with opener.open(url, timeout=timeout) as response:
+        first_byte = time.perf_counter()
+        received = 0
+        while received < max_bytes:
+            chunk = response.read(min(65536, max_bytes - received))
+            if not chunk:
+                break
+            received += len(chunk)
+    body_time = time.perf_counter() - first_byte
+    mbps = received * 8 / body_time / 1e6 if received and body_time > 0 else None
+    return (first_byte - start) * 1000, mbps, received
+
+
+def top_domains_from_log(path, n=20):
+    """Reads an access log completely and returns its n most requested domain names."""
+    analyzer = AccessLogAnalyzer(path, capacity=max(100, n * 5))
+    while analyzer.poll():
+        pass
+    return [domain for domain, _, _ in analyzer.snapshot(n)["top_domains"]]
+
+
+def _summarize(samples):
+    latencies = [latency for latency, _, _ in samples["ok"]]
+    throughputs = [mbps for _, mbps, _ in samples["ok"] if mbps is not None]
+    return {
+        "ok": len(samples["ok"]),
+        "errors": len(samples["errors"]),
+        "latency_ms": statistics.median(latencies) if latencies else None,
+        "throughput_mbps": statistics.median(throughputs) if throughputs else None,
+        "last_error": samples["errors"][-1] if samples["errors"] else None,
+    }
+
+
+def decide(direct, proxy, min_gain=MIN_GAIN):
+    """
+    Picks the outbound for one domain from its direct and proxied summaries.
+
+    :return: (decision, gain, reason); decision is DIRECT, PROXY or None (no clear
+             winner / not measurable) and gain the relative latency improvement over the other path.
+    """
+    if not direct["ok"] and not proxy["ok"]:
+        return None, None, "unreachable on both paths"
+    if not direct["ok"]:
+        return PROXY, None, "direct connection fails"
+    if not proxy["ok"]:
+        return DIRECT, None, "proxied connection fails"
+    direct_ms, proxy_ms = direct["latency_ms"], proxy["latency_ms"]
+    if direct_ms < proxy_ms and (proxy_ms - direct_ms) / proxy_ms >= min_gain:
+        return DIRECT, (proxy_ms - direct_ms) / proxy_ms, f"direct {proxy_ms - direct_ms:.0f} ms faster"
+    if proxy_ms < direct_ms and (direct_ms - proxy_ms) / direct_ms >= min_gain:
+        return PROXY, (direct_ms - proxy_ms) / direct_ms, f"proxy {direct_ms - proxy_ms:.0f} ms faster"
+    return None, abs(proxy_ms - direct_ms) / max(proxy_ms, direct_ms), "no significant difference"
+
+
+def advise(domains, http_proxy, repeats=3, workers=16, timeout=10, scheme="https", min_gain=MIN_GAIN,
+           max_bytes=MAX_FETCH_BYTES, use_geosite=True, log_callback=None):
+    """
+    Fetches every domain directly and through an HTTP proxy, concurrently and
+    `repeats` times per path (interleaved, so both paths see the same network conditions).
+
+    Proxied fetches follow the routing of the core behind http_proxy; use
+    advise_with_config() to make sure every proxied fetch crosses the server.
+
+    :param domains: Domain names (or host:port) to measure.
+    :param http_proxy: An HTTP inbound, e.g. "http://127.0.0.1:10809".
+    :param use_geosite: Annotate each domain with its geosite categories when geosite.dat is present.
+    :return: [{"domain", "direct", "proxy": summaries, "decision", "gain", "reason", "categories"}].
+    """
+    domains = list(dict.fromkeys(domain.strip().lower() for domain in domains if domain.strip()))
+    openers = {
+        DIRECT: urllib.request.build_opener(urllib.request.ProxyHandler({})),
+        PROXY: urllib.request.build_opener(urllib.request.ProxyHandler({'http': http_proxy, 'https': http_proxy})),
+    }
+    samples = {(domain, path): {"ok": [], "errors": []} for domain in domains for path in openers}
+
+    def job(task):
+        domain, path = task
+        try:
+            result = _fetch(openers[path], f"{scheme}://{domain}/", timeout, max_bytes)
+            samples[task]["ok"].append(result)
+        except Exception as e:
+            samples[task]["errors"].append(str(getattr(e, "reason", e)))
+
+    tasks = [(domain, path) for _ in range(repeats) for domain in domains for path in (DIRECT, PROXY)]
+    if tasks:
+        with ThreadPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            list(executor.map(job, tasks))
+
+    geosite = open_geodata("geosite") if use_geosite else None
+    advice = []
+    for domain in domains:
+        direct, proxy = _summarize(samples[(domain, DIRECT)]), _summarize(samples[(domain, PROXY)])
+        decision, gain, reason = decide(direct, proxy, min_gain)
+        categories = []
+        if geosite is not None and not is_ip_address(domain.rsplit(":", 1)[0]):
+            try:
+                categories = sorted({category for category, _ in geosite.match_domain(domain.rsplit(":", 1)[0])})
+            except Exception as e:
+                if log_callback:
+                    log_callback(f"Routing advisor: geosite lookup failed for {domain}: {e}")
+        advice.append({"domain": domain, "direct": direct, "proxy": proxy, "decision": decision,
+                       "gain": gain, "reason": reason, "categories": categories})
+    return advice
+
+
+def advise_with_config(domains, config, executable=None, backend=DEFAULT_BACKEND, **kwargs):
+    """
+    Runs advise() with the proxied path measured through an isolated core started from
+    config without its direct rules. The running core's routing, including rules from
+    an earlier run, cannot then make both paths identical.
+
+    :param kwargs: Passed on to advise().
+    :raises RuntimeError: If the isolated core does not start.
+    """
+    with IsolatedCore(without_direct_rules(config), executable=executable, backend=backend) as core:
+        return advise(domains, f"http://{core.http_proxy}", **kwargs)
+
+
+def build_rules(advice, outbound_tags=None):
+    """
+    Converts advice into v2ray routing rules, one rule per outbound, domains matched
+    with the "domain:" (domain and subdomains) form.
+
+    :param outbound_tags: {DIRECT: tag, PROXY: tag}; defaults to the "direct"/"proxy"
+                          tags used by core.config_builder.
+    """
+    tags = dict({DIRECT: "direct", PROXY: "proxy"}, **(outbound_tags or {}))
+    rules = []
+    for decision in (DIRECT, PROXY):
+        domains = [item["domain"].rsplit(":", 1)[0] for item in advice if item["decision"] == decision]
+        domains = list(dict.fromkeys(domains))
+        ips = [domain for domain in domains if is_ip_address(domain)]
+        names = [f"domain:{domain}" for domain in domains if not is_ip_address(domain)]
+        for key, values in (("domain", names), ("ip", ips)):
+            if values:
+                rules.append({"type": "field", key: values, "outboundTag": tags[decision],
+                              "ruleTag": ADVISOR_RULE_TAG})
+    return rules
+
+
+def apply_rules(config, rules):
+    """
+    Returns a copy of config with the advisor's rules placed ahead of the existing
+    ones; rules written by an earlier run are replaced.
+    """
+    config = copy.deepcopy(config)
+    routing = config.setdefault("routing", {})
+    kept = [rule for rule in routing.get("rules", []) if rule.get("ruleTag") != ADVISOR_RULE_TAG]
+    routing["rules"] = list(rules) + kept
+    return config
+
+
+def apply_rules_to_file(path, rules):
+    """
+    Writes the advisor's rules into a config file. For template overlays the merged
+    rule list is stored in the overlay, leaving the shared template untouched.
+
+    :return: "updated" or "unchanged".
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    merged = apply_rules(resolve_config(raw, path)[0], rules)
+    if is_overlay(raw):
+        raw = dict(raw, routing=dict(raw.get("routing") or {}, rules=merged["routing"]["rules"]))
+    else:
+        raw = merged
+    return write_if_changed(path, json.dumps(raw, indent=2, ensure_ascii=False).encode('utf-8'))
+
+
+def format_advice(advice):
+    """Plain-text table of advise() results."""
+    def ms(value):
+        return f"{value:.0f}" if value is not None else "-"
+
+    def mbps(value):
+        return f"{value:.1f}" if value is not None else "-"
+
+    lines = [f"{'domain':<32} {'direct ms':>9} {'proxy ms':>9} {'direct Mbps':>11} {'proxy Mbps':>10}  advice"]
+    for item in advice:
+        direct, proxy = item["direct"], item["proxy"]
+        if item["decision"]:
+            gain = f" ({item['gain']:.0%})" if item["gain"] is not None else ""
+            verdict = f"{item['decision']}{gain}: {item['reason']}"
+        else:
+            verdict = f"keep default: {item['reason']}"
+        if item["categories"]:
+            verdict += f" [geosite: {', '.join(item['categories'][:3])}]"
+        lines.append(f"{item['domain'][:32]:<32} {ms(direct['latency_ms']):>9} {ms(proxy['latency_ms']):>9} "
+                     f"{mbps(direct['throughput_mbps']):>11} {mbps(proxy['throughput_mbps']):>10}  {verdict}")
+    return "\n".join(lines)
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import threading
+
+from core.config_builder import parse_config_details
+from core.templates import load_config, is_template_path
+from core.settings import get_persistent_data_path
+
+SERVER_METRICS_FILE = "server_metrics.json"
+
+
+class ServerEntry:
+    """One server in the list. __slots__ keeps 100k entries to a few tens of MB."""
+    __slots__ = ("name", "path", "address", "port", "network", "tls", "latency", "throughput", "stale", "search_key")
+
+    def __init__(self, name, path, address, port, network="tcp", tls=False):
+        self.name = name
+        self.path = path
+        self.address = address
+        self.port = port
+        self.network = network
+        self.tls = tls
+        self.latency = None      # 毫秒, None 表示未测试或失败
+        self.throughput = None   # Mbps
+        self.stale = False       # latency 来自较早的测试（分集群测试跳过了该服务器）
+        self.search_key = f"{name} {address}:{port} {network}".lower()
+
+
+def entry_from_config(path, config):
+    """Builds a ServerEntry from a parsed config; returns None if it has no server."""
+    address, port, _ = parse_config_details(config)
+    if not address or not port:
+        return None
+    network, tls = "tcp", False
+    for outbound in config.get("outbounds", []):
+        if outbound.get("protocol") in ("vmess", "vless"):
+            stream = outbound.get("streamSettings", {})
+            network = stream.get("network", "tcp")
+            tls = stream.get("security") == "tls"
+            break
+    name = os.path.splitext(os.path.basename(path))[0]
+    return ServerEntry(name, path, address, port, network, tls)
+
+
+class ServerStore:
+    """
+    Holds every server entry plus the current filtered/sorted view.
+
+    The view is a plain list of indices into `entries`. Narrowing a search (the new
+    query extends the previous one) filters the current view instead of all entries,
+    so typing stays cheap on large lists.
+    """
+    SORT_KEYS = {
+        "name": lambda e: e.name.lower(),
+        # Stale latencies sort after every fresh one
+        "latency": lambda e: (e.latency is None, e.stale, e.latency or 0.0),
+        "throughput": lambda e: (e.throughput is None, -(e.throughput or 0.0)),
+    }
+
+    def __init__(self, metrics_path=None):
+        self.entries = []
+        self.view = []
+        self.query = ""
+        self.sort_key = "name"
+        self.lock = threading.Lock()
+        self.metrics_path = metrics_path or get_persistent_data_path(SERVER_METRICS_FILE)
+
+    def load_directory(self, directory):
+        """Replaces the entries with the servers found in a config directory (recursive)."""
+        entries = []
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                if not filename.lower().endswith(".json") or is_template_path(path):
+                    continue
+                try:
+                    entry = entry_from_config(path, load_config(path))
+                except (OSError, ValueError):
+                    continue
+                if entry:
+                    entries.append(entry)
+        self.set_entries(entries)
+
+    def set_entries(self, entries):
+        with self.lock:
+            self.entries = list(entries)
+        self.load_metrics()
+        self.refresh_view()
+
+    def refresh_view(self):
+        """Rebuilds the view from scratch with the current query and sort key."""
+        query = self.query
+        self.query = ""
+        self.filter(query)
+
+    def filter(self, query):
+        query = query.strip().lower()
+        with self.lock:
+            if self.query and query.startswith(self.query):
+                candidates = self.view
+            else:
+                candidates = range(len(self.entries))
+            entries = self.entries
+            if query:
+                self.view = [i for i in candidates if query in entries[i].search_key]
+            else:
+                self.view = list(range(len(entries)))
+            self.query = query
+        self.sort(self.sort_key)
+
+    def sort(self, key):
+        self.sort_key = key
+        key_func = self.SORT_KEYS[key]
+        with self.lock:
+            entries = self.entries
+            self.view.sort(key=lambda i: key_func(entries[i]))
+
+    def visible(self, first, count):
+        """Returns (entry_index, entry) pairs for view rows [first, first + count)."""
+        with self.lock:
+            return [(i, self.entries[i]) for i in self.view[first:first + count]]
+
+    def set_throughput(self, path, mbps):
+        """Records a speed test result for the server of a config file; returns False if it is not listed."""
+        target = os.path.abspath(path)
+        with self.lock:
+            matches = [entry for entry in self.entries if os.path.abspath(entry.path) == target]
+            for entry in matches:
+                entry.throughput = mbps
+        return bool(matches)
+
+    def load_metrics(self):
+        """Applies cached latency/throughput results to the entries."""
+        try:
+            with open(self.metrics_path, 'r', encoding='utf-8') as f:
+                metrics = json.load(f)
+        except (OSError, ValueError):
+            return
+        for entry in self.entries:
+            cached = metrics.get(entry.path)
+            if cached:
+                entry.latency = cached.get("latency")
+                entry.throughput = cached.get("throughput")
+                entry.stale = cached.get("stale", False)
+
+    def save_metrics(self):
+        with self.lock:
+            metrics = {e.path: {"latency": e.latency, "throughput": e.throughput, "stale": e.stale}
+                       for e in self.entries if e.latency is not None or e.throughput is not None}
+        try:
+            with open(self.metrics_path, 'w', encoding='utf-8') as f:
+                json.dump(metrics, f)
+        except OSError:
+            pass
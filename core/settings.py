@@ -34,7 +34,24 @@ def load_app_settings():
         "run_on_startup": False,
         "auto_start_v2ray": False,
         "enable_proxy_hotkey": "<alt>+z",
-        "disable_proxy_hotkey": "<alt>+x"
+        "disable_proxy_hotkey": "<alt>+x",
+        "core_log_threshold": "info",
+        "core_log_sample_every": 0,
+        "failover_enabled": False,
+        "failover_servers": [],
+        "failover_interval": 10,
+        "failover_threshold": 3,
+        "failover_min_dwell": 60,
+        "ui_lag_monitor": False,
+        "core_limits": {},
+        "core_backend": "v2ray",
+        "core_paths": {},
+        "core_ready_timeout": 15,
+        "core_ready_marker": True,
+        "subscriptions": [],
+        "subscription_interval": 3600,
+        "subscription_auto_refresh": False,
+        "echo_target": ""
     }
     if os.path.exists(settings_path):
         try:
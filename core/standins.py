@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+
+# Local stand-in servers used by the benchmark and test tools so they can run offline.
+# Every server binds to 127.0.0.1 (a free port by default) and runs in daemon threads.
+
+import os
+import ssl
+import zlib
+import shutil
+import socket
+import struct
+import datetime
+import tempfile
+import threading
+import subprocess
+import socketserver
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+_PAYLOAD_BLOCK = b"\0" * 65536
+
+
+class _StandinHTTPHandler(BaseHTTPRequestHandler):
+    """Serves "/" with a tiny body and "/bytes/<n>" with n bytes of zeros."""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        size = 2
+        if self.path.startswith("/bytes/"):
+            try:
+                size = int(self.path[len("/bytes/"):])
+            except ValueError:
+                self.send_error(400)
+                return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        if size == 2:
+            self.wfile.write(b"ok")
+            return
+        remaining = size
+        while remaining > 0:
+            block = _PAYLOAD_BLOCK[:min(remaining, len(_PAYLOAD_BLOCK))]
+            self.wfile.write(block)
+            remaining -= len(block)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalHTTPServer:
+    """
+    A threaded HTTP server on 127.0.0.1 serving fixed-size payloads.
+
+    Usage:
+        with LocalHTTPServer() as server:
+            urllib.request.urlopen(server.url("/bytes/1048576"))
+    """
+    def __init__(self, host="127.0.0.1", port=0):
+        self.server = ThreadingHTTPServer((host, port), _StandinHTTPHandler)
+        self.server.daemon_threads = True
+        self.host, self.port = self.server.server_address[:2]
+        self.thread = None
+
+    def url(self, path="/"):
+        return f"http://{self.host}:{self.port}{path}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _EchoHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                data = self.request.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            self.request.sendall(data)
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+
+class LocalEchoServer:
+    """A threaded TCP echo server on 127.0.0.1; every byte received is sent back."""
+    def __init__(self, host="127.0.0.1", port=0):
+        self.server = _ThreadingTCPServer((host, port), _EchoHandler)
+        self.host, self.port = self.server.server_address[:2]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class LocalUDPEchoServer:
+    """A UDP echo server on 127.0.0.1; every datagram is sent back to its sender."""
+    def __init__(self, host="127.0.0.1", port=0):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.2)
+        self.host, self.port = self.sock.getsockname()[:2]
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _serve(self):
+        while not self.stop_event.is_set():
+            try:
+                data, address = self.sock.recvfrom(65536)
+                self.sock.sendto(data, address)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+
+    def start(self):
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=1)
+        self.sock.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+SINK_HEADER = struct.Struct("!II")
+
+
+class _SinkHandler(socketserver.BaseRequestHandler):
+    """
+    Replay sink protocol: the client sends SINK_HEADER (upload_len, download_len)
+    followed by upload_len bytes; the sink discards them and answers download_len bytes.
+    """
+    def _read_exactly(self, size):
+        remaining = size
+        while remaining > 0:
+            data = self.request.recv(min(remaining, 65536))
+            if not data:
+                return False
+            remaining -= len(data)
+        return True
+
+    def handle(self):
+        header = bytearray()
+        while True:
+            try:
+                while len(header) < SINK_HEADER.size:
+                    data = self.request.recv(SINK_HEADER.size - len(header))
+                    if not data:
+                        return
+                    header += data
+                upload, download = SINK_HEADER.unpack(header)
+                header.clear()
+                if not self._read_exactly(upload):
+                    return
+                while download > 0:
+                    block = _PAYLOAD_BLOCK[:min(download, len(_PAYLOAD_BLOCK))]
+                    self.request.sendall(block)
+                    download -= len(block)
+            except OSError:
+                return
+
+
+class LocalSinkServer:
+    """A threaded TCP server that swallows and produces traffic on demand, for replaying recorded connections."""
+    def __init__(self, host="127.0.0.1", port=0):
+        self.server = _ThreadingTCPServer((host, port), _SinkHandler)
+        self.host, self.port = self.server.server_address[:2]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _FeedHandler(BaseHTTPRequestHandler):
+    """Serves the feed server's current body with ETag/Last-Modified validators."""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        feed = self.server.feed
+        with feed.lock:
+            feed.requests += 1
+            body, etag, modified, error = feed.body, feed.etag, feed.last_modified, feed.error_status
+            if error:
+                feed.failures += 1
+        if error:
+            self.send_response(error)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == etag or (
+                not self.headers.get("If-None-Match") and self.headers.get("If-Modified-Since") == modified):
+            with feed.lock:
+                feed.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalFeedServer:
+    """
+    A subscription feed stand-in: serves a replaceable body at every path and
+    answers conditional GETs with 304 while the body is unchanged.
+
+    Counters (requests, not_modified, failures) let tests check what was transferred;
+    set error_status (e.g. 503) to make every request fail.
+    """
+    def __init__(self, body=b"", host="127.0.0.1", port=0):
+        self.lock = threading.Lock()
+        self.requests = self.not_modified = self.failures = 0
+        self.error_status = None
+        self.set_body(body)
+        self.server = ThreadingHTTPServer((host, port), _FeedHandler)
+        self.server.daemon_threads = True
+        self.server.feed = self
+        self.host, self.port = self.server.server_address[:2]
+        self.thread = None
+
+    def set_body(self, body):
+        """Replaces the feed; the validators change with it."""
+        with self.lock:
+            self.body = body
+            self.etag = '"%08x"' % (zlib.crc32(body))
+            self.last_modified = formatdate(usegmt=True)
+
+    def url(self, path="/sub"):
+        return f"http://{self.host}:{self.port}{path}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def make_self_signed_cert(directory, common_name="localhost"):
+    """
+    Writes a throw-away self-signed certificate and key (cert.pem / key.pem) into directory.
+    Uses the cryptography package when installed, otherwise the openssl command line tool.
+
+    :return: (cert_path, key_path)
+    :raises RuntimeError: If neither is available.
+    """
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    try:
+        from cryptography import x509
+        from cryptography.x509.oid import NameOID
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import ec
+    except ImportError:
+        x509 = None
+
+    if x509 is not None:
+        key = ec.generate_private_key(ec.SECP256R1())
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+                .serial_number(x509.random_serial_number())
+                .not_valid_before(now - datetime.timedelta(minutes=5))
+                .not_valid_after(now + datetime.timedelta(days=1))
+                .add_extension(x509.SubjectAlternativeName([x509.DNSName(common_name)]), critical=False)
+                .sign(key, hashes.SHA256()))
+        with open(cert_path, 'wb') as f:
+            f.write(cert.public_bytes(serialization.Encoding.PEM))
+        with open(key_path, 'wb') as f:
+            f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                      serialization.NoEncryption()))
+        return cert_path, key_path
+
+    openssl = shutil.which("openssl")
+    if not openssl:
+        raise RuntimeError("generating a test certificate needs the cryptography package or the openssl tool")
+    subprocess.run([openssl, "req", "-x509", "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1",
+                    "-nodes", "-keyout", key_path, "-out", cert_path, "-days", "1", "-subj", f"/CN={common_name}"],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return cert_path, key_path
+
+
+class _TLSHandler(socketserver.BaseRequestHandler):
+    """Completes the TLS handshake, answers "ok" to any data and waits for the client to close."""
+    def handle(self):
+        try:
+            with self.server.tls_context.wrap_socket(self.request, server_side=True) as conn:
+                while conn.recv(65536):
+                    conn.sendall(b"ok")
+        except (OSError, ssl.SSLError):
+            pass
+
+
+class LocalTLSServer:
+    """
+    A threaded TLS server with a self-signed certificate, for the TLS profiler.
+
+    :param alpn: Protocols the server accepts (None disables ALPN).
+    :param max_version: Highest TLS version offered, e.g. ssl.TLSVersion.TLSv1_2.
+    :param tickets: Whether session tickets (and so resumption) are enabled.
+    """
+    def __init__(self, host="127.0.0.1", port=0, alpn=("h2", "http/1.1"), max_version=None, tickets=True):
+        self.cert_dir = tempfile.mkdtemp(prefix="tls-standin-")
+        self.cert_path, self.key_path = make_self_signed_cert(self.cert_dir)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(self.cert_path, self.key_path)
+        if alpn:
+            context.set_alpn_protocols(list(alpn))
+        if max_version:
+            context.maximum_version = max_version
+        if not tickets:
+            context.options |= ssl.OP_NO_TICKET
+            context.num_tickets = 0
+        self.server = _ThreadingTCPServer((host, port), _TLSHandler)
+        self.server.tls_context = context
+        self.host, self.port = self.server.server_address[:2]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.cert_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
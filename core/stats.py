@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+import math
+
+# Two-sided 95% Student's t critical values by degrees of freedom
+_T_95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306,
+         9: 2.262, 10: 2.228, 12: 2.179, 15: 2.131, 20: 2.086, 25: 2.060, 30: 2.042,
+         40: 2.021, 60: 2.000, 120: 1.980}
+
+
+def mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+
+def stdev(values):
+    """Sample standard deviation (0 for fewer than two values)."""
+    if len(values) < 2:
+        return 0.0
+    m = mean(values)
+    return math.sqrt(sum((v - m) ** 2 for v in values) / (len(values) - 1))
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a list of numbers (pct in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def percentiles(values, pcts=(50, 90, 99)):
+    """Returns {"p50": ..., ...} for the requested percentiles."""
+    return {f"p{p}": percentile(values, p) for p in pcts}
+
+
+def confidence_interval(values):
+    """
+    Returns (mean, half_width) of the 95% confidence interval of the mean,
+    using Student's t distribution for small samples.
+    """
+    n = len(values)
+    if n < 2:
+        return mean(values), 0.0
+    # Degrees of freedom missing from the table use the next smaller entry, whose
+    # critical value is larger, so the interval errs on the wide side
+    df = n - 1
+    critical = _T_95[max(key for key in _T_95 if key <= df)]
+    return mean(values), critical * stdev(values) / math.sqrt(n)
@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import time
+import base64
+import random
+import hashlib
+import binascii
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+from core.settings import get_persistent_data_path
+from core.bulk_generate import render_row, write_if_changed, safe_filename, contained_path
+
+# Subscription configs live in configs/<SUBSCRIPTION_DIR>/<source slug>/
+SUBSCRIPTION_DIR = "subscriptions"
+SUBSCRIPTION_CACHE_DIR = "subscription_cache"
+DEFAULT_REFRESH_INTERVAL = 3600
+BACKOFF_BASE = 60
+BACKOFF_MAX = 6 * 3600
+# How often the background loop looks for sources that are due
+SCHEDULER_TICK = 30
+
+_UNSAFE_FILENAME = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+# One lock per cache file, so a manual refresh and the scheduler never apply the same source at once
+_source_locks = {}
+_source_locks_guard = threading.Lock()
+
+
+def source_slug(name):
+    """Directory/cache name of a subscription source."""
+    slug = _UNSAFE_FILENAME.sub("_", name).strip(" ._")
+    return slug or hashlib.sha256(name.encode('utf-8')).hexdigest()[:12]
+
+
+def _b64decode(text):
+    text = "".join(text.split())
+    text += "=" * (-len(text) % 4)
+    return base64.urlsafe_b64decode(text.replace("+", "-").replace("/", "_"))
+
+
+def decode_feed(data):
+    """
+    Splits a subscription body into share links. The usual format is base64 of
+    newline-separated links; plain-text link lists are accepted as well.
+    """
+    text = data.decode('utf-8-sig', errors='replace').strip()
+    if "://" not in text:
+        try:
+            text = _b64decode(text).decode('utf-8', errors='replace')
+        except (binascii.Error, ValueError):
+            pass
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def parse_vmess_link(link):
+    """
+    Converts a vmess:// share link (base64 JSON, "v2" format) into an inventory row
+    for core.bulk_generate.render_row().
+
+    :raises ValueError: If the link cannot be decoded.
+    """
+    try:
+        info = json.loads(_b64decode(link[len("vmess://"):]))
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"undecodable vmess link: {e}") from e
+    if not isinstance(info, dict):
+        raise ValueError("undecodable vmess link")
+    network = info.get("net") or "tcp"
+    path = info.get("path") or ""
+    host = info.get("host") or ""
+    row = {
+        "name": str(info.get("ps") or f"{info.get('add')}_{info.get('port')}"),
+        "address": info.get("add", ""),
+        "port": info.get("port", ""),
+        "uuid": info.get("id", ""),
+        "network": network,
+    }
+    if network == "ws":
+        row["ws_path"] = path or "/"
+    elif network == "h2":
+        row["h2_path"] = path or "/"
+        row["h2_host"] = host.split(",")[0]
+    elif network == "grpc":
+        row["grpc_service_name"] = path
+    if info.get("tls") == "tls":
+        row["tls"] = True
+        row["server_name"] = info.get("sni") or host.split(",")[0]
+        if info.get("alpn"):
+            row["alpn"] = [item for item in str(info["alpn"]).split(",") if item]
+        if info.get("fp"):
+            row["fingerprint"] = info["fp"]
+    return row
+
+
+def parse_feed(data):
+    """
+    Parses a subscription body into inventory rows with unique file names.
+
+    :return: (rows, skipped) where skipped lists (link prefix, reason) of unusable links.
+    """
+    rows, skipped = [], []
+    used = set()
+    for link in decode_feed(data):
+        scheme = link.split("://", 1)[0].lower()
+        if scheme != "vmess":
+            skipped.append((link[:40], f"unsupported scheme '{scheme}'"))
+            continue
+        try:
+            row = parse_vmess_link(link)
+        except ValueError as e:
+            skipped.append((link[:40], str(e)))
+            continue
+        base = (safe_filename(row["name"]) or safe_filename(f"{row['address']}_{row['port']}")
+                or hashlib.sha256(link.encode('utf-8')).hexdigest()[:12])
+        filename, counter = f"{base}.json", 2
+        while filename.lower() in used:
+            filename, counter = f"{base}_{counter}.json", counter + 1
+        used.add(filename.lower())
+        row["filename"] = filename
+        rows.append(row)
+    return rows, skipped
+
+
+def fetch_feed(url, etag=None, last_modified=None, timeout=15):
+    """
+    Conditional GET of a subscription.
+
+    :return: (status, body, headers); status 304 comes with body None.
+    :raises urllib.error.URLError / OSError: On network errors and HTTP errors other than 304.
+    """
+    request = urllib.request.Request(url, headers={"User-Agent": "V2flyClient"})
+    if etag:
+        request.add_header("If-None-Match", etag)
+    if last_modified:
+        request.add_header("If-Modified-Since", last_modified)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, response.read(), response.headers
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return 304, None, e.headers
+        raise
+
+
+def diff_servers(previous, rendered):
+    """
+    Compares the last applied state with freshly rendered configs.
+
+    :param previous: {filename: sha256} recorded when the source was last applied.
+    :param rendered: {filename: config bytes}.
+    :return: {"added", "removed", "changed", "unchanged"} lists of file names.
+    """
+    diff = {"added": [], "removed": [], "changed": [], "unchanged": []}
+    for filename, data in rendered.items():
+        if filename not in previous:
+            diff["added"].append(filename)
+        elif previous[filename] != hashlib.sha256(data).hexdigest():
+            diff["changed"].append(filename)
+        else:
+            diff["unchanged"].append(filename)
+    diff["removed"] = [filename for filename in previous if filename not in rendered]
+    for names in diff.values():
+        names.sort()
+    return diff
+
+
+def apply_diff(output_dir, rendered, diff):
+    """
+    Writes added/changed configs and deletes removed ones; unchanged files are not touched.
+
+    :raises ValueError: If a file name would resolve outside output_dir.
+    """
+    paths = {filename: contained_path(output_dir, filename)
+             for filename in diff["added"] + diff["changed"] + diff["removed"]}
+    os.makedirs(output_dir, exist_ok=True)
+    for filename in diff["added"] + diff["changed"]:
+        write_if_changed(paths[filename], rendered[filename])
+    for filename in diff["removed"]:
+        try:
+            os.remove(paths[filename])
+        except FileNotFoundError:
+            pass
+
+
+def backoff_delay(failures, retry_after=None):
+    """Seconds to wait after the given number of consecutive failures (exponential, jittered)."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** max(0, failures - 1)) * random.uniform(0.8, 1.2)
+    return max(delay, retry_after or 0)
+
+
+def _retry_after(headers):
+    value = headers.get("Retry-After") if headers else None
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class SubscriptionRefresher:
+    """
+    Keeps subscription servers in the config directory current.
+
+    Each source is fetched with a conditional GET (ETag / If-Modified-Since); the raw
+    feed and the validators are cached, so an unchanged feed costs one 304 and no
+    parsing. Changed feeds are diffed against the files written last time and only
+    added/changed/removed servers are touched. Sources are refreshed concurrently;
+    a failing source backs off exponentially without delaying the others.
+    """
+    def __init__(self, sources, log_callback, output_root, cache_dir=None, interval=DEFAULT_REFRESH_INTERVAL,
+                 workers=4, timeout=15, defaults=None, template=None, on_change=None):
+        """
+        :param sources: [{"name", "url", optional "interval"}].
+        :param output_root: Directory receiving one sub-directory of configs per source.
+        :param defaults: Generator options applied to every server (see core.config_builder).
+        :param template: Base template; servers are then written as overlays (see core.templates).
+        :param on_change: Called with the list of results after a refresh that changed any file.
+        """
+        self.sources = list(sources)
+        self.log_callback = log_callback
+        self.output_root = output_root
+        self.cache_dir = cache_dir or get_persistent_data_path(SUBSCRIPTION_CACHE_DIR)
+        self.interval = interval
+        self.workers = workers
+        self.timeout = timeout
+        self.defaults = dict(defaults or {})
+        self.template = template
+        self.on_change = on_change
+        self.stop_event = threading.Event()
+        self.thread = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _state_path(self, source):
+        return os.path.join(self.cache_dir, source_slug(source["name"]) + ".json")
+
+    def _feed_path(self, source):
+        return os.path.join(self.cache_dir, source_slug(source["name"]) + ".feed")
+
+    def load_state(self, source):
+        try:
+            with open(self._state_path(source), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # A source whose URL changed starts over
+        return state if state.get("url") == source["url"] else {}
+
+    def _save_state(self, source, state):
+        data = json.dumps(state, ensure_ascii=False, indent=2).encode('utf-8')
+        write_if_changed(self._state_path(source), data)
+
+    def _render_key(self):
+        """Identifies the rendering settings; a change re-renders cached feeds."""
+        key = json.dumps([self.defaults, self.template and os.path.abspath(self.template)], sort_keys=True)
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+    def is_due(self, source, state, now=None):
+        now = now if now is not None else time.time()
+        if now < state.get("retry_at", 0):
+            return False
+        return now - state.get("last_success", 0) >= source.get("interval", self.interval)
+
+    def refresh_source(self, source, force=False):
+        """
+        Refreshes one source.
+
+        :param force: Refresh even if the interval has not elapsed or the source is backing off.
+        :return: {"name", "status": "skipped" | "not-modified" | "unchanged" | "updated" | "failed",
+                  "added", "removed", "changed": file name lists, "skipped_links", "error"}
+        """
+        with _source_locks_guard:
+            lock = _source_locks.setdefault(self._state_path(source), threading.Lock())
+        with lock:
+            return self._refresh_source(source, force)
+
+    def _refresh_source(self, source, force):
+        name = source["name"]
+        result = {"name": name, "status": "skipped", "added": [], "removed": [], "changed": [],
+                  "skipped_links": [], "error": None}
+        state = self.load_state(source)
+        if not force and not self.is_due(source, state):
+            return result
+
+        state["url"] = source["url"]
+        cached_feed = os.path.exists(self._feed_path(source))
+        try:
+            # Without the cached feed a 304 could not be rendered, so fetch unconditionally
+            status, body, headers = fetch_feed(source["url"], state.get("etag") if cached_feed else None,
+                                               state.get("last_modified") if cached_feed else None, self.timeout)
+            if body is None and state.get("render_key") == self._render_key():
+                self._record_success(source, state, status, headers)
+                result["status"] = "not-modified"
+                return result
+            if body is None:
+                # 304 but the rendering settings changed: re-render from the cached feed
+                with open(self._feed_path(source), 'rb') as f:
+                    body = f.read()
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            return self._record_failure(source, state, result, e)
+
+        feed_hash = hashlib.sha256(body).hexdigest()
+        if feed_hash == state.get("feed_sha256") and state.get("render_key") == self._render_key() and cached_feed:
+            self._record_success(source, state, status, headers)
+            result["status"] = "unchanged"
+            return result
+
+        rows, result["skipped_links"] = parse_feed(body)
+        if not rows and state.get("files"):
+            # A captive portal, an error page or a truncated feed must not wipe the servers
+            return self._record_failure(source, state, result, ValueError(
+                f"feed contains no usable servers ({len(result['skipped_links'])} links skipped)"))
+
+        output_dir = os.path.join(self.output_root, source_slug(name))
+        rendered = {}
+        for row in rows:
+            try:
+                rendered[row["filename"]] = render_row(row, self.defaults, template=self.template,
+                                                       output_dir=output_dir)
+            except (ValueError, TypeError) as e:
+                result["skipped_links"].append((row["filename"], str(e)))
+        diff = diff_servers(state.get("files", {}), rendered)
+        try:
+            apply_diff(output_dir, rendered, diff)
+            write_if_changed(self._feed_path(source), body)
+        except (OSError, ValueError) as e:
+            return self._record_failure(source, state, result, e)
+
+        self._record_success(source, state, status, headers)
+        state.update(feed_sha256=feed_hash, render_key=self._render_key(),
+                     files={filename: hashlib.sha256(data).hexdigest() for filename, data in rendered.items()})
+        self._save_state(source, state)
+        result.update(status="updated" if diff["added"] or diff["changed"] or diff["removed"] else "unchanged",
+                      added=diff["added"], removed=diff["removed"], changed=diff["changed"])
+        self.log_callback(f"Subscription {name}: {format_result(result)}")
+        return result
+
+    def _record_success(self, source, state, status, headers):
+        if status != 304:
+            state["etag"] = headers.get("ETag")
+            state["last_modified"] = headers.get("Last-Modified")
+        state.update(failures=0, retry_at=0, last_success=time.time())
+        self._save_state(source, state)
+
+    def _record_failure(self, source, state, result, error):
+        """Schedules a retry with backoff; the validators and feed hash are left as they were."""
+        failures = state.get("failures", 0) + 1
+        delay = backoff_delay(failures, _retry_after(getattr(error, "headers", None)))
+        state.update(failures=failures, retry_at=time.time() + delay)
+        self._save_state(source, state)
+        result.update(status="failed", error=str(error))
+        self.log_callback(f"Subscription {source['name']}: refresh failed ({error}); retrying in {delay:.0f} s.")
+        return result
+
+    def refresh_all(self, force=False):
+        """Refreshes every due source concurrently and returns their results."""
+        if not self.sources:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(self.sources))) as executor:
+            results = list(executor.map(lambda source: self.refresh_source(source, force), self.sources))
+        if self.on_change and any(result["status"] == "updated" for result in results):
+            self.on_change(results)
+        return results
+
+    def start(self):
+        """Refreshes due sources now and then in the background until stop() is called."""
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        self.log_callback(f"Subscriptions: refreshing {len(self.sources)} sources every {self.interval:g}s.")
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _loop(self):
+        while True:
+            try:
+                self.refresh_all()
+            except Exception as e:
+                self.log_callback(f"Subscriptions: refresh error: {e}")
+            if self.stop_event.wait(SCHEDULER_TICK):
+                break
+
+
+def format_result(result):
+    """One-line summary of a refresh_source() result."""
+    if result["status"] == "failed":
+        return f"failed: {result['error']}"
+    if result["status"] != "updated":
+        return result["status"]
+    text = f"+{len(result['added'])} -{len(result['removed'])} ~{len(result['changed'])}"
+    if result["skipped_links"]:
+        text += f", {len(result['skipped_links'])} links skipped"
+    return text
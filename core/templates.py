@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+import os
+import copy
+import json
+import hashlib
+import threading
+
+from core.settings import get_persistent_data_path
+
+# Key of an overlay file naming its base template, relative to the overlay's directory
+TEMPLATE_KEY = "$template"
+# Templates kept in this sub-directory of the config directory are not listed as servers
+TEMPLATE_DIR = "templates"
+RUNTIME_CONFIG_DIR = "runtime_configs"
+RUNTIME_CONFIG_LIMIT = 500
+MAX_TEMPLATE_DEPTH = 8
+
+_base_cache = {}
+_base_cache_lock = threading.Lock()
+
+
+class TemplateError(ValueError):
+    """An overlay's template is missing, invalid or recursive."""
+
+
+def merge_patch(target, patch):
+    """
+    Applies a JSON merge patch (RFC 7396) and returns the result; inputs are not modified.
+    Objects merge recursively, null deletes a key, and anything else (lists included) replaces.
+    """
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def make_patch(base, config):
+    """Returns the smallest merge patch that turns base into config (the inverse of merge_patch)."""
+    patch = {}
+    for key in base:
+        if key not in config:
+            patch[key] = None
+    for key, value in config.items():
+        if key not in base:
+            patch[key] = value
+        elif isinstance(value, dict) and isinstance(base[key], dict):
+            child = make_patch(base[key], value)
+            if child:
+                patch[key] = child
+        elif value != base[key]:
+            patch[key] = value
+    return patch
+
+
+def is_overlay(config):
+    return isinstance(config, dict) and TEMPLATE_KEY in config
+
+
+def is_template_path(path):
+    """Whether a config path lies in a templates directory."""
+    return TEMPLATE_DIR in os.path.normpath(path).split(os.sep)[:-1]
+
+
+def _load_base(path):
+    """Parses a template file, memoised by (path, size, mtime) so shared bases are read once."""
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        raise TemplateError(f"template not found: {path}") from e
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _base_cache_lock:
+        cached = _base_cache.get(key[0])
+    if cached and cached[0] == key:
+        return cached[1], cached[2]
+    with open(path, 'rb') as f:
+        content = f.read()
+    try:
+        config = json.loads(content)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise TemplateError(f"invalid template {path}: {e}") from e
+    with _base_cache_lock:
+        _base_cache[key[0]] = (key, config, content)
+    return config, content
+
+
+def resolve_config(config, path):
+    """
+    Resolves an overlay into the full config; plain configs are returned unchanged.
+
+    :param path: Path of the file config was read from (templates are relative to it).
+    :return: (merged_config, [raw bytes of every template used, nearest first])
+    :raises TemplateError: If a template is missing, invalid or the chain loops.
+    """
+    inputs = []
+    seen = set()
+    layers = []
+    while is_overlay(config):
+        if len(layers) >= MAX_TEMPLATE_DEPTH:
+            raise TemplateError(f"templates nested deeper than {MAX_TEMPLATE_DEPTH} levels")
+        reference = config[TEMPLATE_KEY]
+        if not isinstance(reference, str) or not reference:
+            raise TemplateError(f"{TEMPLATE_KEY} in {path} must be a template path, not {reference!r}")
+        base_path = os.path.normpath(os.path.join(os.path.dirname(path), reference))
+        if base_path in seen:
+            raise TemplateError(f"template loop through {base_path}")
+        seen.add(base_path)
+        layers.append({key: value for key, value in config.items() if key != TEMPLATE_KEY})
+        config, content = _load_base(base_path)
+        inputs.append(content)
+        path = base_path
+    if layers:
+        # Bases are shared through the cache; callers must be free to modify the result
+        config = copy.deepcopy(config)
+    for patch in reversed(layers):
+        config = merge_patch(config, patch)
+    return config, inputs
+
+
+def load_config(path):
+    """Reads a config file, resolving it if it is an overlay."""
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    return resolve_config(config, path)[0]
+
+
+def materialize(path, cache_dir=None):
+    """
+    Returns a path the core can run: plain configs are returned as-is, overlays are
+    merged into a runtime file cached by the hash of the overlay and all its templates.
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    try:
+        config = json.loads(content)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return path  # Left for the pre-flight check / core to report
+    if not is_overlay(config):
+        return path
+
+    merged, inputs = resolve_config(config, path)
+    digest = hashlib.sha256()
+    for part in [content] + inputs:
+        digest.update(hashlib.sha256(part).digest())
+    cache_dir = cache_dir or get_persistent_data_path(RUNTIME_CONFIG_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    runtime_path = os.path.join(cache_dir, digest.hexdigest()[:32] + ".json")
+    if os.path.exists(runtime_path):
+        os.utime(runtime_path)
+        return runtime_path
+
+    temp_path = f"{runtime_path}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(merged, f, ensure_ascii=False)
+    os.replace(temp_path, runtime_path)
+    _prune(cache_dir)
+    return runtime_path
+
+
+def _prune(cache_dir):
+    """Keeps the most recently used RUNTIME_CONFIG_LIMIT runtime configs."""
+    try:
+        names = [name for name in os.listdir(cache_dir) if name.endswith(".json")]
+        if len(names) <= RUNTIME_CONFIG_LIMIT:
+            return
+        paths = sorted((os.path.join(cache_dir, name) for name in names), key=os.path.getmtime)
+        for stale in paths[:len(paths) - RUNTIME_CONFIG_LIMIT]:
+            os.remove(stale)
+    except OSError:
+        pass
+
+
+def make_overlay(config, template_path, overlay_dir):
+    """
+    Builds the overlay that reproduces config on top of a template.
+
+    :param overlay_dir: Directory the overlay will be written to (the template reference is relative to it).
+    """
+    # Diff against the resolved template, so templates that are overlays themselves keep working
+    base = resolve_config(_load_base(template_path)[0], template_path)[0]
+    reference = os.path.relpath(template_path, overlay_dir).replace(os.sep, "/")
+    return dict({TEMPLATE_KEY: reference}, **make_patch(base, config))
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+
+import ssl
+import time
+import select
+import socket
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+# ALPN offers compared per transport; None sends no ALPN extension. ws needs HTTP/1.1
+# (v2ray does not run WebSocket over h2), h2 and gRPC need h2.
+ALPN_CANDIDATES = {
+    "ws": [["http/1.1"], None],
+    "h2": [["h2"], ["h2", "http/1.1"]],
+    "grpc": [["h2"], ["h2", "http/1.1"]],
+}
+DEFAULT_ALPN_CANDIDATES = [None, ["h2", "http/1.1"], ["http/1.1"]]
+# How long to wait after the handshake for TLS 1.3 session tickets
+TICKET_WAIT = 0.1
+# Resumption must save at least this share of the full handshake time to count as useful
+RESUMPTION_MIN_SAVING = 0.1
+# Another ALPN offer must be this much faster than the configured one to be recommended
+ALPN_MIN_GAIN = 0.1
+
+
+def tls_targets_from_config(config):
+    """
+    Lists the TLS-enabled vmess/vless servers of a config.
+
+    :return: [{"address", "port", "server_name", "network", "alpn"}]
+    """
+    targets = []
+    for outbound in config.get("outbounds", []):
+        if outbound.get("protocol") not in ("vmess", "vless"):
+            continue
+        stream = outbound.get("streamSettings", {})
+        if stream.get("security") != "tls":
+            continue
+        tls_settings = stream.get("tlsSettings", {})
+        for server in outbound.get("settings", {}).get("vnext", []):
+            targets.append({"address": server.get("address"), "port": server.get("port"),
+                            "server_name": tls_settings.get("serverName") or server.get("address"),
+                            "network": stream.get("network", "tcp"), "alpn": tls_settings.get("alpn") or None})
+    return targets
+
+
+def _client_context(alpn):
+    # The profiler measures handshakes; certificate validity is not its concern
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    if alpn:
+        context.set_alpn_protocols(list(alpn))
+    return context
+
+
+def handshake_once(address, port, server_name, context, session=None, timeout=10.0):
+    """
+    Runs one TLS handshake over a fresh TCP connection through memory BIOs, so the
+    bytes exchanged can be counted.
+
+    :param session: An ssl.SSLSession from an earlier handshake to offer for resumption.
+    :return: {"tcp_ms", "handshake_ms", "bytes_in", "bytes_out", "version", "cipher", "alpn",
+              "resumed", "session", "chain_count", "chain_bytes"}
+    """
+    started = time.perf_counter()
+    sock = socket.create_connection((address, port), timeout=timeout)
+    try:
+        connected = time.perf_counter()
+        incoming, outgoing = ssl.MemoryBIO(), ssl.MemoryBIO()
+        tls = context.wrap_bio(incoming, outgoing, server_hostname=server_name, session=session)
+        counts = {"in": 0, "out": 0}
+
+        def flush():
+            data = outgoing.read()
+            if data:
+                sock.sendall(data)
+                counts["out"] += len(data)
+
+        def receive():
+            data = sock.recv(65536)
+            if not data:
+                raise ConnectionError("connection closed during the TLS handshake")
+            incoming.write(data)
+            counts["in"] += len(data)
+
+        while True:
+            try:
+                tls.do_handshake()
+                break
+            except ssl.SSLWantReadError:
+                flush()
+                receive()
+        flush()
+        finished = time.perf_counter()
+
+        # TLS 1.3 delivers session tickets after the handshake; process any that arrive shortly
+        deadline = finished + TICKET_WAIT
+        while tls.version() == "TLSv1.3" and not tls.session_reused:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or not select.select([sock], [], [], remaining)[0]:
+                break
+            try:
+                receive()
+                tls.read(1)
+            except ssl.SSLWantReadError:
+                continue
+            except (ssl.SSLError, ConnectionError):
+                break
+
+        chain = None
+        if hasattr(tls, "get_unverified_chain"):  # Python 3.13+
+            chain = tls.get_unverified_chain() or None
+        leaf = tls.getpeercert(binary_form=True)
+        return {
+            "tcp_ms": (connected - started) * 1000,
+            "handshake_ms": (finished - connected) * 1000,
+            "bytes_in": counts["in"],
+            "bytes_out": counts["out"],
+            "version": tls.version(),
+            "cipher": tls.cipher()[0] if tls.cipher() else None,
+            "alpn": tls.selected_alpn_protocol(),
+            "resumed": tls.session_reused,
+            "session": tls.session,
+            "chain_count": len(chain) if chain else (1 if leaf else 0),
+            "chain_bytes": sum(len(cert) for cert in chain) if chain else (len(leaf) if leaf else 0),
+        }
+    finally:
+        sock.close()
+
+
+def _median(values):
+    values = [value for value in values if value is not None]
+    return statistics.median(values) if values else None
+
+
+def profile_alpn(address, port, server_name, alpn, repeats=5, timeout=10.0):
+    """
+    Profiles one ALPN offer: `repeats` full handshakes and, after each, one handshake
+    resuming its session.
+
+    :return: {"alpn_offer", "alpn", "version", "cipher", "full_ms", "resumed_ms", "tcp_ms",
+              "resumed_count", "resume_attempts", "full_bytes_in", "resumed_bytes_in",
+              "chain_count", "chain_bytes", "errors", "last_error"}
+    """
+    context = _client_context(alpn)
+    full, resumed, errors = [], [], []
+    for _ in range(repeats):
+        try:
+            first = handshake_once(address, port, server_name, context, timeout=timeout)
+        except (OSError, ssl.SSLError) as e:
+            errors.append(str(e))
+            continue
+        full.append(first)
+        if first["session"] is None:
+            continue
+        try:
+            resumed.append(handshake_once(address, port, server_name, context, first["session"], timeout))
+        except (OSError, ssl.SSLError) as e:
+            errors.append(str(e))
+
+    reused = [item for item in resumed if item["resumed"]]
+    sample = full[-1] if full else {}
+    return {
+        "alpn_offer": alpn,
+        "alpn": sample.get("alpn"),
+        "version": sample.get("version"),
+        "cipher": sample.get("cipher"),
+        "full_ms": _median(item["handshake_ms"] for item in full),
+        "resumed_ms": _median(item["handshake_ms"] for item in reused),
+        "tcp_ms": _median(item["tcp_ms"] for item in full),
+        "resumed_count": len(reused),
+        "resume_attempts": len(resumed),
+        "full_bytes_in": _median(item["bytes_in"] for item in full),
+        "resumed_bytes_in": _median(item["bytes_in"] for item in reused),
+        "chain_count": sample.get("chain_count"),
+        "chain_bytes": sample.get("chain_bytes"),
+        "errors": len(errors),
+        "last_error": errors[-1] if errors else None,
+    }
+
+
+def recommend(target, results):
+    """
+    Derives settings from profile_alpn() results of one server.
+
+    :return: (options, notes) where options holds generator options (see
+             core.config_builder.DEFAULT_OPTIONS) worth changing and notes explains them.
+    """
+    usable = [result for result in results if result["full_ms"] is not None]
+    if not usable:
+        return {}, ["no TLS handshake succeeded"]
+    options, notes = {}, []
+    network = target.get("network", "tcp")
+    needed = {"ws": "http/1.1", "h2": "h2", "grpc": "h2"}.get(network)
+    # An offer only counts if the server agreed to the protocol the transport needs
+    suitable = [result for result in usable
+                if not needed or result["alpn"] == needed or (result["alpn_offer"] is None and needed == "http/1.1")]
+    if needed and not suitable:
+        notes.append(f"the server never negotiated {needed}, which {network} needs")
+        suitable = usable
+    best = min(suitable, key=lambda result: result["full_ms"])
+    current = target.get("alpn") or None
+    configured = next((result for result in suitable if result["alpn_offer"] == current), None)
+    if configured and best["full_ms"] > configured["full_ms"] * (1 - ALPN_MIN_GAIN):
+        best = configured  # Differences within noise do not justify a change
+    if best["alpn_offer"] != current:
+        options["alpn"] = list(best["alpn_offer"] or [])
+        notes.append(f"offer ALPN {','.join(best['alpn_offer'] or []) or '(none)'}: "
+                     f"{best['full_ms']:.1f} ms full handshake")
+
+    if best["version"] != "TLSv1.3":
+        notes.append(f"server negotiates {best['version']}; TLS 1.3 would save a round trip per new connection")
+    if best["resumed_count"] and best["resumed_ms"] is not None:
+        saving = 1 - best["resumed_ms"] / best["full_ms"]
+        if saving >= RESUMPTION_MIN_SAVING:
+            notes.append(f"session resumption works ({best['resumed_ms']:.1f} ms vs {best['full_ms']:.1f} ms, "
+                         f"{saving:.0%} faster)")
+        else:
+            notes.append(f"session resumption works but saves little ({saving:.0%})")
+    else:
+        options["mux"] = True
+        notes.append("session resumption is not available; enable mux so connections share one handshake")
+    if best["chain_bytes"] and best["chain_bytes"] > 4096:
+        notes.append(f"large certificate chain ({best['chain_bytes']} bytes in {best['chain_count']} certificates) "
+                     f"slows full handshakes")
+    return options, notes
+
+
+def profile_server(target, repeats=5, timeout=10.0, candidates=None):
+    """
+    Profiles every ALPN candidate for a target from tls_targets_from_config().
+    The target's configured offer is always profiled too, so recommend() can tell
+    whether a change beats it by more than the noise margin.
+
+    :return: {"target", "results": [profile_alpn() results], "options", "notes"}
+    """
+    if candidates is None:
+        candidates = ALPN_CANDIDATES.get(target.get("network"), DEFAULT_ALPN_CANDIDATES)
+    configured = target.get("alpn") or None
+    if configured not in candidates:
+        candidates = [configured] + list(candidates)
+    results = [profile_alpn(target["address"], target["port"], target["server_name"], alpn, repeats, timeout)
+               for alpn in candidates]
+    options, notes = recommend(target, results)
+    return {"target": target, "results": results, "options": options, "notes": notes}
+
+
+def profile_servers(targets, repeats=5, timeout=10.0, workers=8):
+    """Profiles several servers concurrently (the handshakes of one server stay sequential)."""
+    if not targets:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(targets))) as executor:
+        return list(executor.map(lambda target: profile_server(target, repeats, timeout), targets))
+
+
+def format_profile(profile):
+    """Plain-text report of one profile_server() result."""
+    target = profile["target"]
+
+    def ms(value):
+        return f"{value:.1f}" if value is not None else "-"
+
+    lines = [f"{target['address']}:{target['port']} (SNI {target['server_name']}, {target.get('network', 'tcp')})",
+             f"  {'ALPN offer':<16} {'got':<9} {'version':<8} {'full ms':>8} {'resumed ms':>10} {'resumed':>8} "
+             f"{'bytes in':>9} {'chain':>11}"]
+    for result in profile["results"]:
+        offer = ",".join(result["alpn_offer"] or []) or "(none)"
+        if result["full_ms"] is None:
+            lines.append(f"  {offer:<16} failed: {result['last_error']}")
+            continue
+        chain = f"{result['chain_count']}/{result['chain_bytes']}B"
+        lines.append(f"  {offer:<16} {result['alpn'] or '-':<9} {result['version'] or '-':<8} "
+                     f"{ms(result['full_ms']):>8} {ms(result['resumed_ms']):>10} "
+                     f"{result['resumed_count']:>3}/{result['resume_attempts']:<4} "
+                     f"{result['full_bytes_in'] or 0:>9.0f} {chain:>11}")
+    lines.extend(f"  - {note}" for note in profile["notes"])
+    return "\n".join(lines)
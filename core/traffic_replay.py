@@ -0,0 +1,407 @@
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import asyncio
+import threading
+from collections import Counter
+from urllib.parse import urlsplit
+
+from core.constants import SOCKS_INBOUND_PORT, HTTP_INBOUND_PORT
+from core.loadgen import SOCKS, HTTP, open_tunnel, read_socks5_reply, _error_name
+from core.standins import SINK_HEADER, LocalSinkServer
+from core.stats import percentiles
+
+# Reads in the same direction closer together than this are merged into one event
+COALESCE_MS = 5.0
+_ZERO_BLOCK = b"\0" * 65536
+
+
+class ConnectionRecord:
+    """The timeline of one recorded connection: when, where to and how many bytes each way. Never payloads."""
+    def __init__(self, inbound, start):
+        self.inbound = inbound
+        self.start = start
+        self.opened = time.perf_counter()
+        self.host = None
+        self.port = None
+        self.setup_ms = None
+        self.events = []
+        self.totals = {"up": 0, "down": 0}
+        self.error = None
+
+    def add(self, direction, size):
+        t = (time.perf_counter() - self.opened) * 1000
+        self.totals[direction] += size
+        last = self.events[-1] if self.events else None
+        if last and last[1] == direction and t - last[0] < COALESCE_MS:
+            last[2] += size
+        else:
+            self.events.append([round(t, 1), direction, size])
+
+    def to_dict(self):
+        record = {
+            "start": round(self.start, 4),
+            "inbound": self.inbound,
+            "host": self.host,
+            "port": self.port,
+            "setup_ms": self.setup_ms,
+            "duration_ms": round((time.perf_counter() - self.opened) * 1000, 1),
+            "up": self.totals["up"],
+            "down": self.totals["down"],
+            "events": self.events,
+        }
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+async def _pump(reader, writer, record, direction):
+    """Copies one direction of a connection, recording byte counts."""
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            record.add(direction, len(data))
+            writer.write(data)
+            await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+    except (OSError, asyncio.IncompleteReadError):
+        pass
+
+
+class TrafficRecorder:
+    """
+    A recording front for the local inbounds.
+
+    Point applications at the recorder's SOCKS5/HTTP ports instead of the core's;
+    every connection is relayed to the matching core inbound and its timeline is
+    appended to a JSONL file when it closes.
+
+    Usage:
+        with TrafficRecorder("browsing.jsonl") as recorder:
+            print(recorder.socks_port, recorder.http_port)
+    """
+    def __init__(self, path, upstream_socks_port=SOCKS_INBOUND_PORT, upstream_http_port=HTTP_INBOUND_PORT,
+                 socks_listen=0, http_listen=0, upstream_host="127.0.0.1", log_callback=print):
+        """
+        :param path: JSONL file the connection records are appended to.
+        :param socks_listen: Port of the recording SOCKS5 front (0 picks a free port).
+        :param http_listen: Port of the recording HTTP front (0 picks a free port).
+        """
+        self.path = path
+        self.upstream_host = upstream_host
+        self.upstream_socks_port = upstream_socks_port
+        self.upstream_http_port = upstream_http_port
+        self.socks_port = socks_listen
+        self.http_port = http_listen
+        self.log_callback = log_callback
+        self.recorded = 0
+        self.loop = None
+        self.thread = None
+        self.file = None
+        self.started_at = None
+        self._ready = threading.Event()
+        self._stop = None
+        self._startup_error = None
+
+    def start(self):
+        self.file = open(self.path, 'a', encoding='utf-8')
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self._ready.wait()
+        if self._startup_error:
+            self.file.close()
+            raise self._startup_error
+        self.log_callback(f"Recording SOCKS5 on 127.0.0.1:{self.socks_port}, HTTP on 127.0.0.1:{self.http_port} to {self.path}")
+        return self
+
+    def stop(self):
+        if self.loop and self._stop:
+            self.loop.call_soon_threadsafe(self._stop.set)
+        if self.thread:
+            self.thread.join(timeout=5)
+        if self.file:
+            self.file.close()
+        self.log_callback(f"Recorded {self.recorded} connections.")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self):
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        try:
+            socks = await asyncio.start_server(self._handle_socks, "127.0.0.1", self.socks_port)
+            http = await asyncio.start_server(self._handle_http, "127.0.0.1", self.http_port)
+        except OSError as e:
+            self._startup_error = e
+            self._ready.set()
+            return
+        self.socks_port = socks.sockets[0].getsockname()[1]
+        self.http_port = http.sockets[0].getsockname()[1]
+        self.started_at = time.perf_counter()
+        self._ready.set()
+        await self._stop.wait()
+        for server in (socks, http):
+            server.close()
+            await server.wait_closed()
+
+    def _new_record(self, inbound):
+        return ConnectionRecord(inbound, time.perf_counter() - self.started_at)
+
+    def _finish(self, record):
+        # Runs on the loop thread only, so writes never interleave
+        self.file.write(json.dumps(record.to_dict(), separators=(",", ":")) + "\n")
+        self.file.flush()
+        self.recorded += 1
+
+    async def _relay(self, record, client_reader, client_writer, upstream_reader, upstream_writer):
+        try:
+            await asyncio.gather(_pump(client_reader, upstream_writer, record, "up"),
+                                 _pump(upstream_reader, client_writer, record, "down"))
+        finally:
+            upstream_writer.close()
+            client_writer.close()
+            self._finish(record)
+
+    async def _handle_socks(self, reader, writer):
+        record = self._new_record(SOCKS)
+        try:
+            greeting = await reader.readexactly(2)
+            await reader.readexactly(greeting[1])
+            writer.write(b"\x05\x00")
+            await writer.drain()
+            request = await reader.readexactly(4)
+            if request[1] != 1:
+                # Only CONNECT is recorded; UDP should go to the core directly
+                writer.write(b"\x05\x07\x00\x01" + b"\0" * 6)
+                writer.close()
+                return
+            # read_socks5_reply() parses the same ATYP/ADDR/PORT layout as a request
+            record.host, record.port = await read_socks5_reply(_Prefixed(b"\x05\x00\x00" + request[3:4], reader))
+        except (OSError, asyncio.IncompleteReadError):
+            writer.close()
+            return
+
+        start = time.perf_counter()
+        try:
+            upstream_reader, upstream_writer = await open_tunnel(SOCKS, self.upstream_host, self.upstream_socks_port,
+                                                                 record.host, record.port)
+        except Exception as e:
+            record.error = _error_name(e)
+            writer.write(b"\x05\x01\x00\x01" + b"\0" * 6)
+            writer.close()
+            self._finish(record)
+            return
+        record.setup_ms = round((time.perf_counter() - start) * 1000, 1)
+        writer.write(b"\x05\x00\x00\x01" + b"\0" * 6)
+        await self._relay(record, reader, writer, upstream_reader, upstream_writer)
+
+    async def _handle_http(self, reader, writer):
+        record = self._new_record(HTTP)
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            method, target, _ = head.split(b"\r\n", 1)[0].decode("latin-1").split(" ", 2)
+        except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+
+        start = time.perf_counter()
+        try:
+            if method == "CONNECT":
+                host, _, port = target.rpartition(":")
+                record.host, record.port = host.strip("[]"), int(port)
+                upstream_reader, upstream_writer = await open_tunnel(HTTP, self.upstream_host, self.upstream_http_port,
+                                                                     record.host, record.port)
+            else:
+                # Plain proxy request: forward the request head as-is and count it as upload
+                url = urlsplit(target)
+                record.host, record.port = url.hostname, url.port or 80
+                upstream_reader, upstream_writer = await asyncio.open_connection(self.upstream_host, self.upstream_http_port)
+        except Exception as e:
+            record.error = _error_name(e)
+            writer.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n")
+            writer.close()
+            self._finish(record)
+            return
+        record.setup_ms = round((time.perf_counter() - start) * 1000, 1)
+        if method == "CONNECT":
+            writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n")
+        else:
+            record.add("up", len(head))
+            upstream_writer.write(head)
+        await self._relay(record, reader, writer, upstream_reader, upstream_writer)
+
+
+class _Prefixed:
+    """Lets read_socks5_reply() consume some already-read bytes before the stream."""
+    def __init__(self, prefix, reader):
+        self.prefix = prefix
+        self.reader = reader
+
+    async def readexactly(self, size):
+        if self.prefix:
+            data, self.prefix = self.prefix[:size], self.prefix[size:]
+            if len(data) < size:
+                data += await self.reader.readexactly(size - len(data))
+            return data
+        return await self.reader.readexactly(size)
+
+
+def load_recording(path):
+    """Reads a recording and returns its connection records sorted by start time."""
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    records.sort(key=lambda record: record["start"])
+    return records
+
+
+def replay_steps(events):
+    """
+    Turns a recorded timeline into request/response steps.
+
+    :return: A list of [t_ms, upload_bytes, download_bytes]; a new step starts at
+             every upload that follows a download.
+    """
+    steps = []
+    for t, direction, size in events:
+        if direction == "up":
+            if not steps or steps[-1][2] > 0:
+                steps.append([t, size, 0])
+            else:
+                steps[-1][1] += size
+        elif not steps:
+            steps.append([t, 0, size])
+        else:
+            steps[-1][2] += size
+    return steps
+
+
+async def _send_upload(writer, size, download):
+    writer.write(SINK_HEADER.pack(size, download))
+    while size > 0:
+        block = _ZERO_BLOCK[:min(size, len(_ZERO_BLOCK))]
+        writer.write(block)
+        size -= len(block)
+        await writer.drain()
+    await writer.drain()
+
+
+async def _replay_connection(record, proxy_kind, proxy_host, proxy_port, sink_host, sink_port, speed, timeout, started):
+    """Replays one connection; returns (setup_ms, [first_byte_ms...], completion_ms, expected_ms)."""
+    loop = asyncio.get_running_loop()
+    delay = started + record["start"] / speed - loop.time()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    opened = loop.time()
+    reader, writer = await asyncio.wait_for(open_tunnel(proxy_kind, proxy_host, proxy_port, sink_host, sink_port), timeout)
+    setup_ms = (loop.time() - opened) * 1000
+    first_bytes = []
+    try:
+        for t, upload, download in replay_steps(record["events"]):
+            delay = opened + t / 1000 / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            sent = loop.time()
+            await asyncio.wait_for(_send_upload(writer, upload, download), timeout)
+            if download:
+                await asyncio.wait_for(reader.readexactly(1), timeout)
+                first_bytes.append((loop.time() - sent) * 1000)
+                remaining = download - 1
+                while remaining > 0:
+                    chunk = await asyncio.wait_for(reader.read(min(remaining, 65536)), timeout)
+                    if not chunk:
+                        raise asyncio.IncompleteReadError(b"", remaining)
+                    remaining -= len(chunk)
+    finally:
+        writer.close()
+    return setup_ms, first_bytes, (loop.time() - opened) * 1000, record["duration_ms"] / speed
+
+
+async def replay_async(records, proxy_kind, proxy_port, sink_host, sink_port, speed=1.0, timeout=30.0,
+                       proxy_host="127.0.0.1"):
+    """
+    Replays recorded connections through a local inbound against a sink server,
+    keeping their original start offsets and step timing (divided by speed).
+
+    :param records: Output of load_recording(); records that failed when recorded are skipped.
+    :param speed: 1.0 replays in real time, 10.0 ten times faster.
+    :return: A report dict, see format_replay_report().
+    """
+    records = [record for record in records if not record.get("error")]
+    setups, first_bytes, completions, slowdowns, errors = [], [], [], [], Counter()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    async def one(record):
+        try:
+            setup_ms, ttfb, completion_ms, expected_ms = await _replay_connection(
+                record, proxy_kind, proxy_host, proxy_port, sink_host, sink_port, speed, timeout, started)
+        except Exception as e:
+            errors[_error_name(e)] += 1
+            return
+        setups.append(setup_ms)
+        first_bytes.extend(ttfb)
+        completions.append(completion_ms)
+        if expected_ms > 0:
+            slowdowns.append(completion_ms / expected_ms)
+
+    await asyncio.gather(*(one(record) for record in records))
+    return {
+        "proxy": proxy_kind,
+        "speed": speed,
+        "connections": len(records),
+        "succeeded": len(completions),
+        "elapsed": loop.time() - started,
+        "bytes_up": sum(record["up"] for record in records),
+        "bytes_down": sum(record["down"] for record in records),
+        "setup_ms": percentiles(setups, (50, 90, 99)),
+        "first_byte_ms": percentiles(first_bytes, (50, 90, 99)),
+        "completion_ms": percentiles(completions, (50, 90, 99)),
+        "slowdown": percentiles(slowdowns, (50, 90, 99)),
+        "errors": dict(errors),
+    }
+
+
+def replay(records, proxy_kind, proxy_port, sink_host=None, sink_port=None, **kwargs):
+    """
+    Synchronous wrapper around replay_async(). Without a sink address a
+    LocalSinkServer is started for the duration of the replay.
+    """
+    sink = None
+    if sink_host is None:
+        sink = LocalSinkServer().start()
+        sink_host, sink_port = sink.host, sink.port
+    try:
+        return asyncio.run(replay_async(records, proxy_kind, proxy_port, sink_host, sink_port, **kwargs))
+    finally:
+        if sink:
+            sink.stop()
+
+
+def format_replay_report(report):
+    setup, ttfb, total, slow = report["setup_ms"], report["first_byte_ms"], report["completion_ms"], report["slowdown"]
+    lines = [
+        f"{report['proxy']} replay at {report['speed']:g}x: {report['succeeded']}/{report['connections']} connections "
+        f"in {report['elapsed']:.2f}s ({report['bytes_up'] / 1024:.0f} KiB up, {report['bytes_down'] / 1024:.0f} KiB down)",
+        f"  setup ms       p50 {setup['p50']:.1f}  p90 {setup['p90']:.1f}  p99 {setup['p99']:.1f}",
+        f"  first byte ms  p50 {ttfb['p50']:.1f}  p90 {ttfb['p90']:.1f}  p99 {ttfb['p99']:.1f}",
+        f"  complete ms    p50 {total['p50']:.1f}  p90 {total['p90']:.1f}  p99 {total['p99']:.1f}",
+        f"  vs recorded    p50 {slow['p50']:.2f}x  p90 {slow['p90']:.2f}x  p99 {slow['p99']:.2f}x",
+    ]
+    if report["errors"]:
+        lines.append("  errors: " + ", ".join(f"{name} x{count}" for name, count in sorted(report["errors"].items())))
+    return "\n".join(lines)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+import time
+import socket
+import struct
+import select
+
+from core.loadgen import socks5_address
+from core.stats import percentiles
+
+# Probe payload: sequence number and send timestamp (perf_counter seconds)
+_PROBE = struct.Struct("!Id")
+
+
+def udp_associate(proxy_host, proxy_port, timeout=5.0):
+    """
+    Opens a SOCKS5 UDP ASSOCIATE session.
+
+    :return: (control_socket, relay_address). The association lives as long as the
+             control socket stays open.
+    :raises ConnectionError: If the inbound refuses the association.
+    """
+    control = socket.create_connection((proxy_host, proxy_port), timeout=timeout)
+    try:
+        control.sendall(b"\x05\x01\x00")
+        if _recv_exact(control, 2) != b"\x05\x00":
+            raise ConnectionError("SOCKS5 no-auth method rejected")
+        control.sendall(b"\x05\x03\x00" + socks5_address("0.0.0.0", 0))
+        head = _recv_exact(control, 4)
+        if head[1] != 0:
+            raise ConnectionError(f"UDP ASSOCIATE rejected (reply {head[1]}); is UDP enabled on the SOCKS inbound?")
+        if head[3] == 1:
+            host = socket.inet_ntoa(_recv_exact(control, 4))
+        elif head[3] == 4:
+            host = socket.inet_ntop(socket.AF_INET6, _recv_exact(control, 16))
+        else:
+            host = _recv_exact(control, _recv_exact(control, 1)[0]).decode("idna")
+        port = struct.unpack("!H", _recv_exact(control, 2))[0]
+    except BaseException:
+        control.close()
+        raise
+    if host in ("0.0.0.0", "::"):
+        host = proxy_host
+    return control, (host, port)
+
+
+def _recv_exact(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("SOCKS5 connection closed during handshake")
+        data += chunk
+    return data
+
+
+def _strip_udp_header(datagram):
+    """
+    Returns the payload of a SOCKS5 UDP datagram (RSV, FRAG, ATYP, ADDR, PORT, DATA),
+    or b"" if the datagram is too short to hold the header.
+    """
+    if len(datagram) < 5:
+        return b""
+    atyp = datagram[3]
+    if atyp == 1:
+        offset = 10
+    elif atyp == 4:
+        offset = 22
+    else:
+        offset = 7 + datagram[4]
+    return datagram[offset:] if len(datagram) >= offset else b""
+
+
+def rfc3550_jitter(transit_ms):
+    """
+    Interarrival jitter (RFC 3550, section 6.4.1): the running estimate J += (|D| - J) / 16,
+    where D is the change in transit time between consecutively received packets.
+    """
+    jitter = 0.0
+    for previous, current in zip(transit_ms, transit_ms[1:]):
+        jitter += (abs(current - previous) - jitter) / 16
+    return jitter
+
+
+def run_udp_test(proxy_port, target_host, target_port, count=100, interval=0.02, payload_size=64,
+                 timeout=2.0, proxy_host="127.0.0.1"):
+    """
+    Sends a burst of timestamped datagrams through the SOCKS5 inbound to a UDP echo target.
+
+    :param count: Number of datagrams in the burst.
+    :param interval: Seconds between datagrams.
+    :param timeout: How long to wait for late replies after the last datagram.
+    :return: A report dict, see format_udp_report().
+    """
+    control, relay = udp_associate(proxy_host, proxy_port)
+    udp = socket.socket(socket.AF_INET6 if ":" in relay[0] else socket.AF_INET, socket.SOCK_DGRAM)
+    header = b"\x00\x00\x00" + socks5_address(target_host, target_port)
+    padding = b"\x00" * max(0, payload_size - _PROBE.size)
+    rtts = {}
+    arrival_order = []
+    duplicates = 0
+
+    def receive(wait):
+        nonlocal duplicates
+        deadline = time.perf_counter() + wait
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return
+            readable, _, _ = select.select([udp], [], [], remaining)
+            if not readable:
+                return
+            data = udp.recv(65536)
+            now = time.perf_counter()
+            payload = _strip_udp_header(data)
+            if len(payload) < _PROBE.size:
+                continue
+            seq, sent_at = _PROBE.unpack_from(payload)
+            if seq in rtts:
+                duplicates += 1
+                continue
+            rtts[seq] = (now - sent_at) * 1000
+            arrival_order.append(seq)
+
+    try:
+        for seq in range(count):
+            udp.sendto(header + _PROBE.pack(seq, time.perf_counter()) + padding, relay)
+            receive(interval)
+        receive(timeout)
+    finally:
+        udp.close()
+        control.close()
+
+    # Reordering: replies that arrive after a higher sequence number was already seen
+    reordered, highest = 0, -1
+    for seq in arrival_order:
+        if seq < highest:
+            reordered += 1
+        highest = max(highest, seq)
+    # Jitter over the replies in arrival order, with the round trip time as the transit time
+    ordered = [rtts[seq] for seq in sorted(rtts)]
+    jitter = rfc3550_jitter([rtts[seq] for seq in arrival_order])
+    received = len(rtts)
+    return {
+        "sent": count,
+        "received": received,
+        "loss": (count - received) / count if count else 0.0,
+        "duplicates": duplicates,
+        "reordered": reordered,
+        "rtt_ms": percentiles(ordered, (50, 90, 99)),
+        "jitter_ms": jitter,
+    }
+
+
+def format_udp_report(report):
+    rtt = report["rtt_ms"]
+    return (f"UDP: {report['received']}/{report['sent']} replies, loss {report['loss'] * 100:.1f}%, "
+            f"reordered {report['reordered']}, duplicates {report['duplicates']}\n"
+            f"  RTT ms  p50 {rtt['p50']:.1f}  p90 {rtt['p90']:.1f}  p99 {rtt['p99']:.1f}  jitter {report['jitter_ms']:.2f}")
@@ -2,6 +2,8 @@
 
 import os
 import sys
+import time
+import socket
 
 def resource_path(relative_path):
     """
@@ -17,3 +19,23 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     # 返回拼接后的绝对路径
     return os.path.join(base_path, relative_path)
+
+def find_free_port(host="127.0.0.1"):
+    """向操作系统申请一个当前空闲的TCP端口号。"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+def wait_for_port(host, port, timeout=10.0, interval=0.05):
+    """
+    等待指定端口开始接受TCP连接。
+    在超时前端口可连接则返回True，否则返回False。
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=interval * 4):
+                return True
+        except OSError:
+            time.sleep(interval)
+    return False
@@ -2,33 +2,88 @@
 
 import subprocess
 import threading
+import time
+import json
 import sys
 import os
-from core.utils import resource_path
-from core.constants import V2RAY_CORE_PATH
+import itertools
+from core.constants import CORE_LOG_LEVELS
+from core.backends import get_backend, write_translated_config, DEFAULT_BACKEND
+from core.templates import materialize, TemplateError
+from core.log_reader import CoreOutputReader
+from core.preflight import PreflightValidator
+from core.resource_limits import build_launch, apply_limits, remove_cgroup, read_applied_limits, format_applied_limits
+from core.readiness import ReadinessWatcher, inbound_endpoints, record_startup, DEFAULT_READY_TIMEOUT
+
+# Numbers manager instances, so each gets its own cgroup
+_instance_ids = itertools.count(1)
 
 class V2rayManager:
     """
     Manages the V2Ray subprocess, including starting, stopping, and monitoring.
     """
-    def __init__(self, log_callback):
+    def __init__(self, log_callback, log_threshold="info", log_sample_every=0, preflight=True,
+                 launch_limits=None, backend=DEFAULT_BACKEND, executable=None,
+                 ready_timeout=DEFAULT_READY_TIMEOUT, ready_marker=True):
         """
         Initializes the V2rayManager.
 
         :param log_callback: A function to call with log messages.
+        :param log_threshold: Lowest core log level forwarded to log_callback.
+        :param log_sample_every: Forward one in N lines below the threshold (0 drops them).
+        :param preflight: Validate configs (cached by content hash) before launching them.
+        :param launch_limits: Scheduling/resource limits for the core (see core.resource_limits).
+        :param backend: Name of the core backend to drive (see core.backends).
+        :param executable: Path of the core binary; defaults to the backend's bundled binary.
+        :param ready_timeout: Seconds to wait for the inbounds to accept connections after spawning.
+        :param ready_marker: Also wait for the core's "started" log line (when its log level prints it).
         """
         self.v2ray_process = None
         self.log_callback = log_callback
-        self.v2ray_executable = resource_path(V2RAY_CORE_PATH)
+        self.launch_limits = dict(launch_limits or {})
+        self.applied_limits = {}
+        self.cgroup_name = f"core-{os.getpid()}-{next(_instance_ids)}"
+        self.output_reader = CoreOutputReader(log_callback, log_threshold, log_sample_every)
+        self.use_preflight = preflight
+        self.ready_timeout = ready_timeout
+        self.ready_marker = ready_marker
+        self.ready_event = threading.Event()
+        self.last_startup = None
+        self.set_backend(backend, executable)
+
+    def set_backend(self, name, executable=None):
+        """Switches the core backend used for the next start."""
+        self.backend = get_backend(name)
+        self.v2ray_executable = executable or self.backend.default_executable()
+        self.output_reader.level_parser = self.backend.parse_level
+        self.preflight = PreflightValidator(self.v2ray_executable, backend=self.backend) if self.use_preflight else None
         if not os.path.exists(self.v2ray_executable):
-            self.log_callback(f"Error: v2ray.exe not found at {self.v2ray_executable}")
+            self.log_callback(f"Error: {self.backend.display_name} core not found at {self.v2ray_executable}")
+
+    def set_log_threshold(self, level):
+        """Changes the lowest core log level forwarded to the log callback at runtime."""
+        self.output_reader.set_threshold(level)
 
     def is_running(self):
         """Check if the V2Ray process is currently running."""
         return self.v2ray_process and self.v2ray_process.poll() is None
 
-    def start(self, config_path, on_exit_callback=None):
-        """Starts the V2Ray process in a separate thread."""
+    def is_ready(self):
+        """Check if the running core has its inbounds up."""
+        return bool(self.is_running()) and self.ready_event.is_set()
+
+    def wait_ready(self, timeout=None):
+        """Blocks until the core started last is ready; returns False on timeout or if it is not running."""
+        return self.ready_event.wait(timeout) and bool(self.is_running())
+
+    def start(self, config_path, on_exit_callback=None, on_ready_callback=None):
+        """
+        Starts the V2Ray process in a separate thread.
+
+        :param on_ready_callback: Called (from a worker thread) with the readiness result of
+                                  core.readiness.ReadinessWatcher.wait() once the core's inbounds
+                                  accept connections, or when the ready timeout expires or the core exits first.
+        """
         if not config_path:
             self.log_callback("Error: V2Ray config path is not provided.")
             return False
@@ -36,54 +91,175 @@ class V2rayManager:
             self.log_callback("V2Ray is already running.")
             return False
         if not os.path.exists(self.v2ray_executable):
-            self.log_callback(f"Error: v2ray.exe not found at {self.v2ray_executable}")
+            self.log_callback(f"Error: {self.backend.display_name} core not found at {self.v2ray_executable}")
             return False
 
         self.log_callback("Starting V2Ray...")
+        self.ready_event.clear()
         try:
-            thread = threading.Thread(target=self._run_process, args=(config_path, on_exit_callback), daemon=True)
+            thread = threading.Thread(target=self._run_process, args=(config_path, on_exit_callback, on_ready_callback),
+                                      daemon=True)
             thread.start()
             return True
         except Exception as e:
             self.log_callback(f"Failed to start V2Ray: {e}")
             return False
 
-    def _run_process(self, config_path, on_exit_callback):
+    def _run_process(self, config_path, on_exit_callback, on_ready_callback=None):
         """The actual process running logic."""
+        process = None
+        cgroup = None
+        runtime_path = launch_path = config_path
         try:
-            creationflags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
-            self.v2ray_process = subprocess.Popen(
-                [self.v2ray_executable, "run", "-c", config_path],
+            try:
+                # Template overlays are merged into a cached runtime config first
+                runtime_path = launch_path = materialize(config_path)
+            except TemplateError as e:
+                self.log_callback(f"Config template error, V2Ray was not started: {e}")
+                return
+            if self.preflight:
+                ok, problems, cached = self.preflight.validate(runtime_path, check_ports=True)
+                if not ok:
+                    self.log_callback("Pre-flight validation failed, V2Ray was not started:")
+                    for problem in problems:
+                        self.log_callback(f"  - {problem}")
+                    return
+                if not cached:
+                    self.log_callback("Pre-flight validation passed.")
+
+            launch_path, notes = write_translated_config(self.backend, runtime_path)
+            for note in notes:
+                self.log_callback(f"{self.backend.display_name} config translation: {note}")
+            endpoints, marker_event = self._readiness_checks(runtime_path)
+            command, launch_kwargs = build_launch(self.backend.run_command(self.v2ray_executable, launch_path),
+                                                  self.launch_limits, log_callback=self.log_callback)
+            creationflags = launch_kwargs.pop("creationflags", 0)
+            if sys.platform == "win32":
+                creationflags |= subprocess.CREATE_NO_WINDOW
+            # Windows pipes cannot be multiplexed with selectors, so stderr is merged into stdout there
+            merge_stderr = sys.platform == "win32"
+            spawned_at = time.monotonic()
+            process = subprocess.Popen(
+                command,
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding='utf-8',
-                creationflags=creationflags
+                stderr=subprocess.STDOUT if merge_stderr else subprocess.PIPE,
+                bufsize=0,
+                creationflags=creationflags,
+                **launch_kwargs
             )
-            self.log_callback("V2Ray started successfully.")
+            self.v2ray_process = process
+            if self.launch_limits:
+                cgroup = apply_limits(process.pid, self.launch_limits, self.cgroup_name, self.log_callback)
+            self.log_callback(f"V2Ray process spawned (PID {process.pid}), waiting for its inbounds...")
+            watcher = ReadinessWatcher(process, endpoints, spawned_at, marker_event, self.ready_timeout)
+            threading.Thread(target=self._await_ready, args=(process, watcher, config_path, on_ready_callback),
+                             daemon=True).start()
 
-            stdout_thread = threading.Thread(target=self._read_stream, args=(self.v2ray_process.stdout, "V2ray STDOUT"), daemon=True)
-            stderr_thread = threading.Thread(target=self._read_stream, args=(self.v2ray_process.stderr, "V2ray STDERR"), daemon=True)
-            stdout_thread.start()
-            stderr_thread.start()
+            # Output is read on this thread; unprefixed stderr lines are usually fatal errors
+            if merge_stderr:
+                streams = [(process.stdout, "V2ray", CORE_LOG_LEVELS["warning"])]
+            else:
+                streams = [(process.stdout, "V2ray STDOUT", CORE_LOG_LEVELS["info"]),
+                           (process.stderr, "V2ray STDERR", CORE_LOG_LEVELS["error"])]
+            dropped_before = self.output_reader.dropped
+            self.output_reader.read_pipes(streams)
 
-            self.v2ray_process.wait()
-            exit_code = self.v2ray_process.returncode
+            process.wait()
+            exit_code = process.returncode
+            dropped = self.output_reader.dropped - dropped_before
+            if dropped:
+                self.log_callback(f"Filtered {dropped} low-severity core log lines.")
             self.log_callback(f"V2Ray process has exited with code: {exit_code}")
 
         except FileNotFoundError:
-            self.log_callback(f"Error: v2ray.exe not found. Please check the path: {self.v2ray_executable}")
+            self.log_callback(f"Error: core not found. Please check the path: {self.v2ray_executable}")
         except Exception as e:
             self.log_callback(f"V2Ray runtime error: {e}")
         finally:
-            self.v2ray_process = None
+            # A restart may already have replaced the process; only clear our own
+            if self.v2ray_process is process:
+                self.v2ray_process = None
+                self.applied_limits = {}
+                self.ready_event.clear()
+            remove_cgroup(cgroup)
+            if launch_path != runtime_path:
+                try:
+                    os.remove(launch_path)
+                except OSError:
+                    pass
             if on_exit_callback:
                 on_exit_callback()
 
-    def _read_stream(self, stream, name):
-        """Reads the output stream of the V2Ray process."""
-        for line in stream:
-            self.log_callback(f"[{name}] {line.strip()}")
+    def _readiness_checks(self, runtime_path):
+        """Returns the inbound endpoints to poll and the log marker event (or None) for a launch."""
+        try:
+            with open(runtime_path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except (OSError, ValueError):
+            return [], None  # The core reports unreadable configs itself
+        marker_event = None
+        if self.ready_marker and self.backend.logs_ready_marker(config):
+            marker_event = threading.Event()
+            self.output_reader.watch_for(self.backend.ready_marker, marker_event)
+        return inbound_endpoints(config), marker_event
+
+    def _await_ready(self, process, watcher, config_path, on_ready_callback):
+        """
+        Waits for readiness on a worker thread, records the start-up time and runs the callback.
+        After a timeout it keeps watching, so a core that comes up late still becomes ready and
+        the callback runs again. Nothing is reported once the process was stopped or replaced.
+        """
+        timeout = watcher.timeout
+        recorded = False
+        while True:
+            result = watcher.wait()
+            if self.v2ray_process is not process:
+                return
+            if result["reason"] == "timeout" and recorded:
+                # Already reported; keep waiting quietly for the core to come up or exit
+                watcher.timeout += timeout
+                continue
+            if result["ready"]:
+                if self.launch_limits:
+                    # Read once the core runs, past the launch wrappers, with its threads started
+                    self.applied_limits = read_applied_limits(process.pid)
+                    self.log_callback(f"Applied resource limits: {format_applied_limits(self.applied_limits)}")
+                self.ready_event.set()
+                self.log_callback(f"V2Ray started successfully (ready {result['ready_ms']:.0f} ms after spawn).")
+            elif result["reason"] == "exited":
+                self.log_callback("V2Ray exited before its inbounds became ready.")
+            else:
+                self.log_callback(f"Warning: V2Ray is not ready after {watcher.timeout:g} s, "
+                                  f"still waiting for {', '.join(result['waiting_for'])}.")
+            self._record_startup(config_path, result, save=not recorded)
+            recorded = True
+            if on_ready_callback:
+                on_ready_callback(result)
+            if result["reason"] != "timeout":
+                return
+            watcher.timeout += timeout
+
+    def _record_startup(self, config_path, result, save=True):
+        """Keeps the start-up measurement for the status bar; only the first outcome goes to the history."""
+        def rounded(value):
+            return round(value, 1) if value is not None else None
+
+        self.last_startup = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "backend": self.backend.name,
+            "config": os.path.basename(config_path),
+            "ready": result["ready"],
+            "ready_ms": rounded(result["ready_ms"]),
+            "ports_ms": rounded(result["ports_ms"]),
+            "marker_ms": rounded(result["marker_ms"]),
+            "reason": result["reason"],
+        }
+        if not save:
+            return
+        try:
+            record_startup(self.last_startup)
+        except OSError as e:
+            self.log_callback(f"Could not record start-up time: {e}")
 
     def stop(self):
         """Stops the V2Ray process."""
@@ -105,3 +281,4 @@ class V2rayManager:
             self.log_callback(f"Error stopping V2Ray: {e}")
         finally:
             self.v2ray_process = None
+            self.ready_event.clear()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+A stand-in for the core binary: `fake_core.py run -c config.json` listens on the
+config's inbound ports and answers every connection with a JSON report of the
+scheduling and resource limits in effect for its own process.
+"""
+
+import os
+import sys
+import json
+import socket
+import threading
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Like the Go runtime of a real core, start a few threads before serving anything
+WORKER_THREADS = 4
+
+
+def _thread_ids():
+    try:
+        return sorted(int(tid) for tid in os.listdir("/proc/self/task"))
+    except OSError:
+        return [os.getpid()]
+
+
+def report():
+    info = {"pid": os.getpid()}
+    tids = _thread_ids()
+    info["threads"] = len(tids)
+    # Per-thread values, so a limit that reached only the main thread shows up
+    if hasattr(os, "getpriority"):
+        info["nice"] = sorted({os.getpriority(os.PRIO_PROCESS, tid) for tid in tids})
+    if hasattr(os, "sched_getaffinity"):
+        info["cpu_affinity"] = sorted({tuple(sorted(os.sched_getaffinity(tid))) for tid in tids})
+    if resource is not None:
+        info["nofile"] = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        if hasattr(resource, "RLIMIT_AS"):
+            info["address_space"] = resource.getrlimit(resource.RLIMIT_AS)[0]
+    try:
+        with open("/proc/self/cgroup", 'r', encoding='utf-8') as f:
+            info["cgroup"] = f.read().strip()
+    except OSError:
+        pass
+    return info
+
+
+def serve(listener):
+    while True:
+        conn, _ = listener.accept()
+        with conn:
+            conn.sendall(json.dumps(report()).encode('utf-8'))
+
+
+def main(argv):
+    if len(argv) < 3 or argv[0] not in ("run", "test") or argv[1] != "-c":
+        print("usage: fake_core.py run|test -c config.json", file=sys.stderr)
+        return 2
+    with open(argv[2], 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    if argv[0] == "test":
+        print("Configuration OK.")
+        return 0
+
+    for _ in range(WORKER_THREADS):
+        threading.Thread(target=threading.Event().wait, daemon=True).start()
+    for inbound in config.get("inbounds", []):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((inbound.get("listen", "127.0.0.1"), inbound["port"]))
+        listener.listen(16)
+        threading.Thread(target=serve, args=(listener,), daemon=True).start()
+    print("[Warning] core: V2Ray 5.0.0 started", flush=True)
+    threading.Event().wait()  # Until terminated
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
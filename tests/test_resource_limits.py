@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import socket
+import threading
+
+import pytest
+
+from core import resource_limits
+from core.utils import find_free_port
+from core.v2ray_manager import V2rayManager
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="limits are applied after spawn on POSIX only")
+
+FAKE_CORE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_core.py")
+
+
+@pytest.fixture
+def fake_core(tmp_path, monkeypatch):
+    """An executable wrapper around fake_core.py and a config with one inbound."""
+    monkeypatch.setenv("APPDATA", str(tmp_path))  # Start-up history goes here
+    executable = tmp_path / "fake-core"
+    executable.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_CORE}" "$@"\n')
+    executable.chmod(0o755)
+    port = find_free_port()
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({"inbounds": [{"port": port, "listen": "127.0.0.1", "protocol": "socks"}],
+                                  "outbounds": [{"protocol": "freedom"}]}))
+    return str(executable), str(config), port
+
+
+def run_with_limits(fake_core, limits):
+    """Starts the fake core under limits and returns (its self-report, manager log lines)."""
+    executable, config, port = fake_core
+    logs = []
+    manager = V2rayManager(logs.append, preflight=False, launch_limits=limits, executable=executable,
+                           ready_timeout=10, ready_marker=False)
+    stopped = threading.Event()
+    assert manager.start(config, on_exit_callback=stopped.set)
+    try:
+        assert manager.wait_ready(10), logs
+        with socket.create_connection(("127.0.0.1", port), timeout=5) as conn:
+            data = b""
+            while chunk := conn.recv(4096):
+                data += chunk
+        return json.loads(data), logs
+    finally:
+        manager.stop()
+        assert stopped.wait(10)
+
+
+def test_limits_are_in_effect(fake_core):
+    own_nice = os.getpriority(os.PRIO_PROCESS, 0)
+    limits = {"nice": 5, "nofile": 256}
+    if hasattr(os, "sched_setaffinity"):
+        limits["cpu_affinity"] = [sorted(os.sched_getaffinity(0))[0]]
+    report, logs = run_with_limits(fake_core, limits)
+
+    # Every thread of the core, not just the main one, runs under the limits
+    assert report["threads"] > 1
+    assert report["nice"] == [min(19, own_nice + 5)]
+    assert report["nofile"] == 256
+    if "cpu_affinity" in limits:
+        assert report["cpu_affinity"] == [limits["cpu_affinity"]]
+    assert not any("not applied" in line for line in logs), logs
+
+
+def test_per_thread_fallback_reaches_every_thread(fake_core, monkeypatch):
+    # Without the nice/taskset tools the limits are applied to each thread after spawn
+    monkeypatch.setattr(resource_limits.shutil, "which", lambda name: None)
+    own_nice = os.getpriority(os.PRIO_PROCESS, 0)
+    report, logs = run_with_limits(fake_core, {"nice": 3})
+
+    assert report["threads"] > 1
+    assert report["nice"] == [min(19, own_nice + 3)]
+
+
+def test_applied_limits_report_the_least_restricted_thread():
+    own_nice = os.getpriority(os.PRIO_PROCESS, 0)
+    reniced, blocker = threading.Event(), threading.Event()
+
+    def worker():
+        os.setpriority(os.PRIO_PROCESS, 0, min(19, own_nice + 2))  # This thread only (Linux)
+        reniced.set()
+        blocker.wait()
+
+    threading.Thread(target=worker, daemon=True).start()
+    try:
+        assert reniced.wait(5)
+        assert resource_limits.read_applied_limits(os.getpid())["nice"] == own_nice
+    finally:
+        blocker.set()
+
+
+def test_failed_limit_is_logged_and_core_keeps_running(fake_core, monkeypatch):
+    monkeypatch.setattr(resource_limits, "CGROUP_ROOT", "/nonexistent-cgroup-root")
+    report, logs = run_with_limits(fake_core, {"cgroup_memory_mb": 64, "nofile": 200})
+
+    assert report["nofile"] == 200
+    assert any("cgroup limits not applied" in line for line in logs), logs
+
+
+def test_each_manager_gets_its_own_cgroup():
+    first = V2rayManager(lambda message: None, preflight=False)
+    second = V2rayManager(lambda message: None, preflight=False)
+    assert first.cgroup_name != second.cgroup_name
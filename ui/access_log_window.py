@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import customtkinter
+
+from core.access_log import AccessLogAnalyzer
+from core.constants import ACCESS_LOG_FILE
+from core.settings import get_persistent_data_path
+
+REFRESH_INTERVAL_MS = 2000
+
+class AccessLogWindow(customtkinter.CTkToplevel):
+    """
+    访问日志分析窗口。
+    在后台线程中增量读取核心的访问日志，并定期显示热门域名、热门目标和各出站的连接速率。
+    """
+    def __init__(self, master, log_path=None):
+        super().__init__(master)
+        self.master = master
+        self.log_path = log_path or get_persistent_data_path(ACCESS_LOG_FILE)
+        self.analyzer = AccessLogAnalyzer(self.log_path)
+        self.stop_event = threading.Event()
+
+        self.title("访问日志分析")
+        self.geometry("640x520")
+        self.transient(master)
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        customtkinter.CTkLabel(self, text=f"日志文件: {self.log_path}", anchor="w").grid(row=0, column=0, sticky="ew", padx=10, pady=(10, 0))
+        self.report_text = customtkinter.CTkTextbox(self, wrap="none", font=customtkinter.CTkFont(family="Consolas"))
+        self.report_text.grid(row=1, column=0, sticky="nsew", padx=10, pady=10)
+        self.report_text.configure(state="disabled")
+
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        # 读取日志文件放在后台线程，UI线程只负责渲染快照
+        threading.Thread(target=self._poll_loop, daemon=True).start()
+        self.after(0, self._refresh)
+
+    def _poll_loop(self):
+        """后台线程：每秒读取一次新增的日志行"""
+        while not self.stop_event.is_set():
+            try:
+                self.analyzer.poll()
+            except Exception as e:
+                self.master.log_message_from_thread(f"读取访问日志失败: {e}")
+            self.stop_event.wait(1)
+
+    def _refresh(self):
+        """定期刷新统计报告"""
+        if self.stop_event.is_set():
+            return
+        stats = self.analyzer.snapshot()
+        lines = [f"已接受: {stats['accepted']}    已拒绝: {stats['rejected']}    无法解析: {stats['unparsed']}", ""]
+
+        lines.append("出站连接速率 (连接/秒, 最近一分钟) / 总数:")
+        for outbound, total in sorted(stats["outbound_totals"].items(), key=lambda item: item[1], reverse=True):
+            lines.append(f"  {outbound:<20} {stats['outbound_rates'].get(outbound, 0):8.2f} {total:10d}")
+
+        lines.append("")
+        lines.append("热门域名 (次数 ± 误差上限):")
+        for domain, count, error in stats["top_domains"]:
+            lines.append(f"  {domain:<40} {count:8d} ± {error}")
+
+        lines.append("")
+        lines.append("热门目标:")
+        for destination, count, error in stats["top_destinations"]:
+            lines.append(f"  {destination:<40} {count:8d} ± {error}")
+
+        if not stats["accepted"] and not stats["rejected"]:
+            lines.append("")
+            lines.append("暂无数据。请在配置生成器中启用访问日志，并使用该配置启动 V2ray。")
+
+        self.report_text.configure(state="normal")
+        self.report_text.delete("1.0", "end")
+        self.report_text.insert("end", "\n".join(lines))
+        self.report_text.configure(state="disabled")
+        self.after(REFRESH_INTERVAL_MS, self._refresh)
+
+    def close(self):
+        """关闭窗口并停止后台读取线程"""
+        self.stop_event.set()
+        self.destroy()
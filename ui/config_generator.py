@@ -1,15 +1,22 @@
 # -*- coding: utf-8 -*-
 
 import tkinter as tk
-from tkinter import messagebox
+from tkinter import filedialog, messagebox
 import customtkinter
 import os
 import sys
 import json
 import uuid
+import threading
 
-from core.constants import SOCKS_INBOUND_PORT, HTTP_INBOUND_PORT
+from core.constants import ACCESS_LOG_FILE
 from core.utils import resource_path
+from core.settings import get_persistent_data_path
+from core.bulk_generate import load_inventory, bulk_generate, format_report
+from core.config_builder import (build_config, validate_options, DEFAULT_OPTIONS, NETWORKS,
+                                 FINGERPRINTS, QUIC_SECURITIES, QUIC_HEADERS, DOMAIN_STRATEGIES)
+from core.probe import probe_families, format_family_report, FAMILY_DOMAIN_STRATEGIES
+from core.tls_profiler import profile_server, format_profile
 
 class ConfigGeneratorWindow(customtkinter.CTkToplevel):
     """
@@ -22,7 +29,7 @@ class ConfigGeneratorWindow(customtkinter.CTkToplevel):
         self.on_generate_success = on_generate_success
 
         self.title("配置生成器")
-        self.geometry("480x480")
+        self.geometry("560x760")
         self.transient(master) # 设置为master窗口的瞬态窗口，会显示在master窗口之上
         self.grab_set() # 独占输入焦点，在关闭此窗口前无法操作主窗口
 
@@ -53,38 +60,139 @@ class ConfigGeneratorWindow(customtkinter.CTkToplevel):
 
         customtkinter.CTkLabel(self, text="传输协议:").grid(row=5, column=0, padx=10, pady=5, sticky="w")
         self.network_var = tk.StringVar(value="tcp")
-        self.network_button = customtkinter.CTkSegmentedButton(self, values=["tcp", "ws"], variable=self.network_var, command=self._update_ws_path_visibility)
+        self.network_button = customtkinter.CTkSegmentedButton(self, values=NETWORKS, variable=self.network_var, command=self._update_transport_visibility)
         self.network_button.grid(row=5, column=1, padx=10, pady=5, sticky="ew")
 
-        # --- WebSocket 路径 (条件显示) ---
+        # --- 传输层参数 (按传输协议条件显示) ---
         self.ws_path_label = customtkinter.CTkLabel(self, text="WebSocket 路径:")
         self.ws_path_entry = customtkinter.CTkEntry(self)
         self.ws_path_entry.insert(0, "/")
 
+        self.grpc_label = customtkinter.CTkLabel(self, text="gRPC 服务名:")
+        self.grpc_frame = customtkinter.CTkFrame(self, fg_color="transparent")
+        self.grpc_frame.grid_columnconfigure(0, weight=1)
+        self.grpc_service_entry = customtkinter.CTkEntry(self.grpc_frame)
+        self.grpc_service_entry.grid(row=0, column=0, sticky="ew")
+        self.grpc_multi_var = tk.BooleanVar()
+        customtkinter.CTkCheckBox(self.grpc_frame, text="multiMode", variable=self.grpc_multi_var).grid(row=0, column=1, padx=(10, 0))
+
+        self.h2_label = customtkinter.CTkLabel(self, text="h2 路径 / Host:")
+        self.h2_frame = customtkinter.CTkFrame(self, fg_color="transparent")
+        self.h2_frame.grid_columnconfigure((0, 1), weight=1)
+        self.h2_path_entry = customtkinter.CTkEntry(self.h2_frame)
+        self.h2_path_entry.grid(row=0, column=0, sticky="ew", padx=(0, 5))
+        self.h2_path_entry.insert(0, "/")
+        self.h2_host_entry = customtkinter.CTkEntry(self.h2_frame, placeholder_text="默认为服务器地址")
+        self.h2_host_entry.grid(row=0, column=1, sticky="ew")
+
+        self.quic_label = customtkinter.CTkLabel(self, text="QUIC 加密/密钥/伪装:")
+        self.quic_frame = customtkinter.CTkFrame(self, fg_color="transparent")
+        self.quic_frame.grid_columnconfigure(1, weight=1)
+        self.quic_security_var = tk.StringVar(value="none")
+        customtkinter.CTkOptionMenu(self.quic_frame, values=QUIC_SECURITIES, variable=self.quic_security_var, width=140).grid(row=0, column=0)
+        self.quic_key_entry = customtkinter.CTkEntry(self.quic_frame, placeholder_text="密钥")
+        self.quic_key_entry.grid(row=0, column=1, sticky="ew", padx=5)
+        self.quic_header_var = tk.StringVar(value="none")
+        customtkinter.CTkOptionMenu(self.quic_frame, values=QUIC_HEADERS, variable=self.quic_header_var, width=120).grid(row=0, column=2)
+
         # --- TLS 设置 ---
         customtkinter.CTkLabel(self, text="TLS:").grid(row=7, column=0, padx=10, pady=5, sticky="w")
         self.tls_var = tk.BooleanVar()
-        self.tls_checkbox = customtkinter.CTkCheckBox(self, text="启用", variable=self.tls_var)
+        self.tls_checkbox = customtkinter.CTkCheckBox(self, text="启用", variable=self.tls_var, command=self._update_tls_visibility)
         self.tls_checkbox.grid(row=7, column=1, padx=10, pady=5, sticky="w")
 
+        self.tls_label = customtkinter.CTkLabel(self, text="ALPN / 指纹:")
+        self.tls_frame = customtkinter.CTkFrame(self, fg_color="transparent")
+        self.tls_frame.grid_columnconfigure(0, weight=1)
+        self.alpn_entry = customtkinter.CTkEntry(self.tls_frame, placeholder_text="例如 h2,http/1.1")
+        self.alpn_entry.grid(row=0, column=0, sticky="ew", padx=(0, 5))
+        self.fingerprint_var = tk.StringVar(value="")
+        customtkinter.CTkOptionMenu(self.tls_frame, values=FINGERPRINTS, variable=self.fingerprint_var, width=120).grid(row=0, column=1)
+        # 握手分析：比较完整/恢复握手和不同ALPN，并把建议的ALPN和Mux设置填入表单
+        self.tls_profile_button = customtkinter.CTkButton(self.tls_frame, text="握手分析", command=self.profile_tls, width=80)
+        self.tls_profile_button.grid(row=0, column=2, padx=(5, 0))
+
+        # --- Mux ---
+        customtkinter.CTkLabel(self, text="Mux 多路复用:").grid(row=9, column=0, padx=10, pady=5, sticky="w")
+        mux_frame = customtkinter.CTkFrame(self, fg_color="transparent")
+        mux_frame.grid(row=9, column=1, padx=10, pady=5, sticky="ew")
+        self.mux_var = tk.BooleanVar()
+        customtkinter.CTkCheckBox(mux_frame, text="启用", variable=self.mux_var).grid(row=0, column=0)
+        customtkinter.CTkLabel(mux_frame, text="并发数:").grid(row=0, column=1, padx=(10, 5))
+        self.mux_concurrency_entry = customtkinter.CTkEntry(mux_frame, width=60)
+        self.mux_concurrency_entry.grid(row=0, column=2)
+        self.mux_concurrency_entry.insert(0, str(DEFAULT_OPTIONS["mux_concurrency"]))
+
+        # --- sockopt ---
+        customtkinter.CTkLabel(self, text="sockopt:").grid(row=10, column=0, padx=10, pady=5, sticky="w")
+        sockopt_frame = customtkinter.CTkFrame(self, fg_color="transparent")
+        sockopt_frame.grid(row=10, column=1, padx=10, pady=5, sticky="ew")
+        self.tcp_fast_open_var = tk.BooleanVar()
+        customtkinter.CTkCheckBox(sockopt_frame, text="TCP Fast Open", variable=self.tcp_fast_open_var).grid(row=0, column=0)
+        self.keepalive_entry = customtkinter.CTkEntry(sockopt_frame, width=70, placeholder_text="保活(秒)")
+        self.keepalive_entry.grid(row=0, column=1, padx=5)
+        self.mark_entry = customtkinter.CTkEntry(sockopt_frame, width=70, placeholder_text="mark")
+        self.mark_entry.grid(row=0, column=2)
+        # 解析策略：可固定IPv4/IPv6，"探测"按钮会测试两个地址族并选择较快的一个
+        self.domain_strategy_var = tk.StringVar(value="默认")
+        customtkinter.CTkOptionMenu(sockopt_frame, values=["默认"] + DOMAIN_STRATEGIES[1:], variable=self.domain_strategy_var, width=100).grid(row=1, column=0, pady=(5, 0), sticky="w")
+        self.probe_family_button = customtkinter.CTkButton(sockopt_frame, text="探测地址族", command=self.probe_address_family, width=90)
+        self.probe_family_button.grid(row=1, column=1, columnspan=2, padx=5, pady=(5, 0), sticky="w")
+
+        # --- policy ---
+        customtkinter.CTkLabel(self, text="策略超时/缓冲:").grid(row=11, column=0, padx=10, pady=5, sticky="w")
+        policy_frame = customtkinter.CTkFrame(self, fg_color="transparent")
+        policy_frame.grid(row=11, column=1, padx=10, pady=5, sticky="ew")
+        self.handshake_entry = customtkinter.CTkEntry(policy_frame, width=90, placeholder_text="握手(秒)")
+        self.handshake_entry.grid(row=0, column=0)
+        self.conn_idle_entry = customtkinter.CTkEntry(policy_frame, width=90, placeholder_text="空闲(秒)")
+        self.conn_idle_entry.grid(row=0, column=1, padx=5)
+        self.buffer_size_entry = customtkinter.CTkEntry(policy_frame, width=90, placeholder_text="缓冲(KB)")
+        self.buffer_size_entry.grid(row=0, column=2)
+
+        # --- 访问日志 ---
+        customtkinter.CTkLabel(self, text="访问日志:").grid(row=12, column=0, padx=10, pady=5, sticky="w")
+        self.access_log_var = tk.BooleanVar()
+        self.access_log_checkbox = customtkinter.CTkCheckBox(self, text="记录到文件（用于访问分析）", variable=self.access_log_var)
+        self.access_log_checkbox.grid(row=12, column=1, padx=10, pady=5, sticky="w")
+
         # --- 按钮 ---
         button_frame = customtkinter.CTkFrame(self, fg_color="transparent")
-        button_frame.grid(row=8, column=0, columnspan=2, pady=20)
+        button_frame.grid(row=13, column=0, columnspan=2, pady=20)
         self.generate_button = customtkinter.CTkButton(button_frame, text="生成", command=self.generate)
         self.generate_button.pack(side=tk.LEFT, padx=10)
+        self.bulk_button = customtkinter.CTkButton(button_frame, text="批量生成...", command=self.bulk_generate)
+        self.bulk_button.pack(side=tk.LEFT, padx=10)
         self.cancel_button = customtkinter.CTkButton(button_frame, text="取消", command=self.destroy)
         self.cancel_button.pack(side=tk.LEFT, padx=10)
 
-        self._update_ws_path_visibility() # 初始化时检查一次是否需要显示ws路径输入框
+        self._update_transport_visibility() # 初始化时根据传输协议显示对应的参数输入框
+        self._update_tls_visibility()
+
+    def _update_transport_visibility(self, value=None):
+        """根据选择的传输协议，动态显示或隐藏对应的参数输入框"""
+        transport_widgets = {
+            "ws": (self.ws_path_label, self.ws_path_entry),
+            "grpc": (self.grpc_label, self.grpc_frame),
+            "h2": (self.h2_label, self.h2_frame),
+            "quic": (self.quic_label, self.quic_frame),
+        }
+        for network, (label, widget) in transport_widgets.items():
+            if network == self.network_var.get():
+                label.grid(row=6, column=0, padx=10, pady=5, sticky="w")
+                widget.grid(row=6, column=1, padx=10, pady=5, sticky="ew")
+            else:
+                label.grid_forget()
+                widget.grid_forget()
 
-    def _update_ws_path_visibility(self, value=None):
-        """根据选择的传输协议，动态显示或隐藏WebSocket路径输入框"""
-        if self.network_var.get() == "ws":
-            self.ws_path_label.grid(row=6, column=0, padx=10, pady=5, sticky="w")
-            self.ws_path_entry.grid(row=6, column=1, padx=10, pady=5, sticky="ew")
+    def _update_tls_visibility(self):
+        """仅在启用TLS时显示ALPN和指纹设置"""
+        if self.tls_var.get():
+            self.tls_label.grid(row=8, column=0, padx=10, pady=5, sticky="w")
+            self.tls_frame.grid(row=8, column=1, padx=10, pady=5, sticky="ew")
         else:
-            self.ws_path_label.grid_forget()
-            self.ws_path_entry.grid_forget()
+            self.tls_label.grid_forget()
+            self.tls_frame.grid_forget()
 
     def generate(self):
         """根据用户输入生成v2ray配置文件"""
@@ -105,6 +213,17 @@ class ConfigGeneratorWindow(customtkinter.CTkToplevel):
             messagebox.showwarning("警告", "端口必须是数字。", parent=self)
             return
 
+        try:
+            options = self._collect_options()
+        except ValueError:
+            messagebox.showwarning("警告", "Mux 并发数、保活间隔、mark 和策略参数必须是整数。", parent=self)
+            return
+
+        problems = validate_options(options)
+        if problems:
+            messagebox.showwarning("警告", "配置选项无效:\n" + "\n".join(problems), parent=self)
+            return
+
         if not filename.lower().endswith('.json'):
             filename += '.json'
 
@@ -119,7 +238,7 @@ class ConfigGeneratorWindow(customtkinter.CTkToplevel):
             messagebox.showwarning("警告", f"文件 {filename} 已存在。", parent=self)
             return
 
-        config = self._build_config(address, port, user_uuid)
+        config = self._build_config(address, port, user_uuid, options)
 
         try:
             # 将配置写入json文件
@@ -133,40 +252,143 @@ class ConfigGeneratorWindow(customtkinter.CTkToplevel):
             self.master.log_message(f"生成配置文件失败: {e}")
             messagebox.showerror("错误", f"生成配置文件失败: {e}", parent=self)
 
-    def _build_config(self, address, port, user_uuid):
-        """构建v2ray配置字典"""
-        config = {
-            "log": {"loglevel": "warning"},
-            "inbounds": [
-                {"port": SOCKS_INBOUND_PORT, "listen": "127.0.0.1", "protocol": "socks", "settings": {"auth": "noauth", "udp": True}},
-                {"port": HTTP_INBOUND_PORT, "listen": "127.0.0.1", "protocol": "http", "settings": {"auth": "noauth"}}
-            ],
-            "outbounds": [
-                {
-                    "protocol": "vmess",
-                    "settings": {
-                        "vnext": [
-                            {"address": address, "port": port, "users": [{"id": user_uuid, "alterId": 0}]}
-                        ]
-                    },
-                    "streamSettings": {"network": self.network_var.get()}
-                },
-                {"protocol": "freedom", "tag": "direct"}
-            ],
-            "routing": {
-                "domainStrategy": "AsIs",
-                "rules": [{"type": "field", "ip": ["geoip:private"], "outboundTag": "direct"}]
-            }
-        }
+    def bulk_generate(self):
+        """从服务器清单（CSV/JSON/YAML）批量生成配置文件，当前界面上的选项作为默认值"""
+        inventory_path = filedialog.askopenfilename(
+            title="选择服务器清单", parent=self,
+            filetypes=[("Inventory", "*.csv *.json *.yaml *.yml"), ("All files", "*.*")])
+        if not inventory_path:
+            return
+        try:
+            options = self._collect_options()
+        except ValueError:
+            messagebox.showwarning("警告", "Mux 并发数、保活间隔、mark 和策略参数必须是整数。", parent=self)
+            return
+        try:
+            file_defaults, rows = load_inventory(inventory_path)
+        except Exception as e:
+            messagebox.showerror("错误", f"读取服务器清单失败: {e}", parent=self)
+            return
+
+        defaults = dict(options, **file_defaults)
+        configs_dir = resource_path('configs')
+        self.bulk_button.configure(state="disabled")
+        self.master.log_message(f"正在批量生成 {len(rows)} 个配置文件...")
 
-        stream_settings = config["outbounds"][0]["streamSettings"]
-        network = self.network_var.get()
+        def worker():
+            report = bulk_generate(rows, configs_dir, defaults)
+            self.master.log_message_from_thread(f"批量生成完成: {format_report(report)}")
+            for name, error in report["failed"]:
+                self.master.log_message_from_thread(f"  生成失败 {name}: {error}")
+            self.after(0, self._on_bulk_done)
 
-        if network == "ws":
-            stream_settings["wsSettings"] = {"path": self.ws_path_entry.get().strip()}
+        threading.Thread(target=worker, daemon=True).start()
 
-        if self.tls_var.get():
-            stream_settings["security"] = "tls"
-            stream_settings["tlsSettings"] = {"serverName": address}
-        
-        return config
+    def _on_bulk_done(self):
+        if self.winfo_exists():
+            self.bulk_button.configure(state="normal")
+
+    def probe_address_family(self):
+        """测试服务器地址的IPv4和IPv6连接延迟，并把解析策略固定为较快的地址族"""
+        address = self.address_entry.get().strip()
+        try:
+            port = int(self.port_entry.get().strip())
+        except ValueError:
+            messagebox.showwarning("警告", "请先填写服务器地址和端口。", parent=self)
+            return
+        if not address:
+            messagebox.showwarning("警告", "请先填写服务器地址和端口。", parent=self)
+            return
+        self.probe_family_button.configure(state="disabled")
+
+        def worker():
+            try:
+                result = probe_families(address, port, timeout=5)
+                message = format_family_report(result)
+            except OSError as e:
+                result, message = None, f"无法解析 {address}: {e}"
+            self.after(0, self._on_family_probed, result, message)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _on_family_probed(self, result, message):
+        if not self.winfo_exists():
+            return
+        self.probe_family_button.configure(state="normal")
+        self.master.log_message(f"地址族探测: {message}")
+        if result and result["preferred"] and len(result["families"]) > 1:
+            self.domain_strategy_var.set(FAMILY_DOMAIN_STRATEGIES[result["preferred"]])
+        elif result and result["families"]:
+            self.master.log_message("服务器只有一个可用的地址族，解析策略保持不变。")
+
+    def profile_tls(self):
+        """对服务器重复进行TLS握手，比较会话恢复和各ALPN的握手耗时，并应用建议的设置"""
+        address = self.address_entry.get().strip()
+        try:
+            port = int(self.port_entry.get().strip())
+        except ValueError:
+            port = None
+        if not address or not port:
+            messagebox.showwarning("警告", "请先填写服务器地址和端口。", parent=self)
+            return
+        alpn = [value.strip() for value in self.alpn_entry.get().split(",") if value.strip()]
+        target = {"address": address, "port": port, "server_name": address,
+                  "network": self.network_var.get(), "alpn": alpn or None}
+        self.tls_profile_button.configure(state="disabled")
+        self.master.log_message(f"正在分析 {address}:{port} 的TLS握手...")
+
+        def worker():
+            profile = profile_server(target, repeats=5, timeout=10)
+            self.after(0, self._on_tls_profiled, profile)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _on_tls_profiled(self, profile):
+        if not self.winfo_exists():
+            return
+        self.tls_profile_button.configure(state="normal")
+        self.master.log_message(f"TLS握手分析:\n{format_profile(profile)}")
+        options = profile["options"]
+        if "alpn" in options:
+            self.alpn_entry.delete(0, "end")
+            self.alpn_entry.insert(0, ",".join(options["alpn"]))
+        if options.get("mux"):
+            self.mux_var.set(True)
+
+    def _collect_options(self):
+        """从界面收集生成器选项；数字字段无法解析时抛出ValueError"""
+        def optional_int(entry):
+            text = entry.get().strip()
+            return int(text) if text else None
+
+        return {
+            "network": self.network_var.get(),
+            "ws_path": self.ws_path_entry.get().strip(),
+            "grpc_service_name": self.grpc_service_entry.get().strip(),
+            "grpc_multi_mode": self.grpc_multi_var.get(),
+            "h2_path": self.h2_path_entry.get().strip(),
+            "h2_host": self.h2_host_entry.get().strip(),
+            "quic_security": self.quic_security_var.get(),
+            "quic_key": self.quic_key_entry.get().strip(),
+            "quic_header": self.quic_header_var.get(),
+            "tls": self.tls_var.get(),
+            "alpn": [value.strip() for value in self.alpn_entry.get().split(",") if value.strip()],
+            "fingerprint": self.fingerprint_var.get(),
+            "mux": self.mux_var.get(),
+            "mux_concurrency": int(self.mux_concurrency_entry.get().strip() or DEFAULT_OPTIONS["mux_concurrency"]),
+            "tcp_fast_open": self.tcp_fast_open_var.get(),
+            "tcp_keepalive_interval": optional_int(self.keepalive_entry) or 0,
+            "mark": optional_int(self.mark_entry) or 0,
+            "domain_strategy": "" if self.domain_strategy_var.get() == "默认" else self.domain_strategy_var.get(),
+            "handshake_timeout": optional_int(self.handshake_entry),
+            "conn_idle_timeout": optional_int(self.conn_idle_entry),
+            "buffer_size": optional_int(self.buffer_size_entry),
+            # 访问日志写入数据目录，供访问分析窗口增量读取
+            "access_log": get_persistent_data_path(ACCESS_LOG_FILE) if self.access_log_var.get() else None,
+        }
+
+    def _build_config(self, address, port, user_uuid, options=None):
+        """构建v2ray配置字典"""
+        if options is None:
+            options = self._collect_options()
+        return build_config(address, port, user_uuid, options)
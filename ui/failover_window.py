@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import tkinter as tk
+from tkinter import filedialog, messagebox
+import customtkinter
+
+from core.settings import save_app_settings
+
+class FailoverSettingsWindow(customtkinter.CTkToplevel):
+    """
+    故障切换设置窗口。
+    按优先级编辑服务器配置列表，并设置健康检查间隔、失败阈值和最短停留时间。
+    """
+    def __init__(self, master):
+        super().__init__(master)
+        self.master = master
+
+        self.title("故障切换设置")
+        self.geometry("560x460")
+        self.transient(master)
+        self.grab_set()
+
+        self.grid_columnconfigure(1, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        settings = self.master.settings
+        self.enabled_var = tk.BooleanVar(value=settings.get("failover_enabled", False))
+        customtkinter.CTkCheckBox(self, text="启用自动故障切换", variable=self.enabled_var).grid(row=0, column=0, columnspan=2, padx=10, pady=10, sticky="w")
+
+        customtkinter.CTkLabel(self, text="服务器列表\n(每行一个，\n越靠前越优先):", justify="left").grid(row=1, column=0, padx=10, pady=5, sticky="nw")
+        self.servers_text = customtkinter.CTkTextbox(self, wrap="none")
+        self.servers_text.grid(row=1, column=1, padx=10, pady=5, sticky="nsew")
+        self.servers_text.insert("end", "\n".join(settings.get("failover_servers", [])))
+
+        list_buttons = customtkinter.CTkFrame(self, fg_color="transparent")
+        list_buttons.grid(row=2, column=1, padx=10, sticky="w")
+        customtkinter.CTkButton(list_buttons, text="添加当前配置", command=self.add_current_config, width=110).pack(side=tk.LEFT)
+        customtkinter.CTkButton(list_buttons, text="添加文件...", command=self.add_config_files, width=110).pack(side=tk.LEFT, padx=5)
+
+        self.entries = {}
+        for row, (key, label) in enumerate((("failover_interval", "检查间隔(秒):"),
+                                            ("failover_threshold", "连续失败次数:"),
+                                            ("failover_min_dwell", "最短停留(秒):")), start=3):
+            customtkinter.CTkLabel(self, text=label).grid(row=row, column=0, padx=10, pady=5, sticky="w")
+            entry = customtkinter.CTkEntry(self, width=100)
+            entry.grid(row=row, column=1, padx=10, pady=5, sticky="w")
+            entry.insert(0, str(settings.get(key)))
+            self.entries[key] = entry
+
+        button_frame = customtkinter.CTkFrame(self, fg_color="transparent")
+        button_frame.grid(row=6, column=0, columnspan=2, pady=15)
+        customtkinter.CTkButton(button_frame, text="保存", command=self.save).pack(side=tk.LEFT, padx=10)
+        customtkinter.CTkButton(button_frame, text="取消", command=self.destroy).pack(side=tk.LEFT, padx=10)
+
+    def _append_paths(self, paths):
+        existing = self.servers_text.get("1.0", "end-1c").strip()
+        lines = [line for line in existing.splitlines() if line.strip()]
+        lines.extend(path for path in paths if path not in lines)
+        self.servers_text.delete("1.0", "end")
+        self.servers_text.insert("end", "\n".join(lines))
+
+    def add_current_config(self):
+        if self.master.current_config_path:
+            self._append_paths([self.master.current_config_path])
+
+    def add_config_files(self):
+        paths = filedialog.askopenfilenames(title="选择配置文件", parent=self, filetypes=[("JSON files", "*.json"), ("All files", "*.*")])
+        self._append_paths(paths)
+
+    def save(self):
+        """保存设置，并在V2ray运行时重新启动故障切换控制器"""
+        try:
+            values = {key: float(entry.get().strip()) for key, entry in self.entries.items()}
+        except ValueError:
+            messagebox.showwarning("警告", "间隔、次数和停留时间必须是数字。", parent=self)
+            return
+        if values["failover_interval"] <= 0 or values["failover_threshold"] < 1:
+            messagebox.showwarning("警告", "检查间隔必须大于0，失败次数至少为1。", parent=self)
+            return
+
+        servers = [line.strip() for line in self.servers_text.get("1.0", "end-1c").splitlines() if line.strip()]
+        settings = self.master.settings
+        settings["failover_enabled"] = self.enabled_var.get()
+        settings["failover_servers"] = servers
+        settings["failover_interval"] = values["failover_interval"]
+        settings["failover_threshold"] = int(values["failover_threshold"])
+        settings["failover_min_dwell"] = values["failover_min_dwell"]
+        save_app_settings(settings)
+        self.master.log_message("故障切换设置已保存。")
+        self.master.restart_failover()
+        self.destroy()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+import tkinter as tk
+import threading
+import ipaddress
+import customtkinter
+
+from core.geodata import open_geodata
+
+MAX_DISPLAY_ITEMS = 5000
+
+class GeoDataWindow(customtkinter.CTkToplevel):
+    """
+    geoip/geosite 数据浏览窗口。
+    列出分类、展开某个分类的条目，并查询某个域名或IP属于哪些分类。
+    """
+    def __init__(self, master):
+        super().__init__(master)
+        self.master = master
+        self.categories = []
+
+        self.title("geoip / geosite 数据")
+        self.geometry("760x540")
+        self.transient(master)
+
+        self.grid_columnconfigure(1, weight=1)
+        self.grid_rowconfigure(2, weight=1)
+
+        self.kind_var = tk.StringVar(value="geosite")
+        customtkinter.CTkSegmentedButton(self, values=["geosite", "geoip"], variable=self.kind_var,
+                                         command=lambda value: self.load_categories()).grid(row=0, column=0, padx=10, pady=(10, 5), sticky="w")
+
+        lookup_frame = customtkinter.CTkFrame(self, fg_color="transparent")
+        lookup_frame.grid(row=0, column=1, padx=10, pady=(10, 5), sticky="ew")
+        lookup_frame.grid_columnconfigure(0, weight=1)
+        self.lookup_entry = customtkinter.CTkEntry(lookup_frame, placeholder_text="输入域名或IP，查询所属分类")
+        self.lookup_entry.grid(row=0, column=0, sticky="ew")
+        self.lookup_entry.bind("<Return>", lambda event: self.lookup())
+        customtkinter.CTkButton(lookup_frame, text="查询", command=self.lookup, width=60).grid(row=0, column=1, padx=(5, 0))
+
+        self.filter_entry = customtkinter.CTkEntry(self, placeholder_text="筛选分类...")
+        self.filter_entry.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
+        self.filter_entry.bind("<KeyRelease>", lambda event: self._show_categories())
+
+        self.category_list = tk.Listbox(self, activestyle="none", exportselection=False, width=28)
+        self.category_list.grid(row=2, column=0, padx=10, pady=(0, 10), sticky="nsew")
+        self.category_list.bind("<<ListboxSelect>>", lambda event: self.expand_selected())
+
+        self.detail_text = customtkinter.CTkTextbox(self, wrap="none")
+        self.detail_text.grid(row=1, column=1, rowspan=2, padx=10, pady=(5, 10), sticky="nsew")
+
+        self.load_categories()
+
+    def _geodata(self):
+        geodata = open_geodata(self.kind_var.get())
+        if geodata is None:
+            self._show_text(f"找不到 {self.kind_var.get()}.dat，请确认它与核心程序放在同一目录。")
+        return geodata
+
+    def _show_text(self, text):
+        self.detail_text.delete("1.0", "end")
+        self.detail_text.insert("end", text)
+
+    def load_categories(self):
+        geodata = self._geodata()
+        self.categories = geodata.categories() if geodata else []
+        self._show_categories()
+
+    def _show_categories(self):
+        query = self.filter_entry.get().strip().lower()
+        self.category_list.delete(0, "end")
+        for category in self.categories:
+            if query in category:
+                self.category_list.insert("end", category)
+
+    def expand_selected(self):
+        """展开选中的分类（只解码这一条记录）"""
+        selection = self.category_list.curselection()
+        geodata = self._geodata()
+        if not selection or not geodata:
+            return
+        category = self.category_list.get(selection[0])
+        items = geodata.expand(category)
+        if geodata.kind == "geoip":
+            lines = items[:MAX_DISPLAY_ITEMS]
+        else:
+            lines = [f"{kind}:{value}" + (f"  @{','.join(attrs)}" if attrs else "") for kind, value, attrs in items[:MAX_DISPLAY_ITEMS]]
+        header = f"{geodata.kind}:{category} 共 {len(items)} 条" + (f"（仅显示前 {MAX_DISPLAY_ITEMS} 条）" if len(items) > MAX_DISPLAY_ITEMS else "")
+        self._show_text(header + "\n\n" + "\n".join(lines))
+
+    def lookup(self):
+        """查询域名或IP所属的分类；首次查询会在后台建立索引"""
+        query = self.lookup_entry.get().strip()
+        if not query:
+            return
+        try:
+            ipaddress.ip_address(query)
+            kind = "geoip"
+        except ValueError:
+            kind = "geosite"
+        geodata = open_geodata(kind)
+        if geodata is None:
+            self._show_text(f"找不到 {kind}.dat。")
+            return
+        self._show_text("正在查询（首次查询需要建立索引）...")
+
+        def worker():
+            try:
+                matches = geodata.match_ip(query) if kind == "geoip" else geodata.match_domain(query)
+                lines = [f"{kind}:{category}    ({rule})" for category, rule in matches] or ["没有匹配的分类。"]
+                text = f"{query} 匹配的分类:\n\n" + "\n".join(lines)
+            except Exception as e:
+                text = f"查询失败: {e}"
+            self.after(0, self._show_text, text)
+
+        threading.Thread(target=worker, daemon=True).start()
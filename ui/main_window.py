@@ -5,6 +5,7 @@ from tkinter import filedialog, messagebox
 import json
 import os
 import threading
+import subprocess
 import sys
 import time
 import urllib.request
@@ -18,15 +19,33 @@ from pynput import keyboard
 from PIL import Image, ImageDraw, ImageFont
 
 from icon_data import get_icon_base64
-from core.constants import V2RAY_CORE_PATH, HTTP_INBOUND_PORT, DEFAULT_CONFIG_PATH
+from core.constants import V2RAY_CORE_PATH, HTTP_INBOUND_PORT, DEFAULT_CONFIG_PATH, CORE_LOG_LEVELS, ACCESS_LOG_FILE
 from core.settings import load_app_settings, save_app_settings, get_persistent_data_path
 from core.utils import resource_path
 from core.startup import set_startup
 from core.v2ray_manager import V2rayManager
 from core.proxy_manager import ProxyManager
+from core.failover import FailoverController
+from core.preflight import PreflightValidator, list_config_files
+from core.benchmark import expand_matrix, run_benchmark, format_table
+from core.loadgen import run_load, format_load_report
+from core.udp_test import run_udp_test, format_udp_report
+from core.probe import probe_families, format_family_report, FAMILY_DOMAIN_STRATEGIES
+from core.resource_limits import format_applied_limits
+from core.backends import BACKENDS, DEFAULT_BACKEND, BackendProber
+from core.templates import resolve_config, is_overlay, load_config, TemplateError
+from core.routing_advisor import advise_with_config, build_rules, apply_rules_to_file, top_domains_from_log, format_advice
+from core.subscriptions import SubscriptionRefresher, SUBSCRIPTION_DIR
 
 from ui.config_generator import ConfigGeneratorWindow
 from ui.hotkey_settings import HotkeySettingsWindow
+from ui.access_log_window import AccessLogWindow
+from ui.failover_window import FailoverSettingsWindow
+from ui.server_list import ServerListPanel
+from ui.profiler import EventLoopMonitor, UIProfiler, ProfilerWindow
+from ui.geodata_window import GeoDataWindow
+from ui.resource_limits_window import ResourceLimitsWindow
+from ui.subscriptions_window import SubscriptionsWindow
 
 class V2rayClientApp(customtkinter.CTk):
     """
@@ -38,23 +57,35 @@ class V2rayClientApp(customtkinter.CTk):
         self.current_config_path = ""
         self.generator_window = None # 用于持有配置生成器窗口的引用
         self.hotkey_window = None # 用于持有快捷键设置窗口的引用
+        self.tool_windows = {} # 工具菜单打开的窗口，按名称持有引用
+        self.failover = None # 故障切换控制器，仅在V2ray运行且启用时存在
+        self.subscription_refresher = None # 订阅定时刷新器，仅在启用自动刷新时存在
+        self.lag_monitor = None # 事件循环延迟监视器（界面性能分析）
+        self.ui_profiler = UIProfiler()
 
         self.title("V2fly 客户端")
-        self.geometry("800x600")
+        self.geometry("1080x640")
 
         # 设置UI主题
         customtkinter.set_appearance_mode("System")
         customtkinter.set_default_color_theme("blue")
         
+        # 加载应用设置
+        self.settings = load_app_settings()
+
         # 初始化V2Ray管理器
-        self.v2ray_manager = V2rayManager(self.log_message_from_thread)
+        self.v2ray_manager = V2rayManager(self.log_message_from_thread,
+                                          log_threshold=self.settings.get("core_log_threshold", "info"),
+                                          log_sample_every=self.settings.get("core_log_sample_every", 0),
+                                          launch_limits=self.settings.get("core_limits", {}),
+                                          backend=self.settings.get("core_backend", DEFAULT_BACKEND),
+                                          executable=self.settings.get("core_paths", {}).get(self.settings.get("core_backend")),
+                                          ready_timeout=self.settings.get("core_ready_timeout", 15),
+                                          ready_marker=self.settings.get("core_ready_marker", True))
 
         # 初始化代理管理器
         self.proxy_manager = ProxyManager(self.log_message_from_thread)
 
-        # 加载应用设置
-        self.settings = load_app_settings()
-
         self.create_widgets() # 创建UI组件
         self._setup_tray_icon() # 设置系统托盘图标
 
@@ -83,6 +114,8 @@ class V2rayClientApp(customtkinter.CTk):
         if self.settings.get("auto_start_v2ray") and self.current_config_path:
             self.start_v2ray()
 
+        self.restart_subscriptions()
+
         # 在一个单独的线程中运行托盘图标，防止UI阻塞
         if self.icon:
             threading.Thread(target=self.icon.run, daemon=True).start()
@@ -91,6 +124,9 @@ class V2rayClientApp(customtkinter.CTk):
         self.hotkey_listener = None
         self.setup_hotkeys()
 
+        if self.settings.get("ui_lag_monitor"):
+            self.set_lag_monitor(True)
+
     def create_widgets(self):
         """创建主窗口的所有UI组件"""
         self.grid_columnconfigure(0, weight=1)
@@ -99,6 +135,10 @@ class V2rayClientApp(customtkinter.CTk):
         self._create_top_frame()
         self._create_log_and_editor_frames()
 
+        # 状态栏：运行状态和实际生效的资源限制
+        self.status_label = customtkinter.CTkLabel(self, text="核心未运行", anchor="w")
+        self.status_label.grid(row=2, column=0, sticky="ew", padx=15, pady=(0, 5))
+
     def _create_top_frame(self):
         """创建包含所有控制和设置的顶部框架"""
         top_frame = customtkinter.CTkFrame(self)
@@ -136,9 +176,27 @@ class V2rayClientApp(customtkinter.CTk):
         self.test_speed_button = customtkinter.CTkButton(main_actions_frame, text="测试速度", command=self.test_speed, state="disabled")
         self.test_speed_button.grid(row=0, column=3, padx=5)
 
-        main_actions_frame.grid_columnconfigure(4, weight=1)
+        # 工具菜单：名称 -> 处理函数
+        self.tools = {
+            "访问日志分析": lambda: self.open_tool_window("access_log", AccessLogWindow),
+            "传输对比测试": self.run_transport_benchmark,
+            "故障切换设置": lambda: self.open_tool_window("failover", FailoverSettingsWindow),
+            "校验全部配置": self.validate_all_configs,
+            "连接压测": self.run_connection_load_test,
+            "界面性能分析": lambda: self.open_tool_window("profiler", ProfilerWindow),
+            "UDP 测试": self.run_udp_path_test,
+            "geoip/geosite 数据": lambda: self.open_tool_window("geodata", GeoDataWindow),
+            "核心资源限制": lambda: self.open_tool_window("resource_limits", ResourceLimitsWindow),
+            "订阅管理": lambda: self.open_tool_window("subscriptions", SubscriptionsWindow),
+            "路由建议": self.run_routing_advisor,
+        }
+        self.tools_menu = customtkinter.CTkOptionMenu(main_actions_frame, values=list(self.tools), command=self.run_tool, width=110)
+        self.tools_menu.set("工具")
+        self.tools_menu.grid(row=0, column=4, padx=5)
+
+        main_actions_frame.grid_columnconfigure(5, weight=1)
         self.minimize_button = customtkinter.CTkButton(main_actions_frame, text="最小化到托盘", command=self._hide_window)
-        self.minimize_button.grid(row=0, column=5, sticky="e")
+        self.minimize_button.grid(row=0, column=6, sticky="e")
 
         # --- Row 2: Settings ---
         settings_container = customtkinter.CTkFrame(top_frame)
@@ -154,6 +212,12 @@ class V2rayClientApp(customtkinter.CTk):
         self.run_on_startup_check.grid(row=1, column=0, sticky="w")
         self.auto_start_v2ray_check = customtkinter.CTkCheckBox(app_settings_frame, text="自动启动v2ray", command=self.toggle_auto_start_v2ray)
         self.auto_start_v2ray_check.grid(row=2, column=0, sticky="w", pady=(5,0))
+        core_backend_frame = customtkinter.CTkFrame(app_settings_frame, fg_color="transparent")
+        core_backend_frame.grid(row=3, column=0, sticky="w", pady=(5,0))
+        customtkinter.CTkLabel(core_backend_frame, text="核心:").pack(side=tk.LEFT, padx=(0,5))
+        self.core_backend_var = tk.StringVar(value=self.v2ray_manager.backend.name)
+        self.core_backend_menu = customtkinter.CTkOptionMenu(core_backend_frame, values=list(BACKENDS), variable=self.core_backend_var, command=self.change_core_backend, width=100)
+        self.core_backend_menu.pack(side=tk.LEFT)
 
         # Proxy Settings
         proxy_frame = customtkinter.CTkFrame(settings_container, fg_color="transparent")
@@ -185,17 +249,29 @@ class V2rayClientApp(customtkinter.CTk):
         self.toggle_proxy_fields()
 
     def _create_log_and_editor_frames(self):
-        """创建可调整大小的日志和编辑器区域"""
-        paned_window = tk.PanedWindow(self, orient=tk.VERTICAL, sashrelief=tk.RAISED, bg="gray")
-        paned_window.grid(row=1, column=0, sticky="nsew", padx=10, pady=(0, 10))
+        """创建可调整大小的服务器列表、日志和编辑器区域"""
+        outer_paned = tk.PanedWindow(self, orient=tk.HORIZONTAL, sashrelief=tk.RAISED, bg="gray")
+        outer_paned.grid(row=1, column=0, sticky="nsew", padx=10, pady=(0, 10))
+
+        # Server list (virtualized)
+        self.server_list = ServerListPanel(outer_paned, self, on_activate=self.activate_server_entry)
+        outer_paned.add(self.server_list, width=280)
+        self.server_list.load_directory(resource_path('configs'))
+
+        paned_window = tk.PanedWindow(outer_paned, orient=tk.VERTICAL, sashrelief=tk.RAISED, bg="gray")
+        outer_paned.add(paned_window)
 
         # Log frame
         log_frame = customtkinter.CTkFrame(paned_window, corner_radius=0)
         log_frame.grid_columnconfigure(0, weight=1)
         log_frame.grid_rowconfigure(1, weight=1)
         customtkinter.CTkLabel(log_frame, text="日志输出:").grid(row=0, column=0, sticky="w", padx=10, pady=(10, 0))
+        # 核心日志转发级别，可在运行时调整
+        self.log_level_var = tk.StringVar(value=self.settings.get("core_log_threshold", "info"))
+        self.log_level_menu = customtkinter.CTkOptionMenu(log_frame, values=list(CORE_LOG_LEVELS), variable=self.log_level_var, command=self.change_log_threshold, width=100)
+        self.log_level_menu.grid(row=0, column=1, sticky="e", padx=10, pady=(10, 0))
         self.log_text = customtkinter.CTkTextbox(log_frame, wrap="word")
-        self.log_text.grid(row=1, column=0, sticky="nsew", padx=10, pady=5)
+        self.log_text.grid(row=1, column=0, columnspan=2, sticky="nsew", padx=10, pady=5)
         self.log_text.configure(state="disabled")
         paned_window.add(log_frame, height=150) # Initial height
 
@@ -211,6 +287,8 @@ class V2rayClientApp(customtkinter.CTk):
         customtkinter.CTkLabel(editor_label_frame, text="配置文件内容 (可编辑):").grid(row=0, column=0, sticky="w")
         self.save_config_button = customtkinter.CTkButton(editor_label_frame, text="保存更改", command=self.save_config_file)
         self.save_config_button.grid(row=0, column=1)
+        self.show_merged_button = customtkinter.CTkButton(editor_label_frame, text="查看合并结果", command=self.show_merged_config)
+        self.show_merged_button.grid(row=0, column=2, padx=(5, 0))
 
         self.config_editor = customtkinter.CTkTextbox(editor_frame, wrap="word")
         self.config_editor.grid(row=1, column=0, sticky="nsew", padx=10, pady=5)
@@ -224,6 +302,34 @@ class V2rayClientApp(customtkinter.CTk):
         self.log_text.see("end") # 滚动到末尾
         self.log_text.configure(state="disabled") # 恢复为不可编辑
 
+    def change_log_threshold(self, level):
+        """修改核心日志的转发级别，低于该级别的日志将被丢弃"""
+        self.v2ray_manager.set_log_threshold(level)
+        self.settings["core_log_threshold"] = level
+        save_app_settings(self.settings)
+        self.log_message(f"核心日志级别已设置为: {level}")
+
+    def change_core_backend(self, name):
+        """切换核心类型（v2ray/Xray/sing-box），在下次启动时生效"""
+        if self.v2ray_manager.is_running():
+            messagebox.showinfo("信息", "请先停止正在运行的核心，再切换核心类型。")
+            self.core_backend_var.set(self.v2ray_manager.backend.name)
+            return
+        self.v2ray_manager.set_backend(name, self.settings.get("core_paths", {}).get(name))
+        self.settings["core_backend"] = name
+        save_app_settings(self.settings)
+        self.log_message(f"核心已切换为: {self.v2ray_manager.backend.display_name}")
+        threading.Thread(target=self._probe_core_backend, args=(self.v2ray_manager.backend, self.v2ray_manager.v2ray_executable), daemon=True).start()
+
+    def _probe_core_backend(self, backend, executable):
+        """在后台线程中探测核心版本和支持的传输协议（按二进制哈希缓存）"""
+        try:
+            probe = BackendProber().probe(backend, executable)
+        except (OSError, subprocess.SubprocessError) as e:
+            self.log_message_from_thread(f"无法探测 {backend.display_name} 核心: {e}")
+            return
+        self.log_message_from_thread(f"{backend.display_name} 版本 {probe['version'] or '未知'}，支持的传输: {', '.join(probe['networks']) or '无'}")
+
     def select_config_file(self):
         """弹出文件选择对话框，让用户选择一个配置文件"""
         file_path = filedialog.askopenfilename(title="选择 v2ray 配置文件", filetypes=[("JSON files", "*.json"), ("All files", "*.*")])
@@ -254,6 +360,28 @@ class V2rayClientApp(customtkinter.CTk):
         else:
             self.hotkey_window.focus()
 
+    def run_tool(self, name):
+        """执行工具菜单中选择的项目"""
+        self.tools_menu.set("工具")
+        self.tools[name]()
+
+    def open_tool_window(self, key, window_class, *args):
+        """打开一个工具窗口；如果已经打开，则将其带到前台"""
+        window = self.tool_windows.get(key)
+        if window is None or not window.winfo_exists():
+            self.tool_windows[key] = window_class(self, *args)
+        else:
+            window.focus()
+
+    def set_lag_monitor(self, enabled):
+        """启用或停止Tk事件循环延迟监视"""
+        if enabled:
+            if not self.lag_monitor:
+                self.lag_monitor = EventLoopMonitor(self)
+            self.lag_monitor.start()
+        elif self.lag_monitor:
+            self.lag_monitor.stop()
+
     def save_config_file(self):
         """保存对配置文件的修改"""
         if not self.current_config_path:
@@ -262,7 +390,9 @@ class V2rayClientApp(customtkinter.CTk):
 
         content = self.config_editor.get("1.0", "end-1c") # 获取编辑器中的所有文本
         try:
-            json.loads(content) # 校验是否为有效的JSON
+            config = json.loads(content) # 校验是否为有效的JSON
+            if is_overlay(config):
+                resolve_config(config, self.current_config_path) # 校验模板引用
             with open(self.current_config_path, 'w', encoding='utf-8') as f:
                 f.write(content)
             self.log_message(f"配置文件已成功保存到: {self.current_config_path}")
@@ -270,6 +400,9 @@ class V2rayClientApp(customtkinter.CTk):
         except json.JSONDecodeError:
             self.log_message("保存失败: 配置文件内容不是有效的JSON格式。" )
             messagebox.showerror("错误", "保存失败: 配置文件内容不是有效的JSON格式。" )
+        except TemplateError as e:
+            self.log_message(f"保存失败: {e}")
+            messagebox.showerror("错误", f"保存失败: 模板无效 - {e}")
         except Exception as e:
             self.log_message(f"保存配置文件失败: {e}")
             messagebox.showerror("错误", f"保存配置文件失败: {e}")
@@ -289,6 +422,25 @@ class V2rayClientApp(customtkinter.CTk):
             self.config_editor.delete("1.0", "end")
             self.config_editor.insert("end", f"无法加载配置文件: {e}")
 
+    def show_merged_config(self):
+        """对模板叠加文件，显示与模板合并后的完整配置（只读）"""
+        try:
+            config = json.loads(self.config_editor.get("1.0", "end-1c"))
+            if not is_overlay(config):
+                self.log_message("当前配置不是模板叠加文件，无需合并。")
+                return
+            merged = resolve_config(config, self.current_config_path or resource_path(DEFAULT_CONFIG_PATH))[0]
+        except (json.JSONDecodeError, TemplateError) as e:
+            messagebox.showerror("错误", f"无法合并配置: {e}")
+            return
+        window = customtkinter.CTkToplevel(self)
+        window.title(f"合并结果 - {os.path.basename(self.current_config_path or '')}")
+        window.geometry("600x500")
+        textbox = customtkinter.CTkTextbox(window, wrap="none")
+        textbox.pack(fill="both", expand=True, padx=10, pady=10)
+        textbox.insert("end", json.dumps(merged, indent=2, ensure_ascii=False))
+        textbox.configure(state="disabled")
+
     def load_default_config(self):
         """加载默认的配置文件"""
         default_config_path = resource_path(DEFAULT_CONFIG_PATH)
@@ -304,6 +456,17 @@ class V2rayClientApp(customtkinter.CTk):
             self.start_button.configure(state="disabled")
             self.test_latency_button.configure(state="disabled")
 
+    def activate_server_entry(self, entry):
+        """在服务器列表中双击某个服务器时，将其设为当前配置"""
+        self.current_config_path = entry.path
+        self.config_path_label.configure(text=self.current_config_path)
+        self.log_message(f"已选择服务器: {entry.name} ({entry.address}:{entry.port})")
+        self.load_config_to_editor(self.current_config_path)
+        self.save_last_config_path(self.current_config_path)
+        self.start_button.configure(state="normal" if not self.v2ray_manager.is_running() else "disabled")
+        if not self.v2ray_manager.is_running():
+            self.test_latency_button.configure(state="normal")
+
     def handle_config_generated(self, new_filepath):
         """Callback function for when a new config is generated."""
         self.log_message(f"成功生成配置文件: {new_filepath}")
@@ -313,6 +476,7 @@ class V2rayClientApp(customtkinter.CTk):
         self.save_last_config_path(self.current_config_path)
         self.start_button.configure(state="normal")
         self.test_latency_button.configure(state="normal")
+        self.server_list.load_directory(resource_path('configs'))
 
     def log_message_from_thread(self, message):
         """从后台线程安全地记录消息到UI"""
@@ -329,12 +493,11 @@ class V2rayClientApp(customtkinter.CTk):
 
         # 将UI更新回调传递给管理器
         on_exit_callback = lambda: self.after(0, self._on_v2ray_stopped)
-        
-        if self.v2ray_manager.start(self.current_config_path, on_exit_callback):
-            self.start_button.configure(state="disabled")
-            self.stop_button.configure(state="normal")
-            self.test_latency_button.configure(state="disabled") # 启动时禁用延迟测试
-            self.test_speed_button.configure(state="normal")
+        on_ready_callback = lambda result: self.after(0, self._on_v2ray_ready, result)
+
+        if self.v2ray_manager.start(self.current_config_path, on_exit_callback, on_ready_callback):
+            self._set_running_buttons()
+            self.restart_failover()
         else:
             # 如果启动失败，确保UI状态正确
             self._on_v2ray_stopped()
@@ -345,12 +508,117 @@ class V2rayClientApp(customtkinter.CTk):
             self.log_message("V2ray 未运行")
             self._on_v2ray_stopped() # 确保UI状态一致
             return
-        
+
+        self.stop_failover()
         self.v2ray_manager.stop()
         # on_exit_callback 将在进程真正退出后更新UI
 
+    def _set_running_buttons(self):
+        """V2ray运行时的按钮状态"""
+        self.start_button.configure(state="disabled")
+        self.stop_button.configure(state="normal")
+        self.test_latency_button.configure(state="disabled") # 启动时禁用延迟测试
+        self.test_speed_button.configure(state="normal")
+        self.status_label.configure(text="核心启动中，等待入站端口就绪...")
+
+    def _on_v2ray_ready(self, result):
+        """核心入站端口就绪（或等待超时）后，再启用系统代理，避免流量被发往尚未监听的端口"""
+        if result["ready"] and self.proxy_enable_check.get():
+            self.apply_system_proxy()
+        elif not result["ready"] and self.proxy_enable_check.get():
+            self.log_message("核心未能就绪，暂不设置系统代理。")
+        self.refresh_status()
+
+    def refresh_status(self):
+        """更新状态栏中的运行状态和实际生效的资源限制"""
+        if not self.v2ray_manager.is_running():
+            self.status_label.configure(text="核心未运行")
+            return
+        text = f"核心运行中 (PID {self.v2ray_manager.v2ray_process.pid})"
+        startup = self.v2ray_manager.last_startup
+        if not self.v2ray_manager.is_ready():
+            text += " | 未就绪"
+        elif startup and startup.get("ready_ms") is not None:
+            text += f" | 启动耗时 {startup['ready_ms']:.0f} ms"
+        limits = format_applied_limits(self.v2ray_manager.applied_limits)
+        if limits:
+            text += f" | 资源限制: {limits}"
+        self.status_label.configure(text=text)
+
+    def restart_failover(self):
+        """根据设置（重新）启动故障切换控制器"""
+        self.stop_failover()
+        servers = self.settings.get("failover_servers", [])
+        if not self.settings.get("failover_enabled") or not servers or not self.current_config_path:
+            return
+        self.failover = FailoverController(
+            self.v2ray_manager, servers, self.log_message_from_thread,
+            interval=self.settings.get("failover_interval", 10),
+            failure_threshold=self.settings.get("failover_threshold", 3),
+            min_dwell=self.settings.get("failover_min_dwell", 60),
+            on_exit_callback=lambda: self.after(0, self._on_v2ray_stopped),
+            on_switch=lambda path: self.after(0, self._on_failover_switch, path))
+        self.failover.start(self.current_config_path)
+
+    def stop_failover(self):
+        """停止故障切换控制器"""
+        if self.failover:
+            self.failover.stop()
+            self.failover = None
+
+    def _create_subscription_refresher(self):
+        return SubscriptionRefresher(
+            self.settings.get("subscriptions", []), self.log_message_from_thread,
+            os.path.join(resource_path('configs'), SUBSCRIPTION_DIR),
+            interval=self.settings.get("subscription_interval", 3600),
+            on_change=lambda results: self.after(0, self.server_list.load_directory, resource_path('configs')))
+
+    def restart_subscriptions(self):
+        """根据设置（重新）启动订阅定时刷新"""
+        if self.subscription_refresher:
+            self.subscription_refresher.stop()
+            self.subscription_refresher = None
+        if not self.settings.get("subscription_auto_refresh") or not self.settings.get("subscriptions"):
+            return
+        self.subscription_refresher = self._create_subscription_refresher()
+        self.subscription_refresher.start()
+
+    def refresh_subscriptions_now(self):
+        """在后台立即刷新全部订阅（忽略刷新间隔和失败退避）"""
+        if not self.settings.get("subscriptions"):
+            self.log_message("没有订阅可刷新。")
+            return
+        refresher = self._create_subscription_refresher()
+
+        def worker():
+            # 更新和失败已由刷新器记录，这里只汇总
+            try:
+                results = refresher.refresh_all(force=True)
+            except Exception as e:
+                self.log_message_from_thread(f"订阅刷新出错: {e}")
+                return
+            counts = {}
+            for result in results:
+                counts[result["status"]] = counts.get(result["status"], 0) + 1
+            self.log_message_from_thread("订阅刷新完成: " + ", ".join(f"{status} {count}" for status, count in counts.items()))
+
+        self.log_message("正在刷新订阅...")
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _on_failover_switch(self, new_path):
+        """故障切换完成后，同步界面上的当前配置"""
+        self.current_config_path = new_path
+        self.config_path_label.configure(text=new_path)
+        self.load_config_to_editor(new_path)
+        self.save_last_config_path(new_path)
+        self._set_running_buttons()
+        self.refresh_status()
+
     def _on_v2ray_stopped(self):
         """当v2ray停止后，更新UI按钮的状态"""
+        if self.v2ray_manager.is_running() or (self.failover and self.failover.switching):
+            return # 故障切换已启动（或正在启动）新的进程；切换结束后若核心未运行会再次回调
+        self.refresh_status()
         self.start_button.configure(state="normal")
         self.stop_button.configure(state="disabled")
         self.test_speed_button.configure(state="disabled")
@@ -384,22 +652,19 @@ class V2rayClientApp(customtkinter.CTk):
             return
 
         try:
-            # 2. 使用socket进行TCP连接测试
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(10) # 10秒超时
-            
-            start_time = time.time()
-            sock.connect((address, port))
-            end_time = time.time()
-            sock.close()
+            # 2. 解析全部 A/AAAA 记录，以 happy-eyeballs 方式交错发起TCP连接
+            result = probe_families(address, port, timeout=10)
+            winner = result["winner"]
+            if not winner:
+                self.after(0, self.log_message, f"延迟测试失败: 无法连接服务器 {address}:{port} ({format_family_report(result)})。" )
+                return
+            self.after(0, self.log_message, f"TCP Ping 测试成功: 延迟 {winner['latency_ms']:.2f} ms "
+                                            f"(首个建立连接: {winner['family'].upper()} {winner['ip']})")
+            if len(result["families"]) > 1:
+                self.after(0, self.log_message, f"  按地址族: {format_family_report(result)}；"
+                                                f"较快的是 {result['preferred'].upper()}，可在生成配置时固定为 "
+                                                f"{FAMILY_DOMAIN_STRATEGIES[result['preferred']]}")
 
-            latency_ms = (end_time - start_time) * 1000
-            self.after(0, self.log_message, f"TCP Ping 测试成功: 延迟 {latency_ms:.2f} ms")
-
-        except socket.timeout:
-            self.after(0, self.log_message, f"延迟测试失败: 连接服务器 {address}:{port} 超时。" )
-        except ConnectionRefusedError:
-            self.after(0, self.log_message, f"延迟测试失败: 连接服务器 {address}:{port} 被拒绝。" )
         except socket.gaierror:
             self.after(0, self.log_message, f"延迟测试失败: 无法解析服务器地址 {address}。" )
         except Exception as e:
@@ -409,11 +674,16 @@ class V2rayClientApp(customtkinter.CTk):
             if not self.v2ray_manager.is_running():
                  self.after(0, lambda: self.test_latency_button.configure(state="normal") )
 
+    def _parse_editor_config(self, config_content):
+        """解析编辑器中的配置；模板叠加文件会与其模板合并后返回"""
+        config = json.loads(config_content)
+        return resolve_config(config, self.current_config_path or resource_path(DEFAULT_CONFIG_PATH))[0]
+
     def _get_config_details(self, config_content):
         """从配置内容中解析服务器地址、端口和HTTP端口"""
         address, port, http_port = None, None, None
         try:
-            config = json.loads(config_content)
+            config = self._parse_editor_config(config_content)
             # 解析出站服务器信息
             for outbound in config.get("outbounds", []):
                 if outbound.get("protocol") in ["vmess", "vless"]:
@@ -429,6 +699,8 @@ class V2rayClientApp(customtkinter.CTk):
                     break
         except json.JSONDecodeError:
             self.after(0, self.log_message, "解析配置文件失败。" )
+        except TemplateError as e:
+            self.after(0, self.log_message, f"解析配置模板失败: {e}")
         return address, port, http_port
 
     def test_speed(self):
@@ -444,9 +716,10 @@ class V2rayClientApp(customtkinter.CTk):
         config_content = self.config_editor.get("1.0", "end-1c")
         
         # 将配置内容传递给后台线程
-        threading.Thread(target=self._run_speed_test_in_thread, args=(config_content,), daemon=True).start()
+        threading.Thread(target=self._run_speed_test_in_thread, args=(config_content, self.current_config_path),
+                         daemon=True).start()
 
-    def _run_speed_test_in_thread(self, config_content):
+    def _run_speed_test_in_thread(self, config_content, config_path=None):
         """在后台线程中运行下载速度测试"""
         _, _, http_port = self._get_config_details(config_content)
 
@@ -479,8 +752,11 @@ class V2rayClientApp(customtkinter.CTk):
 
             if duration > 0:
                 speed_bps = (downloaded_bytes * 8) / duration
-                speed_mbps = speed_bps / (1024 * 1024)
+                speed_mbps = speed_bps / 1e6
                 self.after(0, self.log_message, f"测试完成: 下载速度约为 {speed_mbps:.2f} Mbps")
+                if config_path:
+                    # 记入服务器列表，供“速度”列和排序使用
+                    self.after(0, self.server_list.record_throughput, config_path, speed_mbps)
             else:
                 self.after(0, self.log_message, "速度测试失败: 下载时间过短无法计算。" )
 
@@ -492,6 +768,184 @@ class V2rayClientApp(customtkinter.CTk):
             if self.v2ray_manager.is_running():
                 self.after(0, lambda: self.test_speed_button.configure(state="normal") )
 
+    def run_transport_benchmark(self):
+        """对当前配置的服务器运行传输方式/Mux/TLS组合的对比测试"""
+        config_content = self.config_editor.get("1.0", "end-1c")
+        try:
+            outbound = next(o for o in self._parse_editor_config(config_content).get("outbounds", []) if o.get("protocol") in ["vmess", "vless"])
+            server = outbound["settings"]["vnext"][0]
+            address, port, user_uuid = server["address"], server["port"], server["users"][0]["id"]
+        except (json.JSONDecodeError, TemplateError, StopIteration, KeyError, IndexError):
+            self.log_message("对比测试失败: 在配置中找不到服务器地址、端口或UUID。")
+            return
+        ws_path = outbound.get("streamSettings", {}).get("wsSettings", {}).get("path", "/")
+        variants = expand_matrix({"ws_path": ws_path})
+        self.log_message(f"开始传输对比测试，共 {len(variants)} 个组合... (可能需要较长时间)")
+
+        def worker():
+            results = run_benchmark(address, port, user_uuid, variants, log_callback=self.log_message_from_thread)
+            self.log_message_from_thread("传输对比测试结果:\n" + format_table(results))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def validate_all_configs(self):
+        """在后台并行校验 configs/ 目录下的所有配置文件"""
+        configs_dir = resource_path('configs')
+        paths = list_config_files(configs_dir)
+        if not paths:
+            self.log_message(f"在 {configs_dir} 中没有找到配置文件。")
+            return
+        self.log_message(f"正在校验 {len(paths)} 个配置文件...")
+
+        def worker():
+            validator = self.v2ray_manager.preflight or PreflightValidator(self.v2ray_manager.v2ray_executable)
+            start_time = time.time()
+            results = validator.validate_many(paths)
+            failed = {path: problems for path, (ok, problems, _) in results.items() if not ok}
+            cached = sum(1 for _, _, was_cached in results.values() if was_cached)
+            self.log_message_from_thread(f"校验完成: {len(paths) - len(failed)} 个通过, {len(failed)} 个失败, "
+                                         f"{cached} 个命中缓存, 用时 {time.time() - start_time:.1f} 秒")
+            for path, problems in failed.items():
+                self.log_message_from_thread(f"  {os.path.relpath(path, configs_dir)}: {'; '.join(problems)}")
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _ask_echo_target(self, title):
+        """
+        询问压测/UDP测试的回显目标 host:port。本地回显服务器在回环地址上会被路由直连，
+        测不到代理路径，因此目标需是经服务器可达的回显服务（例如在服务器上运行 cli.py echo）。
+        :return: (host, port)，取消时返回 None
+        """
+        last = self.settings.get("echo_target", "")
+        prompt = "回显服务器 host:port（可在服务器上运行 cli.py echo）:"
+        if last:
+            prompt += f"\n留空使用上次的 {last}"
+        text = customtkinter.CTkInputDialog(text=prompt, title=title).get_input()
+        if text is None:
+            return None
+        text = text.strip() or last
+        host, _, port = text.rpartition(":")
+        if not host or not port.isdigit() or not 0 < int(port) < 65536:
+            if text:
+                self.log_message(f"{title}失败: 无效的目标 {text}，应为 host:port。")
+            return None
+        if text != last:
+            self.settings["echo_target"] = text
+            save_app_settings(self.settings)
+        return host.strip("[]"), int(port)
+
+    def run_connection_load_test(self):
+        """通过本地SOCKS和HTTP入站向回显服务器发起大量短连接"""
+        if not self.v2ray_manager.is_running():
+            self.log_message("错误: V2ray 未运行，无法进行连接压测。")
+            return
+        try:
+            config = self._parse_editor_config(self.config_editor.get("1.0", "end-1c"))
+        except (json.JSONDecodeError, TemplateError):
+            self.log_message("连接压测失败: 解析配置文件失败。")
+            return
+        ports = {inbound.get("protocol"): inbound.get("port") for inbound in config.get("inbounds", [])}
+        target = self._ask_echo_target("连接压测")
+        if not target:
+            return
+        self.log_message(f"正在进行连接压测 (目标 {target[0]}:{target[1]}, 每种入站 500 个连接, 并发 50)...")
+
+        def worker():
+            try:
+                for kind in ("socks", "http"):
+                    if not ports.get(kind):
+                        continue
+                    report = run_load(kind, ports[kind], target[0], target[1], connections=500, concurrency=50)
+                    self.log_message_from_thread(format_load_report(report))
+            except Exception as e:
+                self.log_message_from_thread(f"连接压测失败: {e}")
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def run_udp_path_test(self):
+        """通过本地SOCKS入站的UDP ASSOCIATE向UDP回显服务器发送一组数据报"""
+        if not self.v2ray_manager.is_running():
+            self.log_message("错误: V2ray 未运行，无法进行UDP测试。")
+            return
+        try:
+            config = self._parse_editor_config(self.config_editor.get("1.0", "end-1c"))
+            socks = next(i for i in config.get("inbounds", []) if i.get("protocol") == "socks")
+        except (json.JSONDecodeError, TemplateError, StopIteration):
+            self.log_message("UDP测试失败: 在配置中找不到 SOCKS 入站。")
+            return
+        if not socks.get("settings", {}).get("udp"):
+            self.log_message("UDP测试失败: SOCKS 入站未启用 UDP (settings.udp)。")
+            return
+        target = self._ask_echo_target("UDP测试")
+        if not target:
+            return
+        self.log_message(f"正在进行UDP测试 (目标 {target[0]}:{target[1]}, 200 个数据报)...")
+
+        def worker():
+            try:
+                report = run_udp_test(socks["port"], target[0], target[1], count=200)
+                self.log_message_from_thread(format_udp_report(report))
+            except Exception as e:
+                self.log_message_from_thread(f"UDP测试失败: {e}")
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def run_routing_advisor(self):
+        """比较常用域名直连与经代理访问的延迟和速度，并建议 direct/proxy 路由规则"""
+        if not self.current_config_path:
+            self.log_message("错误: 请先选择一个配置文件。")
+            return
+        config_path = self.current_config_path
+        log_path = get_persistent_data_path(ACCESS_LOG_FILE)
+
+        def read_log():
+            # 访问日志可能很大，在后台读取
+            try:
+                domains = top_domains_from_log(log_path) if os.path.exists(log_path) else []
+            except (OSError, ValueError) as e:
+                self.log_message_from_thread(f"读取访问日志失败: {e}")
+                domains = []
+            self.after(0, self._run_routing_advisor_for, config_path, domains)
+
+        threading.Thread(target=read_log, daemon=True).start()
+
+    def _run_routing_advisor_for(self, config_path, domains):
+        if not domains:
+            text = customtkinter.CTkInputDialog(text="访问日志中没有域名，请输入要测试的域名（逗号分隔）:", title="路由建议").get_input()
+            domains = [domain.strip() for domain in (text or "").split(",") if domain.strip()]
+            if not domains:
+                return
+        executable, backend = self.v2ray_manager.v2ray_executable, self.v2ray_manager.backend.name
+        self.log_message(f"正在比较 {len(domains)} 个域名的直连与代理访问（代理路径经独立核心测量）...")
+
+        def worker():
+            try:
+                advice = advise_with_config(domains, load_config(config_path), executable=executable,
+                                            backend=backend, log_callback=self.log_message_from_thread)
+            except Exception as e:
+                self.log_message_from_thread(f"路由建议失败: {e}")
+                return
+            self.log_message_from_thread(format_advice(advice))
+            rules = build_rules(advice)
+            if rules:
+                self.after(0, self._offer_routing_rules, config_path, rules)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _offer_routing_rules(self, config_path, rules):
+        """询问是否将建议的路由规则写入配置文件（替换上次写入的建议规则）"""
+        summary = "\n".join(f"{rule['outboundTag']}: {len(rule.get('domain', rule.get('ip', [])))} 项" for rule in rules)
+        if not messagebox.askyesno("路由建议", f"建议的规则:\n{summary}\n\n是否写入 {os.path.basename(config_path)}？"):
+            return
+        try:
+            status = apply_rules_to_file(config_path, rules)
+        except (OSError, ValueError) as e:
+            self.log_message(f"写入路由规则失败: {e}")
+            return
+        self.log_message(f"路由规则已写入 {config_path} ({status})，重启核心后生效。")
+        if config_path == self.current_config_path:
+            self.load_config_to_editor(config_path)
+
     def setup_hotkeys(self):
         """设置并启动全局快捷键监听器"""
         if self.hotkey_listener:
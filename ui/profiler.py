@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import deque
+
+import customtkinter
+
+from core.settings import get_persistent_data_path, save_app_settings
+
+PROFILE_DIR_NAME = "profiles"
+# 这些库内部的帧不用于定位卡顿的处理函数
+_LIBRARY_MARKERS = (os.sep + "tkinter" + os.sep, os.sep + "customtkinter" + os.sep, "threading.py", "profiler.py")
+
+
+def get_profile_dir():
+    """返回保存性能分析结果的目录（位于数据目录下）"""
+    path = get_persistent_data_path(PROFILE_DIR_NAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _describe_frame(frame):
+    """从栈顶向下找到第一个属于应用自身代码的帧，返回 '函数 (文件:行)'"""
+    fallback = None
+    while frame is not None:
+        code = frame.f_code
+        description = f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+        fallback = fallback or description
+        if not any(marker in code.co_filename for marker in _LIBRARY_MARKERS):
+            return description
+        frame = frame.f_back
+    return fallback or "<idle>"
+
+
+class EventLoopMonitor:
+    """
+    Tk事件循环延迟监视器。
+    通过 after 定时发送心跳来测量事件循环的延迟；另有一个看门狗线程在心跳迟到时
+    采样主线程的调用栈，从而记录卡顿期间正在运行的处理函数。
+    """
+    def __init__(self, app, interval_ms=100, threshold_ms=200, history=200):
+        self.app = app
+        self.interval_ms = interval_ms
+        self.threshold = threshold_ms / 1000.0
+        self.main_thread_id = threading.main_thread().ident
+        self.running = False
+        self.generation = 0 # 每次 start 加一；旧的心跳链和看门狗线程发现不一致后自行退出
+        self.expected = 0.0
+        self.last_beat = 0.0
+        self.max_lag_ms = 0.0
+        self.beats = 0
+        self.spikes = deque(maxlen=history) # (时间, 延迟毫秒, 处理函数)
+        self.handler_stats = {} # 处理函数 -> [卡顿次数, 总卡顿毫秒, 最大卡顿毫秒]
+        self.stall_samples = {} # 当前卡顿期间的采样计数
+        self.lock = threading.Lock()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.generation += 1
+        self.last_beat = self.expected = time.perf_counter()
+        self.app.after(self.interval_ms, self._heartbeat, self.generation)
+        threading.Thread(target=self._watchdog, args=(self.generation,), daemon=True).start()
+
+    def stop(self):
+        self.running = False
+
+    def _active(self, generation):
+        return self.running and generation == self.generation
+
+    def _heartbeat(self, generation):
+        if not self._active(generation):
+            return
+        now = time.perf_counter()
+        self.expected += self.interval_ms / 1000.0
+        lag = max(0.0, now - self.expected)
+        self.beats += 1
+        self.max_lag_ms = max(self.max_lag_ms, lag * 1000)
+        if lag > self.threshold:
+            self._record_spike(lag * 1000)
+        else:
+            with self.lock:
+                self.stall_samples.clear()
+        self.last_beat = now
+        self.expected = now
+        self.app.after(self.interval_ms, self._heartbeat, generation)
+
+    def _record_spike(self, lag_ms):
+        with self.lock:
+            samples, self.stall_samples = self.stall_samples, {}
+        culprit = max(samples, key=samples.get) if samples else "<未采样到>"
+        self.spikes.append((time.time(), lag_ms, culprit))
+        stats = self.handler_stats.setdefault(culprit, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += lag_ms
+        stats[2] = max(stats[2], lag_ms)
+
+    def _watchdog(self, generation):
+        """心跳迟到时采样主线程当前正在执行的代码"""
+        period = self.interval_ms / 2000.0
+        while self._active(generation):
+            time.sleep(period)
+            if time.perf_counter() - self.last_beat < self.threshold:
+                continue
+            frame = sys._current_frames().get(self.main_thread_id)
+            if frame is None:
+                continue
+            description = _describe_frame(frame)
+            with self.lock:
+                self.stall_samples[description] = self.stall_samples.get(description, 0) + 1
+
+    def slowest_handlers(self, n=15):
+        """按总卡顿时间排序的处理函数：[(函数, 次数, 总毫秒, 最大毫秒)]"""
+        ranked = sorted(self.handler_stats.items(), key=lambda item: item[1][1], reverse=True)[:n]
+        return [(name, count, total, worst) for name, (count, total, worst) in ranked]
+
+
+class UIProfiler:
+    """按需的 cProfile 与 tracemalloc 快照，结果保存到数据目录"""
+    def __init__(self):
+        self.profile = None
+
+    @property
+    def cpu_profiling(self):
+        return self.profile is not None
+
+    @property
+    def memory_tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start_cpu_profile(self):
+        """开始分析UI线程（必须在Tk线程中调用）"""
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop_cpu_profile(self, top=15):
+        """停止分析，保存 .prof 文件并返回 (路径, 摘要文本)"""
+        profile, self.profile = self.profile, None
+        profile.disable()
+        path = os.path.join(get_profile_dir(), time.strftime("ui-%Y%m%d-%H%M%S.prof"))
+        profile.dump_stats(path)
+        buffer = io.StringIO()
+        pstats.Stats(profile, stream=buffer).sort_stats("cumulative").print_stats(top)
+        return path, buffer.getvalue()
+
+    def stop_memory_tracing(self):
+        """停止跟踪内存分配，释放 tracemalloc 的开销"""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def memory_snapshot(self, top=15):
+        """
+        第一次调用时开始跟踪内存分配；之后每次调用保存一个快照，
+        返回 (路径或None, 摘要文本)。用 stop_memory_tracing() 停止跟踪。
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            return None, "已开始跟踪内存分配，稍后再次点击以保存快照。"
+        snapshot = tracemalloc.take_snapshot()
+        path = os.path.join(get_profile_dir(), time.strftime("mem-%Y%m%d-%H%M%S.snapshot"))
+        snapshot.dump(path)
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"当前 {current / 1024 / 1024:.1f} MB, 峰值 {peak / 1024 / 1024:.1f} MB"]
+        lines.extend(str(stat) for stat in snapshot.statistics("lineno")[:top])
+        return path, "\n".join(lines)
+
+
+class ProfilerWindow(customtkinter.CTkToplevel):
+    """界面性能分析窗口：事件循环延迟、最慢的处理函数，以及 cProfile / 内存快照开关"""
+    def __init__(self, master):
+        super().__init__(master)
+        self.master = master
+
+        self.title("界面性能分析")
+        self.geometry("720x520")
+        self.transient(master)
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        buttons = customtkinter.CTkFrame(self, fg_color="transparent")
+        buttons.grid(row=0, column=0, sticky="ew", padx=10, pady=(10, 0))
+        self.monitor_button = customtkinter.CTkButton(buttons, command=self.toggle_monitor, width=130)
+        self.monitor_button.pack(side="left")
+        self.cpu_button = customtkinter.CTkButton(buttons, command=self.toggle_cpu_profile, width=130)
+        self.cpu_button.pack(side="left", padx=5)
+        customtkinter.CTkButton(buttons, text="内存快照", command=self.memory_snapshot, width=100).pack(side="left")
+        self.memory_stop_button = customtkinter.CTkButton(buttons, text="停止内存跟踪", command=self.stop_memory_tracing, width=110)
+        self.memory_stop_button.pack(side="left", padx=5)
+
+        self.report_text = customtkinter.CTkTextbox(self, wrap="none", font=customtkinter.CTkFont(family="Consolas"))
+        self.report_text.grid(row=1, column=0, sticky="nsew", padx=10, pady=10)
+        self.extra_text = ""
+
+        self._update_buttons()
+        self._refresh()
+
+    def _update_buttons(self):
+        monitor = self.master.lag_monitor
+        self.monitor_button.configure(text="停止延迟监视" if monitor and monitor.running else "启用延迟监视")
+        self.cpu_button.configure(text="停止 cProfile" if self.master.ui_profiler.cpu_profiling else "开始 cProfile")
+        self.memory_stop_button.configure(state="normal" if self.master.ui_profiler.memory_tracing else "disabled")
+
+    def toggle_monitor(self):
+        enabled = not (self.master.lag_monitor and self.master.lag_monitor.running)
+        self.master.set_lag_monitor(enabled)
+        self.master.settings["ui_lag_monitor"] = enabled
+        save_app_settings(self.master.settings)
+        self._update_buttons()
+
+    def toggle_cpu_profile(self):
+        profiler = self.master.ui_profiler
+        if profiler.cpu_profiling:
+            path, summary = profiler.stop_cpu_profile()
+            self.master.log_message(f"cProfile 结果已保存: {path}")
+            self._show_extra(summary)
+        else:
+            profiler.start_cpu_profile()
+            self.master.log_message("cProfile 已开始分析UI线程。")
+        self._update_buttons()
+
+    def memory_snapshot(self):
+        path, summary = self.master.ui_profiler.memory_snapshot()
+        if path:
+            self.master.log_message(f"内存快照已保存: {path}")
+        self._show_extra(summary)
+        self._update_buttons()
+
+    def stop_memory_tracing(self):
+        self.master.ui_profiler.stop_memory_tracing()
+        self.master.log_message("已停止跟踪内存分配。")
+        self._update_buttons()
+
+    def _show_extra(self, text):
+        self.extra_text = text
+        self._render()
+
+    def _refresh(self):
+        if not self.winfo_exists():
+            return
+        self._render()
+        self.after(1000, self._refresh)
+
+    def _render(self):
+        monitor = self.master.lag_monitor
+        lines = []
+        if monitor:
+            lines.append(f"心跳 {monitor.beats} 次, 最大延迟 {monitor.max_lag_ms:.0f} ms, "
+                         f"卡顿 (>{monitor.threshold * 1000:.0f} ms) {len(monitor.spikes)} 次")
+            lines.append("")
+            lines.append(f"{'最慢的处理函数':<48} {'次数':>6} {'总计ms':>10} {'最大ms':>10}")
+            for name, count, total, worst in monitor.slowest_handlers():
+                lines.append(f"{name:<48} {count:>6} {total:>10.0f} {worst:>10.0f}")
+            lines.append("")
+            lines.append("最近的卡顿:")
+            for when, lag_ms, culprit in list(monitor.spikes)[-10:]:
+                lines.append(f"  {time.strftime('%H:%M:%S', time.localtime(when))}  {lag_ms:7.0f} ms  {culprit}")
+        else:
+            lines.append("延迟监视未启用。")
+        if self.extra_text:
+            lines.append("")
+            lines.append(self.extra_text)
+        position = self.report_text.yview()[0]
+        self.report_text.delete("1.0", "end")
+        self.report_text.insert("end", "\n".join(lines))
+        self.report_text.yview_moveto(position)
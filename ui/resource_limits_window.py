@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+import tkinter as tk
+from tkinter import messagebox
+import customtkinter
+
+from core.settings import save_app_settings
+from core.resource_limits import validate_limits
+
+class ResourceLimitsWindow(customtkinter.CTkToplevel):
+    """
+    核心资源限制窗口。
+    设置核心进程的优先级、I/O优先级、CPU亲和性、文件描述符/地址空间上限以及可选的 cgroup v2 限制。
+    修改在下次启动核心时生效。
+    """
+    FIELDS = (
+        ("nice", "nice 增量 (-20~19):"),
+        ("nofile", "最大文件描述符数:"),
+        ("address_space_mb", "地址空间上限(MB):"),
+        ("cgroup_memory_mb", "cgroup 内存上限(MB):"),
+        ("cgroup_cpu_percent", "cgroup CPU 上限(%):"),
+    )
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.master = master
+
+        self.title("核心资源限制")
+        self.geometry("440x400")
+        self.transient(master)
+        self.grab_set()
+        self.grid_columnconfigure(1, weight=1)
+
+        limits = self.master.settings.get("core_limits", {})
+        self.entries = {}
+        for row, (key, label) in enumerate(self.FIELDS):
+            customtkinter.CTkLabel(self, text=label).grid(row=row, column=0, padx=10, pady=5, sticky="w")
+            entry = customtkinter.CTkEntry(self, width=120, placeholder_text="默认")
+            entry.grid(row=row, column=1, padx=10, pady=5, sticky="w")
+            if limits.get(key) is not None:
+                entry.insert(0, str(limits[key]))
+            self.entries[key] = entry
+
+        row = len(self.FIELDS)
+        customtkinter.CTkLabel(self, text="CPU 亲和性:").grid(row=row, column=0, padx=10, pady=5, sticky="w")
+        self.affinity_entry = customtkinter.CTkEntry(self, width=200, placeholder_text="例如 0,1 (留空为全部)")
+        self.affinity_entry.grid(row=row, column=1, padx=10, pady=5, sticky="w")
+        self.affinity_entry.insert(0, ",".join(map(str, limits.get("cpu_affinity", []))))
+
+        customtkinter.CTkLabel(self, text="I/O 优先级:").grid(row=row + 1, column=0, padx=10, pady=5, sticky="w")
+        self.ionice_menu = customtkinter.CTkOptionMenu(self, values=["默认", "best-effort", "idle"], width=120)
+        self.ionice_menu.grid(row=row + 1, column=1, padx=10, pady=5, sticky="w")
+        self.ionice_menu.set(limits.get("ionice_class") or "默认")
+
+        button_frame = customtkinter.CTkFrame(self, fg_color="transparent")
+        button_frame.grid(row=row + 2, column=0, columnspan=2, pady=15)
+        customtkinter.CTkButton(button_frame, text="保存", command=self.save).pack(side=tk.LEFT, padx=10)
+        customtkinter.CTkButton(button_frame, text="取消", command=self.destroy).pack(side=tk.LEFT, padx=10)
+
+    def save(self):
+        """校验并保存资源限制；它们会在下次启动核心时生效"""
+        limits = {}
+        try:
+            for key, entry in self.entries.items():
+                value = entry.get().strip()
+                if value:
+                    limits[key] = int(value)
+            affinity = self.affinity_entry.get().strip()
+            if affinity:
+                limits["cpu_affinity"] = [int(cpu) for cpu in affinity.replace(" ", "").split(",") if cpu]
+        except ValueError:
+            messagebox.showwarning("警告", "所有数值必须是整数。", parent=self)
+            return
+        if self.ionice_menu.get() != "默认":
+            limits["ionice_class"] = self.ionice_menu.get()
+
+        problems = validate_limits(limits)
+        if problems:
+            messagebox.showwarning("警告", "\n".join(problems), parent=self)
+            return
+
+        self.master.settings["core_limits"] = limits
+        save_app_settings(self.master.settings)
+        self.master.v2ray_manager.launch_limits = limits
+        self.master.log_message("核心资源限制已保存，将在下次启动核心时生效。")
+        self.destroy()
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+
+import tkinter as tk
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import customtkinter
+
+from core.server_store import ServerStore
+from core.probe import tcp_ping
+from core.clustering import ClusteredProber, format_cluster_report
+
+ROW_HEIGHT = 22
+SEARCH_DELAY_MS = 150
+SORT_LABELS = {"名称": "name", "延迟": "latency", "速度": "throughput"}
+# 选中的服务器达到此数量时先按集群测试代表节点，只展开有希望的集群
+CLUSTER_PROBE_MIN = 50
+
+class ServerListPanel(customtkinter.CTkFrame):
+    """
+    虚拟化的服务器列表面板。
+    只为当前可见的行创建画布文本项并在滚动时复用，因此列表规模不影响Tk的控件数量，
+    十万条服务器也能流畅滚动和筛选。
+    """
+    def __init__(self, master, app, on_activate):
+        super().__init__(master, corner_radius=0)
+        self.app = app
+        self.on_activate = on_activate # 双击某一行时以 ServerEntry 为参数调用
+        self.store = ServerStore()
+        self.first_row = 0
+        self.selected = set() # 选中条目在 store.entries 中的下标
+        self.anchor = None # Shift 多选的起点（视图中的行号）
+        self.row_items = [] # 复用的画布项: (背景矩形, 名称文本, 指标文本)
+        self.search_job = None
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(2, weight=1)
+
+        header = customtkinter.CTkFrame(self, fg_color="transparent")
+        header.grid(row=0, column=0, columnspan=2, sticky="ew", padx=5, pady=(10, 0))
+        header.grid_columnconfigure(0, weight=1)
+        self.count_label = customtkinter.CTkLabel(header, text="服务器列表", anchor="w")
+        self.count_label.grid(row=0, column=0, sticky="w")
+        self.sort_menu = customtkinter.CTkOptionMenu(header, values=list(SORT_LABELS), command=self._on_sort, width=70)
+        self.sort_menu.grid(row=0, column=1, padx=(5, 0))
+        self.test_button = customtkinter.CTkButton(header, text="测试选中", command=self.test_selected, width=70)
+        self.test_button.grid(row=0, column=2, padx=(5, 0))
+
+        self.search_entry = customtkinter.CTkEntry(self, placeholder_text="搜索名称/地址/传输...")
+        self.search_entry.grid(row=1, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
+        self.search_entry.bind("<KeyRelease>", self._on_search_key)
+
+        dark = customtkinter.get_appearance_mode() == "Dark"
+        self.colors = {
+            "bg": "#2b2b2b" if dark else "#ffffff",
+            "fg": "#dce4ee" if dark else "#1a1a1a",
+            "dim": "#8a8a8a",
+            "selected": "#1f538d" if dark else "#cde0f7",
+        }
+        self.canvas = tk.Canvas(self, bg=self.colors["bg"], highlightthickness=0, width=260)
+        self.canvas.grid(row=2, column=0, sticky="nsew", padx=(5, 0), pady=(0, 5))
+        self.scrollbar = customtkinter.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.grid(row=2, column=1, sticky="ns", pady=(0, 5))
+
+        self.canvas.bind("<Configure>", lambda event: self.redraw())
+        self.canvas.bind("<MouseWheel>", self._on_mousewheel)
+        self.canvas.bind("<Button-4>", lambda event: self.scroll_rows(-3))
+        self.canvas.bind("<Button-5>", lambda event: self.scroll_rows(3))
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<Control-Button-1>", lambda event: self._on_click(event, toggle=True))
+        self.canvas.bind("<Shift-Button-1>", lambda event: self._on_click(event, extend=True))
+        self.canvas.bind("<Double-Button-1>", self._on_double_click)
+
+    # --- 数据 ---
+    def load_directory(self, directory):
+        """在后台线程中扫描配置目录，完成后刷新列表"""
+        def worker():
+            self.store.load_directory(directory)
+            self.after(0, self._on_data_changed)
+        threading.Thread(target=worker, daemon=True).start()
+
+    def set_entries(self, entries):
+        self.store.set_entries(entries)
+        self._on_data_changed()
+
+    def _on_data_changed(self):
+        self.selected.clear()
+        self.first_row = 0
+        self.redraw()
+
+    # --- 绘制 ---
+    def visible_row_count(self):
+        return max(1, self.canvas.winfo_height() // ROW_HEIGHT + 1)
+
+    def redraw(self):
+        """只绘制可见的行；画布项按需创建并复用"""
+        count = self.visible_row_count()
+        total = len(self.store.view)
+        self.first_row = max(0, min(self.first_row, max(0, total - count + 1)))
+        width = self.canvas.winfo_width()
+
+        while len(self.row_items) < count:
+            y = len(self.row_items) * ROW_HEIGHT
+            self.row_items.append((
+                self.canvas.create_rectangle(0, y, width, y + ROW_HEIGHT, width=0),
+                self.canvas.create_text(6, y + ROW_HEIGHT // 2, anchor="w", fill=self.colors["fg"]),
+                self.canvas.create_text(width - 6, y + ROW_HEIGHT // 2, anchor="e", fill=self.colors["dim"]),
+            ))
+
+        rows = self.store.visible(self.first_row, count)
+        for slot, (background, name_item, metric_item) in enumerate(self.row_items):
+            y = slot * ROW_HEIGHT
+            if slot < len(rows):
+                index, entry = rows[slot]
+                fill = self.colors["selected"] if index in self.selected else self.colors["bg"]
+                self.canvas.coords(background, 0, y, width, y + ROW_HEIGHT)
+                self.canvas.itemconfigure(background, fill=fill, state="normal")
+                self.canvas.itemconfigure(name_item, text=f"{entry.name}  ({entry.network}{'+tls' if entry.tls else ''})", state="normal")
+                self.canvas.coords(metric_item, width - 6, y + ROW_HEIGHT // 2)
+                self.canvas.itemconfigure(metric_item, text=self._metric_text(entry), state="normal")
+            else:
+                for item in (background, name_item, metric_item):
+                    self.canvas.itemconfigure(item, state="hidden")
+
+        if total:
+            self.scrollbar.set(self.first_row / total, min(1.0, (self.first_row + count) / total))
+        else:
+            self.scrollbar.set(0, 1)
+        self.count_label.configure(text=f"服务器 {total}/{len(self.store.entries)}" + (f"，已选 {len(self.selected)}" if self.selected else ""))
+
+    @staticmethod
+    def _metric_text(entry):
+        parts = []
+        if entry.latency is not None:
+            parts.append(f"{entry.latency:.0f} ms" + (" (旧)" if entry.stale else ""))
+        if entry.throughput is not None:
+            parts.append(f"{entry.throughput:.1f} Mbps")
+        return "  ".join(parts) or "-"
+
+    # --- 滚动 ---
+    def scroll_rows(self, delta):
+        self.first_row += delta
+        self.redraw()
+
+    def _on_mousewheel(self, event):
+        self.scroll_rows(-3 if event.delta > 0 else 3)
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self.first_row = int(float(value) * len(self.store.view))
+        elif action == "scroll":
+            step = self.visible_row_count() if unit == "pages" else 1
+            self.first_row += int(value) * step
+        self.redraw()
+
+    # --- 搜索与排序 ---
+    def _on_search_key(self, event=None):
+        """输入时延迟一小段时间再筛选，避免每次按键都重算"""
+        if self.search_job:
+            self.after_cancel(self.search_job)
+        self.search_job = self.after(SEARCH_DELAY_MS, self._apply_search)
+
+    def _apply_search(self):
+        self.search_job = None
+        self.store.filter(self.search_entry.get())
+        self.first_row = 0
+        self.redraw()
+
+    def _on_sort(self, label):
+        self.store.sort(SORT_LABELS[label])
+        self.redraw()
+
+    # --- 选择 ---
+    def _row_at(self, event):
+        row = self.first_row + event.y // ROW_HEIGHT
+        return row if row < len(self.store.view) else None
+
+    def _on_click(self, event, toggle=False, extend=False):
+        row = self._row_at(event)
+        if row is None:
+            return "break"
+        index = self.store.view[row]
+        if extend and self.anchor is not None:
+            low, high = sorted((self.anchor, row))
+            self.selected.update(self.store.view[low:high + 1])
+        elif toggle:
+            self.selected.symmetric_difference_update({index})
+            self.anchor = row
+        else:
+            self.selected = {index}
+            self.anchor = row
+        self.redraw()
+        return "break"
+
+    def _on_double_click(self, event):
+        row = self._row_at(event)
+        if row is not None:
+            self.on_activate(self.store.entries[self.store.view[row]])
+
+    # --- 批量测试 ---
+    def test_selected(self):
+        """对选中的服务器并行执行TCP延迟测试"""
+        entries = [self.store.entries[i] for i in self.selected]
+        if not entries:
+            self.app.log_message("请先在服务器列表中选择要测试的服务器（Ctrl/Shift 可多选）。")
+            return
+        self.test_button.configure(state="disabled")
+        self.app.log_message(f"正在测试 {len(entries)} 个服务器的延迟...")
+
+        def probe(entry):
+            try:
+                entry.latency = tcp_ping(entry.address, entry.port, timeout=5)
+            except OSError:
+                entry.latency = None
+            entry.stale = False
+
+        def worker():
+            if len(entries) >= CLUSTER_PROBE_MIN:
+                report = ClusteredProber(timeout=5).run(entries)
+                self.app.log_message_from_thread(f"分集群延迟测试:\n{format_cluster_report(report)}")
+                ok, total = report["reachable"], report["probes"]
+            else:
+                with ThreadPoolExecutor(max_workers=32) as executor:
+                    list(executor.map(probe, entries))
+                ok, total = sum(1 for e in entries if e.latency is not None), len(entries)
+            self.store.save_metrics()
+            self.app.log_message_from_thread(f"批量延迟测试完成: {ok}/{total} 个可达。")
+            self.after(0, self._on_test_done)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def record_throughput(self, path, mbps):
+        """记录某个配置的测速结果，使列表可按速度排序"""
+        if self.store.set_throughput(path, mbps):
+            self.store.save_metrics()
+            self.store.sort(self.store.sort_key)
+            self.redraw()
+
+    def _on_test_done(self):
+        self.test_button.configure(state="normal")
+        self.store.sort(self.store.sort_key)
+        self.redraw()
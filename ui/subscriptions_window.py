@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+import tkinter as tk
+from tkinter import messagebox
+import customtkinter
+
+from core.settings import save_app_settings
+
+class SubscriptionsWindow(customtkinter.CTkToplevel):
+    """
+    订阅管理窗口。
+    编辑订阅地址列表和刷新间隔；刷新时使用条件请求，只增删改有变化的服务器配置。
+    """
+    def __init__(self, master):
+        super().__init__(master)
+        self.master = master
+
+        self.title("订阅管理")
+        self.geometry("600x420")
+        self.transient(master)
+        self.grab_set()
+
+        self.grid_columnconfigure(1, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        settings = self.master.settings
+        self.auto_var = tk.BooleanVar(value=settings.get("subscription_auto_refresh", False))
+        customtkinter.CTkCheckBox(self, text="定时自动刷新订阅", variable=self.auto_var).grid(row=0, column=0, columnspan=2, padx=10, pady=10, sticky="w")
+
+        customtkinter.CTkLabel(self, text="订阅列表\n(每行一个，\n格式: 名称=URL):", justify="left").grid(row=1, column=0, padx=10, pady=5, sticky="nw")
+        self.sources_text = customtkinter.CTkTextbox(self, wrap="none")
+        self.sources_text.grid(row=1, column=1, padx=10, pady=5, sticky="nsew")
+        self.sources_text.insert("end", "\n".join(f"{source['name']}={source['url']}"
+                                                  for source in settings.get("subscriptions", [])))
+
+        customtkinter.CTkLabel(self, text="刷新间隔(秒):").grid(row=2, column=0, padx=10, pady=5, sticky="w")
+        self.interval_entry = customtkinter.CTkEntry(self, width=100)
+        self.interval_entry.grid(row=2, column=1, padx=10, pady=5, sticky="w")
+        self.interval_entry.insert(0, str(settings.get("subscription_interval", 3600)))
+
+        button_frame = customtkinter.CTkFrame(self, fg_color="transparent")
+        button_frame.grid(row=3, column=0, columnspan=2, pady=15)
+        customtkinter.CTkButton(button_frame, text="保存并立即刷新", command=lambda: self.save(refresh_now=True)).pack(side=tk.LEFT, padx=10)
+        customtkinter.CTkButton(button_frame, text="保存", command=self.save).pack(side=tk.LEFT, padx=10)
+        customtkinter.CTkButton(button_frame, text="取消", command=self.destroy).pack(side=tk.LEFT, padx=10)
+
+    def _parse_sources(self):
+        """解析订阅列表；格式错误时返回 None"""
+        sources, names = [], set()
+        for line in self.sources_text.get("1.0", "end-1c").splitlines():
+            if not line.strip():
+                continue
+            name, sep, url = line.partition("=")
+            name, url = name.strip(), url.strip()
+            if not sep or not name or not url.lower().startswith(("http://", "https://")):
+                messagebox.showwarning("警告", f"无效的订阅行：\n{line}\n格式应为 名称=http(s)://...", parent=self)
+                return None
+            if name in names:
+                messagebox.showwarning("警告", f"订阅名称重复：{name}", parent=self)
+                return None
+            names.add(name)
+            sources.append({"name": name, "url": url})
+        return sources
+
+    def save(self, refresh_now=False):
+        """保存订阅设置，并按设置重新启动定时刷新"""
+        try:
+            interval = float(self.interval_entry.get().strip())
+        except ValueError:
+            messagebox.showwarning("警告", "刷新间隔必须是数字。", parent=self)
+            return
+        if interval < 60:
+            messagebox.showwarning("警告", "刷新间隔不能小于60秒。", parent=self)
+            return
+        sources = self._parse_sources()
+        if sources is None:
+            return
+
+        settings = self.master.settings
+        settings["subscriptions"] = sources
+        settings["subscription_interval"] = interval
+        settings["subscription_auto_refresh"] = self.auto_var.get()
+        save_app_settings(settings)
+        self.master.log_message("订阅设置已保存。")
+        self.master.restart_subscriptions()
+        if refresh_now:
+            self.master.refresh_subscriptions_now()
+        self.destroy()